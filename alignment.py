@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+alignment.py
+Pairwise global alignment held as one op code per column instead of two gapped strings.
+
+The codes are those of the DP trace in compare_gene_losses.py: MATCH (0, a residue from both
+sequences, identical or not), INS (1, a residue of s1 against a gap: an insertion in the
+symbiont) and DEL (2, a gap in s1 against a residue of s2: a loss in the symbiont). From the ops
+and the two ungapped sequences every column's position in either sequence is a cumulative sum,
+so losses, insertions, substitution runs, identity, gap statistics and windowed conservation
+are all NumPy run detection rather than character walks.
+
+    aln = needleman_wunsch_vectorized(sym, ref)     # -> Alignment
+    aln.losses()           # [(start, end)] on the reference axis, as in *_loss_segments.csv
+    aln.metrics()          # lengths, identity, loss, insertion and substitution totals
+    aln.cigar()            # "120M3D41M2I..."
+    aln.gapped()           # the two gapped strings
+"""
+
+import numpy as np
+
+MATCH, INS, DEL = 0, 1, 2
+CIGAR_CODES = "MID"
+
+
+def _codes(s: str) -> np.ndarray:
+    return np.frombuffer(s.encode("latin-1", "replace"), dtype=np.uint8)
+
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(starts, ends) of the runs of True in a boolean array, ends inclusive."""
+    d = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1) - 1
+
+
+class Alignment:
+    """Global alignment of s1 (symbiont) against s2 (reference) as an int8 op per column."""
+
+    def __init__(self, ops, s1: str, s2: str):
+        self.ops = np.asarray(ops, dtype=np.int8)
+        self.s1, self.s2 = s1, s2
+        self.adv1 = self.ops != DEL     # columns holding a residue of s1
+        self.adv2 = self.ops != INS     # columns holding a residue of s2
+        if int(self.adv1.sum()) != len(s1) or int(self.adv2.sum()) != len(s2):
+            raise ValueError("alignment ops do not consume both sequences exactly")
+        self.pos1 = np.where(self.adv1, np.cumsum(self.adv1) - 1, -1)  # s1 index per column, -1 at gaps
+        self.pos2 = np.where(self.adv2, np.cumsum(self.adv2) - 1, -1)
+        pair = self.ops == MATCH
+        self.identical = np.zeros(len(self.ops), dtype=bool)
+        self.identical[pair] = _codes(s1)[self.pos1[pair]] == _codes(s2)[self.pos2[pair]]
+
+    @classmethod
+    def from_strings(cls, aln1: str, aln2: str) -> "Alignment":
+        """From two equal-length gapped strings; columns that are gaps in both are dropped."""
+        if len(aln1) != len(aln2):
+            raise ValueError("gapped strings differ in length")
+        g1, g2 = _codes(aln1) == ord("-"), _codes(aln2) == ord("-")
+        ops = np.where(g1, DEL, np.where(g2, INS, MATCH)).astype(np.int8)[~(g1 & g2)]
+        return cls(ops, aln1.replace("-", ""), aln2.replace("-", ""))
+
+    def __len__(self):
+        return len(self.ops)
+
+    def gapped(self) -> tuple[str, str]:
+        """The alignment as two gapped strings ('-' for gaps)."""
+        out = []
+        for s, adv in ((self.s1, self.adv1), (self.s2, self.adv2)):
+            col = np.full(len(self.ops), ord("-"), dtype=np.uint8)
+            col[adv] = _codes(s)
+            out.append(col.tobytes().decode("latin-1"))
+        return out[0], out[1]
+
+    def cigar(self) -> str:
+        """Run-length op string, e.g. "12M3D40M1I" (M both, I symbiont only, D reference only)."""
+        if not len(self.ops):
+            return ""
+        change = np.flatnonzero(np.diff(self.ops)) + 1
+        starts = np.concatenate(([0], change))
+        lengths = np.diff(np.concatenate((starts, [len(self.ops)])))
+        return "".join(f"{n}{CIGAR_CODES[op]}" for n, op in zip(lengths.tolist(), self.ops[starts].tolist()))
+
+    # ---------- Events ----------
+    def losses(self) -> list[tuple[int, int]]:
+        """Runs of reference residues facing a gap in s1, as (start, end) on the reference axis.
+
+        Insertion columns do not advance the reference and so do not split a loss run.
+        """
+        starts, ends = _runs(self.ops[self.adv2] == DEL)
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def insertions(self) -> list[tuple[int, int, int]]:
+        """Runs of s1 residues facing a gap in the reference, as (start, end) on the s1 axis plus the
+        reference index they follow (-1 before the first residue). Loss columns do not split a run."""
+        starts, ends = _runs(self.ops[self.adv1] == INS)
+        cols = np.flatnonzero(self.adv1)[starts]
+        after = np.cumsum(self.adv2)[cols] - 1
+        return list(zip(starts.tolist(), ends.tolist(), after.tolist()))
+
+    def substitutions(self) -> list[tuple[int, int, int, int]]:
+        """Runs of adjacent mismatched residue pairs as (ref start, ref end, s1 start, s1 end)."""
+        starts, ends = _runs((self.ops == MATCH) & ~self.identical)
+        return list(zip(self.pos2[starts].tolist(), self.pos2[ends].tolist(),
+                        self.pos1[starts].tolist(), self.pos1[ends].tolist()))
+
+    def gap_stats(self) -> dict:
+        """Gap opens, gap columns and the longest gap, counted over alignment columns for each side."""
+        out = {}
+        for side, op in (("sym", DEL), ("free", INS)):
+            starts, ends = _runs(self.ops == op)
+            out[f"{side}_gap_opens"] = len(starts)
+            out[f"{side}_gap_columns"] = int((ends - starts + 1).sum())
+            out[f"{side}_longest_gap"] = int((ends - starts + 1).max()) if len(starts) else 0
+        return out
+
+    def conservation(self, window: int = 50) -> dict:
+        """Per reference window: start, end, residues aligned to s1, identical residues and identity
+        (identical / window length). Returns a dict of equal-length arrays."""
+        n = len(self.s2)
+        aligned = np.zeros(n, dtype=np.int64)
+        same = np.zeros(n, dtype=np.int64)
+        aligned[self.pos2[self.ops == MATCH]] = 1
+        same[self.pos2[self.identical]] = 1
+        starts = np.arange(0, n, window)
+        ends = np.minimum(starts + window, n) - 1
+        identical = np.add.reduceat(same, starts)
+        return {"start": starts, "end": ends, "aligned": np.add.reduceat(aligned, starts),
+                "identical": identical, "identity": identical / (ends - starts + 1)}
+
+    def metrics(self) -> dict:
+        """Ungapped lengths, identity over aligned pairs, loss totals, insertion / substitution totals
+        and gap statistics."""
+        compared = int((self.ops == MATCH).sum())
+        losses = self.losses()
+        insertions = self.insertions()
+        subs = self.substitutions()
+        total_loss = sum(e - s + 1 for s, e in losses)
+        free_len = len(self.s2)
+        return {"sym_len": len(self.s1), "free_len": free_len,
+                "identity": int(self.identical.sum()) / compared if compared else 0.0,
+                "total_loss": total_loss, "loss_frac": total_loss / free_len if free_len else 0.0,
+                "n_segments": len(losses),
+                "n_insertions": len(insertions), "inserted": sum(e - s + 1 for s, e, _ in insertions),
+                "n_substitution_runs": len(subs), "substitutions": sum(e - s + 1 for s, e, _, _ in subs),
+                **self.gap_stats()}
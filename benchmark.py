@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+Reproducible benchmarks on synthetic genomes and annotations.
+
+Synthetic inputs are generated from a seed (FASTA: size, GC fraction, contig count; GFF3: feature
+count and attribute bloat) and reused from --workdir when the same parameters are asked for again.
+Each benchmark runs in a fresh process, so its peak RSS is its own, and the best of --repeat
+timings is kept. Every run is appended to a JSON history file; with --baseline the run is compared
+benchmark by benchmark and any slowdown beyond --tolerance is reported (exit status 1).
+
+Usage:
+  python benchmark.py --scale small
+  python benchmark.py --scale large --only fasta gff --history bench_history.json
+  python benchmark.py --scale medium --save-baseline bench_baseline.json
+  python benchmark.py --scale medium --baseline bench_baseline.json --tolerance 0.25
+
+Scales: small (5 Mb, 20k features), medium (20 Mb, 200k), large (100 Mb, 1M); --fasta-mb,
+--features, --gc, --contigs, --attr-bloat and --align-lengths override them.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+SCALES = {
+    "small": {"fasta_mb": 5, "features": 20_000, "align_lengths": [100, 300, 1000]},
+    "medium": {"fasta_mb": 20, "features": 200_000, "align_lengths": [300, 1000, 2000]},
+    "large": {"fasta_mb": 100, "features": 1_000_000, "align_lengths": [1000, 2000, 4000]},
+}
+GROUPS = ("fasta", "gff", "stats", "align", "plot")
+_AMINO = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+
+
+# ---------- Synthetic data ----------
+def synth_fasta(path: str, size_bp: int, gc: float = 0.5, contigs: int = 1, line_width: int = 60,
+                seed: int = 0, chunk: int = 1 << 22):
+    """Random genome of `size_bp` bases split over `contigs` records, with the given GC fraction."""
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    probs = [(1 - gc) / 2, gc / 2, gc / 2, (1 - gc) / 2]
+    sizes = np.full(contigs, size_bp // contigs)
+    sizes[: size_bp % contigs] += 1
+    with open(path, "wb") as out:
+        for k, n in enumerate(sizes, 1):
+            out.write(f">synthetic_{k} length={n} gc={gc}\n".encode())
+            done = 0
+            while done < n:
+                m = min(chunk - chunk % line_width, n - done)
+                seq = bases[rng.choice(4, size=m, p=probs)]
+                full = m - m % line_width
+                lines = np.hstack([seq[:full].reshape(-1, line_width),
+                                   np.full((full // line_width, 1), ord("\n"), dtype=np.uint8)])
+                out.write(lines.tobytes())
+                if m % line_width:
+                    out.write(seq[full:].tobytes() + b"\n")
+                done += m
+
+
+def synth_gff(path: str, n_features: int, genome_size: int = 5_000_000, attr_bloat: int = 0,
+              seed: int = 0, seqid: str = "synthetic_1", batch: int = 50_000):
+    """GFF3 with `n_features` gene+CDS pairs (CDS lengths ~ log-normal around 900 bp).
+
+    `attr_bloat` extra characters go into a note= attribute on every line, to mimic heavily
+    annotated RefSeq files.
+    """
+    rng = np.random.default_rng(seed)
+    note = ";note=" + "x" * attr_bloat if attr_bloat else ""
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(f"##gff-version 3\n##sequence-region {seqid} 1 {genome_size}\n")
+        for b0 in range(0, n_features, batch):
+            n = min(batch, n_features - b0)
+            lengths = np.clip(rng.lognormal(6.7, 0.6, n), 90, 20_000).astype(np.int64) // 3 * 3
+            starts = rng.integers(1, max(2, genome_size - 20_000), n)
+            strands = np.where(rng.random(n) < 0.5, "+", "-")
+            lines = []
+            for i, (s, L, st) in enumerate(zip(starts.tolist(), lengths.tolist(), strands.tolist()), b0 + 1):
+                e = s + L - 1
+                lines.append(f"{seqid}\tsynthetic\tgene\t{s}\t{e}\t.\t{st}\t.\t"
+                             f"ID=gene-SYN_{i:07d};Name=syn{i};gene_biotype=protein_coding;locus_tag=SYN_{i:07d}{note}\n")
+                lines.append(f"{seqid}\tsynthetic\tCDS\t{s}\t{e}\t.\t{st}\t0\t"
+                             f"ID=cds-SYN_{i:07d};Parent=gene-SYN_{i:07d};locus_tag=SYN_{i:07d};"
+                             f"product=hypothetical protein;protein_id=SYN{i:07d}.1{note}\n")
+            out.write("".join(lines))
+
+
+def synth_protein_pair(length: int, identity: float = 0.6, deletions: int = 5, seed: int = 0):
+    """A random protein and a mutated copy with `deletions` internal deletions (the 'symbiont')."""
+    rng = np.random.default_rng(seed)
+    ref = _AMINO[rng.integers(0, len(_AMINO), length)]
+    sym = ref.copy()
+    mut = rng.random(length) > identity
+    sym[mut] = _AMINO[rng.integers(0, len(_AMINO), int(mut.sum()))]
+    keep = np.ones(length, dtype=bool)
+    for s in rng.integers(0, max(1, length - 20), deletions):
+        keep[s:s + int(rng.integers(1, 15))] = False
+    return sym[keep].tobytes().decode(), ref.tobytes().decode()
+
+
+def ensure_inputs(workdir: str, p: dict) -> dict:
+    """Generate (or reuse) the synthetic FASTA and GFF3 for parameters `p`."""
+    os.makedirs(workdir, exist_ok=True)
+    size = int(p["fasta_mb"] * 1_000_000)
+    fasta = os.path.join(workdir, f"synth_{p['fasta_mb']}Mb_gc{p['gc']}_c{p['contigs']}_s{p['seed']}.fasta")
+    gff = os.path.join(workdir, f"synth_{p['features']}f_b{p['attr_bloat']}_s{p['seed']}.gff3")
+    if not os.path.exists(fasta):
+        print(f"[gen] {fasta}", flush=True)
+        synth_fasta(fasta + ".tmp", size, p["gc"], p["contigs"], seed=p["seed"])
+        os.replace(fasta + ".tmp", fasta)
+    if not os.path.exists(gff):
+        print(f"[gen] {gff}", flush=True)
+        synth_gff(gff + ".tmp", p["features"], genome_size=max(size, 100_000), attr_bloat=p["attr_bloat"],
+                  seed=p["seed"])
+        os.replace(gff + ".tmp", gff)
+    return {"fasta": fasta, "gff": gff}
+
+
+# ---------- Benchmarks (each runs in its own process) ----------
+def _best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def bench_fasta_parse(fasta, repeat):
+    from compute_genome_stats import gc_content, parse_fasta
+    return _best(lambda: [gc_content(s) for s in parse_fasta(fasta)], repeat), os.path.getsize(fasta) / 1e6, "MB"
+
+
+def bench_fasta_scan(fasta, repeat):
+    from compute_genome_stats import scan_fasta
+    return _best(lambda: scan_fasta(fasta), repeat), os.path.getsize(fasta) / 1e6, "MB"
+
+
+def bench_gff_parse(gff, repeat):
+    from compare_gene_lengths import extract_lengths_from_gff
+    n = len(extract_lengths_from_gff(gff, cache=False)[0])
+    return _best(lambda: extract_lengths_from_gff(gff, cache=False), repeat), n, "features"
+
+
+def bench_gff_cached(gff, repeat):
+    from compare_gene_lengths import extract_lengths_from_gff
+    from gff_table import GFFTable
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        GFFTable.parse(gff).save(cache_dir)
+
+        def run():
+            return extract_lengths_from_gff(gff, table=GFFTable.load(cache_dir))
+        n = len(run()[0])
+        return _best(run, repeat), n, "features"
+
+
+def _length_samples(n, seed):
+    rng = np.random.default_rng(seed)
+    x = (rng.lognormal(6.7, 0.6, n) // 3 * 3).tolist()
+    y = (np.asarray(x) * rng.normal(0.95, 0.1, n) // 3 * 3).tolist()
+    return x, y
+
+
+def bench_mann_whitney(n, repeat):
+    from compare_gene_lengths import mann_whitney_u
+    x, y = _length_samples(n, 1)
+    return _best(lambda: mann_whitney_u(x, y), repeat), 2 * n, "values"
+
+
+def bench_wilcoxon(n, repeat):
+    from compare_gene_lengths import wilcoxon_signed_rank
+    x, y = _length_samples(n, 2)
+    return _best(lambda: wilcoxon_signed_rank(x, y), repeat), n, "pairs"
+
+
+def bench_align(engine, length, repeat):
+    from compare_gene_losses import ENGINES
+    sym, ref = synth_protein_pair(length, seed=length)
+    return _best(lambda: ENGINES[engine](sym, ref), repeat), len(sym) * len(ref), "cells"
+
+
+def bench_plot(gff, bins, repeat):
+    from figures import render
+    from plot_gene_lengths import lengths_from_gff, pair_hist_job
+    lengths = lengths_from_gff(gff)
+    with tempfile.TemporaryDirectory() as tmp:
+        def run():
+            job = pair_hist_job(lengths, lengths * 0.9, "A", "B", [], os.path.join(tmp, "hist.png"), bins=bins)
+            render(job)
+        return _best(run, repeat), 1, "figures"
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+
+def _run_isolated(fn, args):
+    seconds, items, unit = fn(*args)
+    return {"seconds": seconds, "items": items, "unit": unit, "throughput": items / seconds if seconds else None,
+            "peak_rss_mb": _peak_rss_mb()}
+
+
+def plan(groups, inputs, p, repeat) -> list[tuple]:
+    """(name, function, args) for every benchmark in the selected groups."""
+    todo = []
+    if "fasta" in groups:
+        todo += [("fasta.parse_fasta+gc_content", bench_fasta_parse, (inputs["fasta"], repeat)),
+                 ("fasta.scan_fasta", bench_fasta_scan, (inputs["fasta"], repeat))]
+    if "gff" in groups:
+        todo += [("gff.extract_lengths", bench_gff_parse, (inputs["gff"], repeat)),
+                 ("gff.extract_lengths_cached", bench_gff_cached, (inputs["gff"], repeat))]
+    if "stats" in groups:
+        todo += [("stats.mann_whitney_u", bench_mann_whitney, (p["features"], repeat)),
+                 ("stats.wilcoxon_signed_rank", bench_wilcoxon, (p["features"], repeat))]
+    if "align" in groups:
+        for L in p["align_lengths"]:
+            for engine in ("reference", "vectorized", "linear", "banded"):
+                if engine == "reference" and L > 2000:
+                    continue  # pure-Python loop: minutes per run beyond this
+                todo.append((f"align.{engine}[{L}]", bench_align, (engine, L, repeat)))
+    if "plot" in groups:
+        todo.append(("plot.pair_hist", bench_plot, (inputs["gff"], 60, repeat)))
+    return todo
+
+
+# ---------- History and baseline ----------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump(data, out, indent=1)
+    os.replace(tmp, path)
+
+
+def compare_to_baseline(run: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Per benchmark present in both: time ratio (run / baseline) and whether it regressed."""
+    rows = []
+    for name, r in run["results"].items():
+        b = baseline.get("results", {}).get(name)
+        if not b or not b.get("seconds"):
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        rows.append({"name": name, "baseline_s": b["seconds"], "seconds": r["seconds"], "ratio": ratio,
+                     "rss_ratio": r["peak_rss_mb"] / b["peak_rss_mb"] if b.get("peak_rss_mb") else None,
+                     "regressed": ratio > 1 + tolerance})
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the analysis scripts on synthetic genomes and annotations.")
+    ap.add_argument("--scale", choices=sorted(SCALES), default="small", help="Preset input sizes (default: small)")
+    ap.add_argument("--only", nargs="*", choices=GROUPS, default=None, help="Benchmark groups to run (default: all)")
+    ap.add_argument("--fasta-mb", type=float, default=None, help="Synthetic genome size in Mb")
+    ap.add_argument("--features", type=int, default=None, help="Synthetic CDS count (also the sample size for stats)")
+    ap.add_argument("--gc", type=float, default=0.5, help="GC fraction of the synthetic genome (default: 0.5)")
+    ap.add_argument("--contigs", type=int, default=1, help="Records in the synthetic FASTA (default: 1)")
+    ap.add_argument("--attr-bloat", type=int, default=0, help="Extra attribute characters per GFF line (default: 0)")
+    ap.add_argument("--align-lengths", type=int, nargs="*", default=None, help="Protein lengths for the alignment benchmarks")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data (default: 0)")
+    ap.add_argument("--repeat", type=int, default=3, help="Timings per benchmark; the best is kept (default: 3)")
+    ap.add_argument("--workdir", default="bench_data", help="Where synthetic inputs are kept (default: bench_data)")
+    ap.add_argument("--history", default="bench_history.json", help="JSON history every run is appended to")
+    ap.add_argument("--baseline", default=None, help="Compare this run against a saved baseline JSON")
+    ap.add_argument("--save-baseline", default=None, help="Save this run as the baseline JSON")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs baseline (default: 0.2 = 20%%)")
+    args = ap.parse_args()
+
+    p = dict(SCALES[args.scale])
+    for key in ("fasta_mb", "features", "align_lengths"):
+        if getattr(args, key) is not None:
+            p[key] = getattr(args, key)
+    p.update(gc=args.gc, contigs=args.contigs, attr_bloat=args.attr_bloat, seed=args.seed)
+    groups = args.only or GROUPS
+
+    # Fresh interpreters, so each peak RSS belongs to one benchmark. Linux carries ru_maxrss
+    # across fork+exec, so the data is also generated in a child to keep this process small.
+    ctx = multiprocessing.get_context("spawn")
+    inputs = {}
+    if {"fasta", "gff", "plot"} & set(groups):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            inputs = pool.submit(ensure_inputs, args.workdir, p).result()
+    results = {}
+    for name, fn, fn_args in plan(groups, inputs, p, args.repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                r = pool.submit(_run_isolated, fn, fn_args).result()
+            except Exception as e:
+                print(f"[error] {name}: {e}", file=sys.stderr)
+                continue
+        results[name] = r
+        print(f"{name:<36} {r['seconds']:>9.4f} s  {r['throughput']:>14,.1f} {r['unit']}/s  "
+              f"peak RSS {r['peak_rss_mb']:>8.1f} MB", flush=True)
+
+    run = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_commit(),
+           "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+           "scale": args.scale, "params": p, "repeat": args.repeat, "results": results}
+    history = load_json(args.history, [])
+    history.append(run)
+    save_json(args.history, history)
+    print(f"[saved] {args.history} ({len(history)} runs)")
+    if args.save_baseline:
+        save_json(args.save_baseline, run)
+        print(f"[saved] baseline {args.save_baseline}")
+
+    if args.baseline:
+        baseline = load_json(args.baseline, None)
+        if baseline is None:
+            print(f"[WARN] Baseline not found: {args.baseline}", file=sys.stderr)
+            return
+        if baseline.get("params") != p:
+            print("[WARN] Baseline was recorded with different input parameters; ratios may not be comparable")
+        rows = compare_to_baseline(run, baseline, args.tolerance)
+        for r in rows:
+            flag = "REGRESSION" if r["regressed"] else "ok"
+            print(f"{r['name']:<36} {r['baseline_s']:>9.4f} -> {r['seconds']:>9.4f} s  x{r['ratio']:.2f}  [{flag}]")
+        if any(r["regressed"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+codon_usage.py
+Codon usage, RSCU, GC3 and k-mer spectra over all annotated CDSs of a genome.
+
+Usage:
+  python codon_usage.py \
+      --genome "Wigglesworthia glossinidia (symb)" wigglesworthia_g_sequence.fasta Wigglesworthia_glossinidia.gff3 \
+      --genome "Chlamydophila pneumoniae TW-183 (symb)" c_pneumoniae.fasta c_pneumoniae_tw183.gff3 \
+      --k 2 4 6 --out_prefix results/codon --genome-stats genome_stats.tsv
+
+Every CDS (multi-part CDSs spliced, '-' strand reverse-complemented, via fasta_index.py) is
+integer-encoded (A/C/G/T = 0-3, anything else 4) into one array with the CDS boundaries kept as
+offsets. Codon indexes (16a + 4b + c) at every in-frame position and k-mer indexes from a rolling
+base-4 sum are then counted with np.bincount; codons or k-mers touching a non-ACGT base or a CDS
+boundary are skipped. Per genome it writes:
+  <prefix>.<label>.codon_usage.tsv     codon, amino acid (table 11), count, per thousand, RSCU
+  <prefix>.<label>.kmer<k>.tsv         k-mer, count, frequency (k <= 8)
+  <prefix>.<label>.cds_composition.tsv per CDS: id, gene, length, GC, GC1, GC2, GC3
+and, with --genome-stats, adds the genome-level summary columns (cds_count, coding_bp,
+coding_gc_pct, gc1_pct, gc2_pct, gc3_pct, gc3_length_spearman) to the rows of genome_stats.tsv
+with the same label. compute_genome_stats.py rewrites that file, so run this afterwards.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+from fasta_index import CODON_TABLE, IndexedFasta, cds_sequence, read_cds_features
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
+from rank_tests import rankdata
+
+MAX_K = 8
+BASES = "ACGT"
+CODONS = [a + b + c for a in BASES for b in BASES for c in BASES]  # index 16a + 4b + c
+CODON_AA = [CODON_TABLE[c] for c in CODONS]
+SUMMARY_COLUMNS = ("cds_count", "coding_bp", "coding_gc_pct", "gc1_pct", "gc2_pct", "gc3_pct",
+                   "gc3_length_spearman")
+
+_ENCODE = np.full(256, 4, dtype=np.int64)
+for _i, _b in enumerate(BASES):
+    _ENCODE[ord(_b)] = _ENCODE[ord(_b.lower())] = _i
+_ENCODE[[ord("U"), ord("u")]] = 3
+
+
+# ---------- CDS loading ----------
+def load_cds(fasta_path: str, gff_path: str) -> dict:
+    """All CDSs of a genome as one encoded array: {"codes", "offsets", "lengths", "features"}."""
+    with stage("cds.extract", gff=gff_path) as st:
+        seqs, feats = [], []
+        with IndexedFasta(fasta_path) as fa:
+            for feat in read_cds_features(gff_path):
+                if feat["seqid"] in fa:
+                    seqs.append(cds_sequence(fa, feat))
+                    feats.append(feat)
+        lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+        codes = _ENCODE[np.frombuffer(b"".join(seqs), dtype=np.uint8)]
+        st["cds"] = len(feats)
+        st["bases"] = len(codes)
+    offsets = np.cumsum(lengths) - lengths
+    return {"codes": codes, "offsets": offsets, "lengths": lengths, "features": feats}
+
+
+def _segment_ids(lengths: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(lengths)), counts)
+
+
+# ---------- Counting ----------
+def codon_positions(cds: dict) -> tuple[np.ndarray, np.ndarray]:
+    """(first-base position, CDS index) of every complete in-frame codon, in order."""
+    n_codons = cds["lengths"] // 3
+    gene = _segment_ids(cds["lengths"], n_codons)
+    first = np.concatenate(([0], np.cumsum(n_codons)[:-1])).astype(np.int64)
+    within = np.arange(int(n_codons.sum()), dtype=np.int64) - np.repeat(first, n_codons)
+    return np.repeat(cds["offsets"], n_codons) + 3 * within, gene
+
+
+def codon_counts(cds: dict) -> np.ndarray:
+    """Counts of the 64 codons (index 16a + 4b + c) over all CDSs."""
+    with stage("codons.count") as st:
+        pos, _ = codon_positions(cds)
+        c = cds["codes"]
+        a, b, d = c[pos], c[pos + 1], c[pos + 2]
+        ok = (a < 4) & (b < 4) & (d < 4)
+        counts = np.bincount((16 * a + 4 * b + d)[ok], minlength=64)
+        st["codons"] = int(ok.sum())
+    return counts
+
+
+def rscu(counts: np.ndarray) -> np.ndarray:
+    """Relative synonymous codon usage: count / mean count of the amino acid's codons (NaN if unused)."""
+    aas = sorted(set(CODON_AA))
+    aa_idx = np.array([aas.index(a) for a in CODON_AA])
+    family_size = np.bincount(aa_idx)[aa_idx]
+    family_total = np.bincount(aa_idx, weights=counts)[aa_idx]
+    return np.divide(counts * family_size, family_total, out=np.full(64, np.nan), where=family_total > 0)
+
+
+def kmer_counts(cds: dict, k: int) -> np.ndarray:
+    """Counts of all 4**k k-mers (base-4 index, first base most significant) inside the CDSs."""
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+    with stage("kmers.count", k_size=str(k)) as st:
+        c = cds["codes"]
+        n = len(c) - k + 1
+        if n <= 0:
+            return np.zeros(4 ** k, dtype=np.int64)
+        idx = np.zeros(n, dtype=np.int64)
+        for j in range(k):  # rolling base-4 index of the k-mer starting at each position
+            idx = idx * 4 + np.minimum(c[j:j + n], 3)
+        bad = np.concatenate(([0], np.cumsum(c >= 4)))
+        ends = np.repeat(cds["offsets"] + cds["lengths"], cds["lengths"])[:n]
+        ok = (bad[k:k + n] - bad[:n] == 0) & (np.arange(n) + k <= ends)
+        counts = np.bincount(idx[ok], minlength=4 ** k)
+        st["kmers"] = int(ok.sum())
+    return counts
+
+
+def cds_composition(cds: dict) -> dict:
+    """Per-CDS length and GC% overall and at codon positions 1, 2 and 3 (over ACGT bases only)."""
+    c = cds["codes"]
+    n_genes = len(cds["lengths"])
+    gc = (c == 1) | (c == 2)
+    acgt = c < 4
+    gene_of_base = _segment_ids(cds["lengths"], cds["lengths"])
+    out = {"length": cds["lengths"],
+           "gc": 100 * _ratio(np.bincount(gene_of_base, weights=gc, minlength=n_genes),
+                              np.bincount(gene_of_base, weights=acgt, minlength=n_genes))}
+    pos, gene = codon_positions(cds)
+    for p in range(3):
+        out[f"gc{p + 1}"] = 100 * _ratio(np.bincount(gene, weights=gc[pos + p], minlength=n_genes),
+                                         np.bincount(gene, weights=acgt[pos + p], minlength=n_genes))
+    return out
+
+
+def _ratio(num, den):
+    return np.divide(num, den, out=np.full(len(num), np.nan), where=den > 0)
+
+
+def genome_summary(cds: dict, comp: dict) -> dict:
+    """Genome-level row for genome_stats.tsv: CDS count, coding bp, coding GC / GC1-3 and the
+    Spearman correlation between CDS length and GC3."""
+    c = cds["codes"]
+    acgt = c < 4
+    pos, _ = codon_positions(cds)
+    row = {"cds_count": len(cds["lengths"]), "coding_bp": int(cds["lengths"].sum()),
+           "coding_gc_pct": 100 * float(((c == 1) | (c == 2)).sum()) / max(int(acgt.sum()), 1)}
+    for p in range(3):
+        b = c[pos + p]
+        row[f"gc{p + 1}_pct"] = 100 * float(((b == 1) | (b == 2)).sum()) / max(int((b < 4).sum()), 1)
+    ok = ~np.isnan(comp["gc3"])
+    if ok.sum() > 2:
+        r1, _ = rankdata(comp["length"][ok])
+        r2, _ = rankdata(comp["gc3"][ok])
+        row["gc3_length_spearman"] = float(np.corrcoef(r1, r2)[0, 1])
+    else:
+        row["gc3_length_spearman"] = float("nan")
+    return row
+
+
+# ---------- Output ----------
+def _slug(label: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", label).strip("_") or "genome"
+
+
+def write_tables(cds: dict, label: str, out_prefix: str, ks=(4,)) -> tuple[dict, list[str]]:
+    """Write the codon, k-mer and per-CDS tables for one genome; returns (summary row, paths)."""
+    stem = f"{out_prefix}.{_slug(label)}"
+    counts = codon_counts(cds)
+    r = rscu(counts)
+    total = counts.sum()
+    comp = cds_composition(cds)
+    kmers = {k: kmer_counts(cds, k) for k in ks}
+    written = []
+    with stage("output.write", files=2 + len(ks)):
+        path = f"{stem}.codon_usage.tsv"
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("codon\taa\tcount\tper_thousand\trscu\n")
+            for codon, aa, n, x in zip(CODONS, CODON_AA, counts.tolist(), r.tolist()):
+                per_k = 1000.0 * n / total if total else 0.0
+                out.write(f"{codon}\t{aa}\t{n}\t{per_k:.3f}\t{'' if np.isnan(x) else f'{x:.4f}'}\n")
+        written.append(path)
+        for k, kc in kmers.items():
+            path = f"{stem}.kmer{k}.tsv"
+            idx = np.arange(4 ** k)
+            digits = np.stack([(idx // 4 ** (k - 1 - j)) % 4 for j in range(k)], axis=1)
+            names = ["".join(row) for row in np.array(list(BASES))[digits]]
+            freq = kc / kc.sum() if kc.sum() else np.zeros(len(kc))
+            with open(path, "w", encoding="utf-8") as out:
+                out.write("kmer\tcount\tfrequency\n")
+                for name, n, f in zip(names, kc.tolist(), freq.tolist()):
+                    out.write(f"{name}\t{n}\t{f:.6g}\n")
+            written.append(path)
+        path = f"{stem}.cds_composition.tsv"
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("id\tgene\tlocus_tag\tlength_bp\tgc_pct\tgc1_pct\tgc2_pct\tgc3_pct\n")
+            for i, feat in enumerate(cds["features"]):
+                vals = "\t".join("" if np.isnan(comp[key][i]) else f"{comp[key][i]:.2f}"
+                                 for key in ("gc", "gc1", "gc2", "gc3"))
+                out.write(f"{feat['id']}\t{feat['gene']}\t{feat['locus_tag']}\t{comp['length'][i]}\t{vals}\n")
+        written.append(path)
+    return genome_summary(cds, comp), written
+
+
+def merge_genome_stats(tsv_path: str, summaries: dict) -> list[str]:
+    """Add / overwrite SUMMARY_COLUMNS in genome_stats.tsv for each {label: summary row}.
+
+    Other columns and rows are kept as they are; returns the labels that had no row.
+    """
+    with open(tsv_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    header = lines[0].split("\t")
+    for col in SUMMARY_COLUMNS:
+        if col not in header:
+            header.append(col)
+    li = header.index("label")
+    out_lines, seen = ["\t".join(header)], set()
+    for line in lines[1:]:
+        if not line:
+            continue
+        fields = line.split("\t") + [""] * (len(header) - len(line.split("\t")))
+        row = summaries.get(fields[li])
+        if row is not None:
+            seen.add(fields[li])
+            for col in SUMMARY_COLUMNS:
+                v = row[col]
+                fields[header.index(col)] = (f"{v:.4f}" if not np.isnan(v) else "") if isinstance(v, float) else str(v)
+        out_lines.append("\t".join(fields))
+    with open(tsv_path, "w", encoding="utf-8") as out:
+        out.write("\n".join(out_lines) + "\n")
+    return [label for label in summaries if label not in seen]
+
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Codon usage, RSCU, GC3 and k-mer spectra over annotated CDSs.")
+    ap.add_argument("--genome", nargs=3, action="append", required=True, metavar=("LABEL", "FASTA", "GFF"),
+                    help="One genome: label (as in genome_stats.tsv), FASTA and GFF3; repeat for more")
+    ap.add_argument("--k", type=int, nargs="*", default=[4], help=f"k-mer sizes to count, each 1-{MAX_K} (default: 4)")
+    ap.add_argument("--out_prefix", default="codon", help="Prefix for output files (default: codon)")
+    ap.add_argument("--genome-stats", default=None,
+                    help="genome_stats.tsv to extend with the per-genome summary columns (matched by label)")
+    add_profile_argument(ap)
+    args = ap.parse_args()
+    setup_profiling(args)
+    if any(not 1 <= k <= MAX_K for k in args.k):
+        ap.error(f"--k values must be between 1 and {MAX_K}")
+
+    summaries = {}
+    for label, fasta, gff in args.genome:
+        cds = load_cds(fasta, gff)
+        if not len(cds["lengths"]):
+            print(f"[WARN] No CDS of {gff} found in {fasta}; skipping {label}.", flush=True)
+            continue
+        summaries[label], written = write_tables(cds, label, args.out_prefix, ks=args.k)
+        s = summaries[label]
+        for path in written:
+            print(f"Wrote: {path}")
+        print(f"{label}: {s['cds_count']} CDSs, {s['coding_bp']} bp, GC {s['coding_gc_pct']:.2f}%, "
+              f"GC3 {s['gc3_pct']:.2f}%, Spearman(length, GC3)={s['gc3_length_spearman']:.3f}")
+
+    if args.genome_stats and summaries:
+        if not os.path.exists(args.genome_stats):
+            print(f"ERROR: {args.genome_stats} not found; run compute_genome_stats.py first.", file=sys.stderr)
+            sys.exit(1)
+        for label in merge_genome_stats(args.genome_stats, summaries):
+            print(f"[WARN] No row labelled {label!r} in {args.genome_stats}.", flush=True)
+        print(f"[OK] Updated {args.genome_stats}")
+
+
+if __name__ == "__main__":
+    main()
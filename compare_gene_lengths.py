@@ -1,8 +1,19 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import json
 import math
+import os
 import statistics as stats
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gff_table import STRAND_SYMBOLS, GFFTable
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
+from rank_tests import (EXACT_MAX_N, rankdata, signed_ranks, tie_term, mann_whitney_exact_p, wilcoxon_exact_p,
+                        permutation_p, bootstrap_median_diff, effect_sizes)
+from sketches import DEFAULT_ACCURACY, sketch_table
 
 def parse_gff_attributes(attr_field):
     out = {}
@@ -21,61 +32,83 @@ def parse_gff_attributes(attr_field):
         out[k.strip()] = v.strip()
     return out
 
-def extract_lengths_from_gff(path, feature_type="CDS", id_keys=("ID","locus_tag","gene","Name","protein_id")):
-    lengths = []
-    id_to_len = {}
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            if not line or line.startswith("#"):
-                continue
-            cols = line.rstrip("\n").split("\t")
-            if len(cols) < 9:
-                continue
-            seqid, source, ftype, start, end, score, strand, phase, attrs = cols
-            if ftype != feature_type:
-                continue
-            try:
-                start_i = int(start)
-                end_i = int(end)
-            except ValueError:
-                continue
-            length = abs(end_i - start_i) + 1
-            lengths.append(length)
-            attrd = parse_gff_attributes(attrs)
-            chosen_id = None
-            for k in id_keys:
-                if k in attrd and attrd[k] and attrd[k] != ".":
-                    chosen_id = attrd[k]
-                    break
+def load_gff(path, cache=True):
+    """GFFTable for `path`; with cache=True it comes from (or is written to) the binary .gffcache."""
+    with stage("gff.load", path=path, cache=cache) as st:
+        table = GFFTable.cached(path) if cache else GFFTable.parse(path)
+        st["features"] = len(table)
+    return table
+
+def extract_lengths_from_gff(path, feature_type="CDS", id_keys=("ID","locus_tag","gene","Name","protein_id"), table=None, cache=True):
+    """Feature lengths (file order) and {first usable ID: length} for one feature type.
+
+    Pass an already parsed GFFTable as `table` to query another feature type without rereading.
+    """
+    if table is None:
+        table = load_gff(path, cache=cache)
+    with stage("gff.attributes", feature=feature_type) as st:
+        idx = table.select(feature_type)
+        lengths = table.lengths(idx).tolist()
+        id_to_len = {}
+        for chosen_id, length in zip(table.first_attribute(id_keys, idx), lengths):
             if chosen_id is not None and chosen_id not in id_to_len:
                 id_to_len[chosen_id] = length
+        st["features"] = len(lengths)
     return lengths, id_to_len
 
-def mann_whitney_u(x, y):
-    combined = [(val, 0) for val in x] + [(val, 1) for val in y]
-    combined.sort(key=lambda t: t[0])
-    ranks = {}
-    i = 0
-    N = len(combined)
-    while i < N:
-        j = i + 1
-        while j < N and combined[j][0] == combined[i][0]:
-            j += 1
-        avg_rank = (i + 1 + j) / 2.0
-        for k in range(i, j):
-            ranks[k] = avg_rank
-        i = j
-    R1 = sum(ranks[i] for i in range(N) if combined[i][1] == 0)
-    R2 = sum(ranks[i] for i in range(N) if combined[i][1] == 1)
-    n1 = len(x); n2 = len(y)
-    U1 = R1 - n1*(n1+1)/2.0
-    U2 = R2 - n2*(n2+1)/2.0
+def _str_width(values):
+    return max([1] + [len(v) for v in values])
+
+def length_records(table, feature_type="CDS", id_keys=("ID","locus_tag","gene","Name","protein_id")):
+    """Structured array (file order) with length, seqid, start, end, strand and ID per feature,
+    the columnar counterpart of *.lengths.tsv; ID is "" where no id_keys attribute is usable."""
+    idx = table.select(feature_type)
+    seqids = table.seqid_names(idx)
+    ids = ["" if v is None else v for v in table.first_attribute(id_keys, idx)]
+    strands = [STRAND_SYMBOLS.get(int(c), ".") for c in table.strand[idx]]
+    rec = np.empty(len(idx), dtype=[("length", "i8"), ("seqid", f"U{_str_width(seqids)}"), ("start", "i8"),
+                                    ("end", "i8"), ("strand", "U1"), ("id", f"U{_str_width(ids)}")])
+    rec["length"] = table.lengths(idx)
+    rec["seqid"] = seqids
+    rec["start"] = table.start[idx]
+    rec["end"] = table.end[idx]
+    rec["strand"] = strands
+    rec["id"] = ids
+    return rec
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def lengths_meta_path(npy_path):
+    return npy_path[:-len(".npy")] + ".meta.json" if npy_path.endswith(".npy") else npy_path + ".meta.json"
+
+def write_lengths_npy(path, records, label, feature_type, source_gff):
+    """Write records to <stem>.lengths.npy plus a <stem>.lengths.meta.json header (label, feature
+    type, source GFF and its sha256) so readers can memory-map the lengths without parsing text."""
+    np.save(path, records)
+    meta = {"label": label, "feature": feature_type, "n": int(len(records)), "columns": list(records.dtype.names),
+            "source_gff": source_gff, "source_sha256": file_sha256(source_gff)}
+    with open(lengths_meta_path(path), "w", encoding="utf-8") as out:
+        json.dump(meta, out, indent=2)
+
+def read_lengths_npy(path, mmap=True):
+    """(records, meta) for a .lengths.npy; records are memory-mapped read-only by default."""
+    records = np.load(path, mmap_mode="r" if mmap else None)
+    try:
+        with open(lengths_meta_path(path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except OSError:
+        meta = {}
+    return records, meta
+
+def _mann_whitney_z_p(U1, n1, n2, T):
+    U2 = n1*n2 - U1
     U = min(U1, U2)
     mu_U = n1*n2/2.0
-    tie_counts = defaultdict(int)
-    for val, _ in combined:
-        tie_counts[val] += 1
-    T = sum(c**3 - c for c in tie_counts.values())
     sigma_U = math.sqrt(n1*n2*(n1+n2+1 - T/((n1+n2)*(n1+n2-1))) / 12.0)
     if sigma_U == 0:
         return U, float('nan'), 1.0
@@ -83,43 +116,109 @@ def mann_whitney_u(x, y):
     p = 2.0 * 0.5 * (1 - math.erf(abs(z)/math.sqrt(2)))
     return U, z, p
 
+def mann_whitney_u(x, y):
+    n1 = len(x); n2 = len(y)
+    ranks, tie_counts = rankdata(np.concatenate([np.asarray(x, dtype=float), np.asarray(y, dtype=float)]))
+    R1 = float(ranks[:n1].sum())
+    U1 = R1 - n1*(n1+1)/2.0
+    return _mann_whitney_z_p(U1, n1, n2, tie_term(tie_counts))
+
+def length_profile(lengths):
+    """Sorted lengths plus their distinct values, counts and within-genome tie term, computed once
+    per genome so that pairwise Mann-Whitney tests never re-sort."""
+    srt = np.sort(np.asarray(lengths, dtype=float))
+    values, counts = np.unique(srt, return_counts=True)
+    return {"sorted": srt, "values": values, "counts": counts, "n": len(srt), "T": tie_term(counts)}
+
+def mann_whitney_presorted(a, b):
+    """mann_whitney_u(x, y) from two length_profile()s, by merge-style rank counting.
+
+    U1 = sum over distinct x values of count * (#y below + 0.5 * #y equal), via searchsorted into
+    the sorted y; the tie term is T_x + T_y plus 3ab(a+b) for every value shared by both genomes.
+    """
+    ys = b["sorted"]
+    below = np.searchsorted(ys, a["values"], side="left")
+    equal = np.searchsorted(ys, a["values"], side="right") - below
+    U1 = float((a["counts"] * (below + 0.5 * equal)).sum())
+    _, ia, ib = np.intersect1d(a["values"], b["values"], assume_unique=True, return_indices=True)
+    ca = a["counts"][ia].astype(np.int64)
+    cb = b["counts"][ib].astype(np.int64)
+    T = a["T"] + b["T"] + int((3 * ca * cb * (ca + cb)).sum())
+    return _mann_whitney_z_p(U1, a["n"], b["n"], T)
+
+def adjust_pvalues(p, method="bh"):
+    """Multiple-testing correction: bh (Benjamini-Hochberg), holm, bonferroni or none. NaNs are kept."""
+    p = np.asarray(p, dtype=float)
+    out = np.full(p.shape, np.nan)
+    ok = ~np.isnan(p)
+    q = p[ok]
+    m = len(q)
+    if method == "none" or m == 0:
+        out[ok] = q
+        return out
+    if method == "bonferroni":
+        out[ok] = np.minimum(1.0, q * m)
+        return out
+    order = np.argsort(q, kind="mergesort")
+    ranked = q[order]
+    if method == "holm":
+        adj = np.maximum.accumulate(np.minimum(1.0, (m - np.arange(m)) * ranked))
+    elif method == "bh":
+        adj = np.minimum.accumulate((m / np.arange(m, 0, -1) * ranked[::-1]))[::-1]
+        adj = np.minimum(1.0, adj)
+    else:
+        raise ValueError(f"Unknown correction method: {method}")
+    res = np.empty(m)
+    res[order] = adj
+    out[ok] = res
+    return out
+
 def wilcoxon_signed_rank(x, y):
-    diffs = [a - b for a, b in zip(x, y)]
-    pairs = [(abs(d), 1 if d > 0 else -1) for d in diffs if d != 0]
-    if not pairs:
+    ranks, signs, tie_counts = signed_ranks(x, y)
+    N = len(ranks)
+    if not N:
         return 0.0, float('nan'), 1.0
-    pairs.sort(key=lambda t: t[0])
-    N = len(pairs)
-    ranks = [0.0]*N
-    i = 0
-    while i < N:
-        j = i + 1
-        while j < N and pairs[j][0] == pairs[i][0]:
-            j += 1
-        avg_rank = (i + 1 + j) / 2.0
-        for k in range(i, j):
-            ranks[k] = avg_rank
-        i = j
-    Wpos = sum(r for r, (_, sgn) in zip(ranks, pairs) if sgn > 0)
-    Wneg = sum(r for r, (_, sgn) in zip(ranks, pairs) if sgn < 0)
+    Wpos = float(ranks[signs > 0].sum())
+    Wneg = float(ranks[signs < 0].sum())
     W = min(Wpos, Wneg)
     mu = N*(N+1)/4.0
-    tie_counts = defaultdict(int)
-    for a, _ in pairs:
-        tie_counts[a] += 1
-    T = sum(c**3 - c for c in tie_counts.values())
+    T = tie_term(tie_counts)
     sigma = math.sqrt(N*(N+1)*(2*N+1)/24.0 - T/48.0)
     if sigma == 0:
         return W, float('nan'), 1.0
-    z = (W - mu - 0.5) / sigma if W < mu else (W - mu + 0.5) / sigma
+    z = (W - mu + 0.5) / sigma if W < mu else (W - mu - 0.5) / sigma
     p = 2.0 * 0.5 * (1 - math.erf(abs(z)/math.sqrt(2)))
     return W, z, p
 
+def extra_tests_report(x, y, px, py, exact=False, permutations=0, bootstrap=0, seed=None, jobs=None):
+    """Text block with exact/permutation p-values, effect sizes and bootstrap CIs for the
+    unpaired (x vs y) and, when there are shared IDs, paired (px vs py) comparisons."""
+    lines = []
+    for name, a, b, paired in (("Unpaired", x, y, False), ("Paired", px, py, True)):
+        if paired and not a:
+            continue
+        lines.append(f"{name} comparison, additional tests:")
+        if exact:
+            p = wilcoxon_exact_p(a, b) if paired else mann_whitney_exact_p(a, b)
+            lines.append(f"  exact p={p:.3g}" if p is not None else f"  exact p: skipped (n > {EXACT_MAX_N})")
+        if permutations:
+            p = permutation_p(a, b, paired=paired, n_resamples=permutations, seed=seed, jobs=jobs)
+            lines.append(f"  permutation p={p:.3g} ({permutations} resamples)")
+        es = effect_sizes(a, b, paired=paired)
+        if paired:
+            lines.append(f"  matched-pairs rank-biserial r={es['rank_biserial']:.3f}, median difference={es['median_diff']:.2f}")
+        else:
+            lines.append(f"  common-language effect={es['common_language']:.3f}, rank-biserial r={es['rank_biserial']:.3f}, "
+                         f"Hodges-Lehmann shift={es['hodges_lehmann']:.2f}")
+        if bootstrap:
+            est, lo, hi = bootstrap_median_diff(a, b, paired=paired, n_resamples=bootstrap, seed=seed, jobs=jobs)
+            lines.append(f"  median difference={est:.2f}, 95% bootstrap CI=({lo:.2f},{hi:.2f}) ({bootstrap} resamples)")
+    return "\n".join(lines) + "\n"
+
 def summarize(vec):
     if not vec:
         return {"n":0, "mean":float('nan'), "median":float('nan'), "iqr":(float('nan'), float('nan'))}
-    q1 = stats.quantiles(vec, n=4, method="inclusive")[0]
-    q3 = stats.quantiles(vec, n=4, method="inclusive")[2]
+    q1, _, q3 = stats.quantiles(vec, n=4, method="inclusive")
     return {"n": len(vec), "mean": stats.fmean(vec), "median": stats.median(vec), "iqr": (q1, q3)}
 
 def write_tsv(path, rows, header):
@@ -128,26 +227,102 @@ def write_tsv(path, rows, header):
         for r in rows:
             out.write("\t".join(str(x) for x in r) + "\n")
 
-def main():
-    ap = argparse.ArgumentParser(description="Compare gene/CDS length distributions between two genomes using GFF3.")
-    ap.add_argument("--gff1", required=True, help="Path to first genome GFF3 (e.g., symbiont)")
-    ap.add_argument("--gff2", required=True, help="Path to second genome GFF3 (e.g., free-living)")
-    ap.add_argument("--label1", default="genome1", help="Label for genome 1")
-    ap.add_argument("--label2", default="genome2", help="Label for genome 2")
-    ap.add_argument("--feature", choices=["CDS","gene"], default="CDS", help="Feature type to measure (default: CDS)")
-    ap.add_argument("--pair_key", default="locus_tag", help="GFF attribute key to attempt pairing on (e.g., locus_tag, gene, Name, protein_id)")
-    ap.add_argument("--out_prefix", default="comparison", help="Prefix for output files")
-    args = ap.parse_args()
+_PROFILES = None
+
+def _init_profiles(profiles):
+    global _PROFILES
+    _PROFILES = profiles
+
+def _pair_chunk(pairs):
+    return [(i, j) + mann_whitney_presorted(_PROFILES[i], _PROFILES[j]) for i, j in pairs]
+
+def all_vs_all(gffs, labels, out_prefix, feature="CDS", correction="bh", jobs=None, cache=True, chunk=64,
+               sketch=False, sketch_accuracy=DEFAULT_ACCURACY):
+    """Pairwise Mann-Whitney tests between every pair of genomes.
+
+    Each GFF is parsed (or loaded from the binary cache) and its lengths sorted once; the pairs
+    are then scored from the pre-sorted profiles in a process pool. Writes
+    <prefix>.genomes.tsv, <prefix>.pairs.tsv (long form, with adjusted p), square
+    <prefix>.{U,z,p,p_adj}.tsv matrices and, with sketch=True, <prefix>.<label>.sketch.json.
+    """
+    profiles = []
+    with open(f"{out_prefix}.genomes.tsv", "w", encoding="utf-8") as out:
+        out.write("label\tgff\tn\tmean\tmedian\n")
+        for label, path in zip(labels, gffs):
+            table = load_gff(path, cache=cache)
+            lengths, _ = extract_lengths_from_gff(path, feature_type=feature, table=table)
+            with stage("stats.profile", values=len(lengths)):
+                prof = length_profile(lengths)
+            profiles.append(prof)
+            if sketch:
+                sketch_table(table, feature, sketch_accuracy, label).save(f"{out_prefix}.{label}.sketch.json")
+            mean = float(prof["sorted"].mean()) if prof["n"] else float("nan")
+            median = float(np.median(prof["sorted"])) if prof["n"] else float("nan")
+            out.write(f"{label}\t{path}\t{prof['n']}\t{mean:.2f}\t{median:.2f}\n")
+
+    k = len(profiles)
+    pairs = [(i, j) for i in range(k) for j in range(i + 1, k)]
+    chunks = [pairs[i:i + chunk] for i in range(0, len(pairs), chunk)]
+    with stage("stats.mann_whitney", pairs=len(pairs)):
+        if jobs == 1 or len(chunks) <= 1:
+            _init_profiles(profiles)
+            results = [r for c in chunks for r in _pair_chunk(c)]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_profiles, initargs=(profiles,)) as pool:
+                results = [r for rs in pool.map(_pair_chunk, chunks) for r in rs]
 
-    lengths1, idmap1 = extract_lengths_from_gff(args.gff1, feature_type=args.feature)
-    lengths2, idmap2 = extract_lengths_from_gff(args.gff2, feature_type=args.feature)
+    with stage("output.write", pairs=len(pairs)):
+        p_adj = _write_all_vs_all(results, profiles, labels, out_prefix, correction)
+    return results, p_adj
 
-    write_tsv(f"{args.out_prefix}.{args.label1}.lengths.tsv",
-              [(i+1, L) for i, L in enumerate(lengths1)], ["index","length_bp"])
-    write_tsv(f"{args.out_prefix}.{args.label2}.lengths.tsv",
-              [(i+1, L) for i, L in enumerate(lengths2)], ["index","length_bp"])
+def _write_all_vs_all(results, profiles, labels, out_prefix, correction):
+    k = len(profiles)
+    p_adj = adjust_pvalues([r[4] for r in results], correction)
+    mats = {name: np.full((k, k), np.nan) for name in ("U", "z", "p", "p_adj")}
+    with open(f"{out_prefix}.pairs.tsv", "w", encoding="utf-8") as out:
+        out.write(f"label1\tlabel2\tn1\tn2\tU\tz\tp\tp_adj_{correction}\n")
+        for (i, j, U, z, p), q in zip(results, p_adj):
+            out.write(f"{labels[i]}\t{labels[j]}\t{profiles[i]['n']}\t{profiles[j]['n']}\t{U:.2f}\t{z:.3f}\t{p:.3g}\t{q:.3g}\n")
+            for name, v in (("U", U), ("z", z), ("p", p), ("p_adj", q)):
+                mats[name][i, j] = mats[name][j, i] = v
+    for name, mat in mats.items():
+        write_tsv(f"{out_prefix}.{name}.tsv",
+                  [[labels[i]] + ["" if np.isnan(v) else f"{v:.6g}" for v in mat[i]] for i in range(k)],
+                  ["label"] + list(labels))
+    return p_adj
 
-    U, z_u, p_u = mann_whitney_u(lengths1, lengths2)
+def compare_two(gff1, gff2, label1="genome1", label2="genome2", out_prefix="comparison", feature="CDS",
+                fmt="tsv", cache=True, sketch=False, sketch_accuracy=DEFAULT_ACCURACY, exact=False, permutations=0,
+                bootstrap=0, report_effect_sizes=False, seed=None, jobs=None):
+    """Two-genome comparison: per-genome lengths (.tsv and/or .npy), <prefix>.stats.txt and, with
+    sketch=True, per-genome .sketch.json summaries.
+
+    Returns {"outputs": [written paths], "paired": number of shared IDs (0 if none)}.
+    """
+    table1 = load_gff(gff1, cache=cache)
+    table2 = load_gff(gff2, cache=cache)
+    lengths1, idmap1 = extract_lengths_from_gff(gff1, feature_type=feature, table=table1)
+    lengths2, idmap2 = extract_lengths_from_gff(gff2, feature_type=feature, table=table2)
+
+    written = []
+    with stage("output.lengths", format=fmt) as st:
+        for label, gff, table, lengths in ((label1, gff1, table1, lengths1),
+                                           (label2, gff2, table2, lengths2)):
+            stem = f"{out_prefix}.{label}.lengths"
+            if fmt in ("tsv", "both"):
+                write_tsv(f"{stem}.tsv", [(i+1, L) for i, L in enumerate(lengths)], ["index","length_bp"])
+                written.append(f"{stem}.tsv")
+            if fmt in ("npy", "both"):
+                write_lengths_npy(f"{stem}.npy", length_records(table, feature), label, feature, gff)
+                written.append(f"{stem}.npy")
+        if sketch:
+            for label, table in ((label1, table1), (label2, table2)):
+                sketch_table(table, feature, sketch_accuracy, label).save(f"{out_prefix}.{label}.sketch.json")
+                written.append(f"{out_prefix}.{label}.sketch.json")
+        st["features"] = len(lengths1) + len(lengths2)
+
+    with stage("stats.mann_whitney", values=len(lengths1) + len(lengths2)):
+        U, z_u, p_u = mann_whitney_u(lengths1, lengths2)
 
     paired1 = []
     paired2 = []
@@ -156,17 +331,18 @@ def main():
         for k in intersect_ids:
             paired1.append(idmap1[k])
             paired2.append(idmap2[k])
-        W, z_w, p_w = wilcoxon_signed_rank(paired1, paired2)
+        with stage("stats.wilcoxon", pairs=len(paired1)):
+            W, z_w, p_w = wilcoxon_signed_rank(paired1, paired2)
     else:
         W, z_w, p_w = float('nan'), float('nan'), float('nan')
 
     s1 = summarize(lengths1)
     s2 = summarize(lengths2)
 
-    with open(f"{args.out_prefix}.stats.txt", "w", encoding="utf-8") as out:
-        out.write(f"Feature: {args.feature}\n")
-        out.write(f"Genome 1 ({args.label1}): n={s1['n']}, mean={s1['mean']:.2f}, median={s1['median']:.2f}, IQR=({s1['iqr'][0]:.2f},{s1['iqr'][1]:.2f})\n")
-        out.write(f"Genome 2 ({args.label2}): n={s2['n']}, mean={s2['mean']:.2f}, median={s2['median']:.2f}, IQR=({s2['iqr'][0]:.2f},{s2['iqr'][1]:.2f})\n\n")
+    with stage("output.stats"), open(f"{out_prefix}.stats.txt", "w", encoding="utf-8") as out:
+        out.write(f"Feature: {feature}\n")
+        out.write(f"Genome 1 ({label1}): n={s1['n']}, mean={s1['mean']:.2f}, median={s1['median']:.2f}, IQR=({s1['iqr'][0]:.2f},{s1['iqr'][1]:.2f})\n")
+        out.write(f"Genome 2 ({label2}): n={s2['n']}, mean={s2['mean']:.2f}, median={s2['median']:.2f}, IQR=({s2['iqr'][0]:.2f},{s2['iqr'][1]:.2f})\n\n")
         out.write("Unpaired comparison (Mann-Whitney U, two-sided normal approx):\n")
         out.write(f"U={U:.2f}, z={z_u:.3f}, p={p_u:.3g}\n\n")
         if not math.isnan(p_w):
@@ -174,12 +350,67 @@ def main():
             out.write(f"W={W:.2f}, z={z_w:.3f}, p={p_w:.3g}\n")
         else:
             out.write("Paired comparison: no shared IDs found across chosen attributes; skipped.\n")
+        if exact or permutations or bootstrap or report_effect_sizes:
+            with stage("stats.extra", permutations=permutations, bootstrap=bootstrap):
+                out.write("\n" + extra_tests_report(lengths1, lengths2, paired1, paired2, exact=exact,
+                                                     permutations=permutations, bootstrap=bootstrap,
+                                                     seed=seed, jobs=jobs))
+
+    written.append(f"{out_prefix}.stats.txt")
+    return {"outputs": written, "paired": 0 if math.isnan(p_w) else len(paired1)}
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare gene/CDS length distributions between two genomes using GFF3.")
+    ap.add_argument("--gff1", help="Path to first genome GFF3 (e.g., symbiont)")
+    ap.add_argument("--gff2", help="Path to second genome GFF3 (e.g., free-living)")
+    ap.add_argument("--gffs", nargs="*", default=None, help="All-vs-all mode: GFF3 files to compare pairwise (use with --labels)")
+    ap.add_argument("--labels", nargs="*", default=None, help="Labels for --gffs (same order; default: file basenames)")
+    ap.add_argument("--correction", choices=["bh","holm","bonferroni","none"], default="bh",
+                    help="Multiple-testing correction for --gffs mode (default: bh)")
+    ap.add_argument("--label1", default="genome1", help="Label for genome 1")
+    ap.add_argument("--label2", default="genome2", help="Label for genome 2")
+    ap.add_argument("--feature", choices=["CDS","gene"], default="CDS", help="Feature type to measure (default: CDS)")
+    ap.add_argument("--pair_key", default="locus_tag", help="GFF attribute key to attempt pairing on (e.g., locus_tag, gene, Name, protein_id)")
+    ap.add_argument("--out_prefix", default="comparison", help="Prefix for output files")
+    ap.add_argument("--format", choices=["tsv","npy","both"], default="tsv",
+                    help="Per-genome lengths as .lengths.tsv, as a memory-mappable .lengths.npy (with seqid, start, end, strand, ID) or both")
+    ap.add_argument("--no-cache", action="store_true", help="Parse the GFF text and skip the binary .gffcache")
+    ap.add_argument("--sketch", action="store_true",
+                    help="Also write a mergeable <prefix>.<label>.sketch.json length summary per genome (see sketches.py)")
+    ap.add_argument("--sketch-accuracy", type=float, default=DEFAULT_ACCURACY,
+                    help="Relative quantile error of the --sketch summaries (default: 0.01)")
+    ap.add_argument("--exact", action="store_true", help=f"Also report exact p-values when n <= {EXACT_MAX_N}")
+    ap.add_argument("--permutations", type=int, default=0, help="Also report a Monte-Carlo permutation p-value from N resamples")
+    ap.add_argument("--bootstrap", type=int, default=0, help="Also report a bootstrap 95%% CI for the median difference from N resamples")
+    ap.add_argument("--effect-sizes", action="store_true", help="Also report rank-biserial / common-language effect sizes")
+    ap.add_argument("--seed", type=int, default=None, help="Random seed for --permutations/--bootstrap")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes for resampling and --gffs pairs (default: CPU count)")
+    add_profile_argument(ap)
+    args = ap.parse_args()
+    setup_profiling(args)
+
+    if args.gffs:
+        labels = args.labels or [os.path.splitext(os.path.basename(g))[0] for g in args.gffs]
+        if len(labels) != len(args.gffs):
+            ap.error("--labels must have the same length as --gffs")
+        all_vs_all(args.gffs, labels, args.out_prefix, feature=args.feature, correction=args.correction,
+                   jobs=args.jobs, cache=not args.no_cache, sketch=args.sketch,
+                   sketch_accuracy=args.sketch_accuracy)
+        print(f"Wrote: {args.out_prefix}.pairs.tsv and {args.out_prefix}.{{U,z,p,p_adj}}.tsv matrices "
+              f"({len(labels)} genomes, {len(labels)*(len(labels)-1)//2} pairs)")
+        return
+    if not (args.gff1 and args.gff2):
+        ap.error("--gff1 and --gff2 are required unless --gffs is given")
 
-    print(f"Wrote: {args.out_prefix}.{args.label1}.lengths.tsv")
-    print(f"Wrote: {args.out_prefix}.{args.label2}.lengths.tsv")
-    print(f"Wrote: {args.out_prefix}.stats.txt")
-    if not math.isnan(p_w):
-        print(f"Paired on {len(paired1)} shared IDs. See stats file for details.")
+    res = compare_two(args.gff1, args.gff2, args.label1, args.label2, args.out_prefix, feature=args.feature,
+                      fmt=args.format, cache=not args.no_cache, sketch=args.sketch,
+                      sketch_accuracy=args.sketch_accuracy,
+                      exact=args.exact, permutations=args.permutations, bootstrap=args.bootstrap,
+                      report_effect_sizes=args.effect_sizes, seed=args.seed, jobs=args.jobs)
+    for path in res["outputs"]:
+        print(f"Wrote: {path}")
+    if res["paired"]:
+        print(f"Paired on {res['paired']} shared IDs. See stats file for details.")
     else:
         print("No shared IDs for pairing; only unpaired test reported.")
 
@@ -5,25 +5,45 @@ Align two FASTA sequences (AA or NT), highlight regions *missing in the symbiont
 relative to the free-living reference, and save:
   - <basename>_loss_box_diagram.png/.pdf  (figure)
   - <basename>_loss_segments.csv          (start/end/length of each loss on the reference axis)
+  - <basename>_alignment_events.csv       (losses, insertions in the symbiont and substitution runs)
+  - <basename>_conservation.csv           (aligned / identical residues per --window of the reference)
 
 Usage (single pair):
   python compare_gene_losses.py --sym rpoH_B_aphidicola.fasta --free rpoH_E_coli.fasta \
       --gene rpoH --sym-label "B. aphidicola" --free-label "E. coli" --out rpoH
 
-You can run this once per pair (see commands at the bottom of this file).
+You can run this once per pair (see commands at the bottom of this file), or all pairs at once:
+  python compare_gene_losses.py --manifest pairs.tsv --jobs 4 --summary gene_loss_summary.tsv
+where pairs.tsv has the header: sym  free  gene  sym_label  free_label  out
+--engine picks the aligner: "vectorized" (default, NumPy row fill), "reference"
+(the original per-cell loop) or "linear" (divide-and-conquer, no full matrices); all give
+identical alignments. "banded" fills only a band around exact k-mer anchors (falling back to the
+full fill when anchors are sparse or the band would span most of the matrix) and reports the band
+and skipped cells. --max-matrix-mb switches to "linear" when the full matrices would not fit.
+Box diagrams are drawn headless through figures.py and skipped when unchanged since the last run.
+Every engine returns an alignment.Alignment (one op code per column); losses, identity and the
+event/conservation tables are computed from its arrays.
 """
 
 import argparse
+import json
+import sys
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from alignment import Alignment
+from compressed_io import open_input
+from figures import render_figures
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
 
 
 # ---------- FASTA I/O ----------
 def read_fasta(path: str) -> str:
     seq = []
-    with open(path, "r", encoding="utf-8") as f:
+    with open_input(path, "r") as f:
         for line in f:
             s = line.strip()
             if not s or s.startswith(">"):
@@ -33,7 +53,7 @@ def read_fasta(path: str) -> str:
 
 
 # ---------- Needleman–Wunsch (simple global alignment) ----------
-def needleman_wunsch(s1: str, s2: str, match=2, mismatch=-1, gap=-2) -> tuple[str, str]:
+def needleman_wunsch(s1: str, s2: str, match=2, mismatch=-1, gap=-2) -> Alignment:
     n, m = len(s1), len(s2)
     score = np.zeros((n + 1, m + 1), dtype=int)
     trace = np.zeros((n + 1, m + 1), dtype=np.int8)  # 0 diag, 1 up, 2 left
@@ -45,104 +65,506 @@ def needleman_wunsch(s1: str, s2: str, match=2, mismatch=-1, gap=-2) -> tuple[st
         score[0, j] = score[0, j - 1] + gap
         trace[0, j] = 2
 
-    for i in range(1, n + 1):
-        a = s1[i - 1]
-        for j in range(1, m + 1):
-            b = s2[j - 1]
-            diag = score[i - 1, j - 1] + (match if a == b else mismatch)
-            up = score[i - 1, j] + gap
-            left = score[i, j - 1] + gap
-            best = diag if diag >= up and diag >= left else (up if up >= left else left)
-            score[i, j] = best
-            trace[i, j] = 0 if best == diag else (1 if best == up else 2)
+    with stage("align.fill", engine="reference", cells=n * m):
+        for i in range(1, n + 1):
+            a = s1[i - 1]
+            for j in range(1, m + 1):
+                b = s2[j - 1]
+                diag = score[i - 1, j - 1] + (match if a == b else mismatch)
+                up = score[i - 1, j] + gap
+                left = score[i, j - 1] + gap
+                best = diag if diag >= up and diag >= left else (up if up >= left else left)
+                score[i, j] = best
+                trace[i, j] = 0 if best == diag else (1 if best == up else 2)
 
-    i, j = n, m
-    a1, a2 = [], []
-    while i > 0 or j > 0:
-        t = trace[i, j]
-        if t == 0:
-            a1.append(s1[i - 1]); a2.append(s2[j - 1]); i -= 1; j -= 1
-        elif t == 1:
-            a1.append(s1[i - 1]); a2.append("-"); i -= 1
+    return _traceback(trace, s1, s2)
+
+
+def _traceback(trace, s1: str, s2: str) -> Alignment:
+    """Walk a full (n+1)x(m+1) trace matrix back from the corner (0 diag, 1 up, 2 left)."""
+    i, j = len(s1), len(s2)
+    ops = []
+    with stage("align.traceback") as st:
+        while i > 0 or j > 0:
+            t = int(trace[i, j])
+            ops.append(t)
+            if t == 0:
+                i -= 1; j -= 1
+            elif t == 1:
+                i -= 1
+            else:
+                j -= 1
+        st["columns"] = len(ops)
+    return Alignment(ops[::-1], s1, s2)
+
+
+# ---------- Needleman–Wunsch, NumPy row fill ----------
+def encode(*seqs: str) -> list[np.ndarray]:
+    """Integer-encode sequences over their shared alphabet (one uint8/int32 array per sequence)."""
+    alphabet = {c: k for k, c in enumerate(sorted(set("".join(seqs))))}
+    dtype = np.uint8 if len(alphabet) <= 256 else np.int32
+    return [np.fromiter((alphabet[c] for c in s), dtype=dtype, count=len(s)) for s in seqs]
+
+
+def _row_step(prev, a, c2, ramp, match, mismatch, gap):
+    """Score row i (and its trace row, col 0 = up) from score row i-1 and residue a = s1[i-1].
+
+    Within a row the left dependency score[i, j] = max(t[j], score[i, j-1] + gap) is a running
+    maximum of t[k] + (j - k) * gap, so it is solved with `np.maximum.accumulate`.
+    """
+    diag = prev[:-1] + np.where(c2 == a, match, mismatch)
+    up = prev[1:] + gap
+    row = np.empty_like(prev)
+    row[0] = prev[0] + gap
+    row[1:] = np.maximum(diag, up)
+    row = np.maximum.accumulate(row - ramp) + ramp
+    best = row[1:]
+    trace = np.empty(len(prev), dtype=np.int8)
+    trace[0] = 1
+    trace[1:] = np.where(best == diag, 0, np.where(best == up, 1, 2))
+    return row, trace
+
+
+def needleman_wunsch_vectorized(s1: str, s2: str, match=2, mismatch=-1, gap=-2) -> Alignment:
+    """Same scores, trace and tie-breaking (diag > up > left) as `needleman_wunsch`, one NumPy pass per row."""
+    n, m = len(s1), len(s2)
+    c1, c2 = encode(s1, s2)
+    trace = np.zeros((n + 1, m + 1), dtype=np.int8)  # 0 diag, 1 up, 2 left
+    trace[0, 1:] = 2
+
+    ramp = np.arange(m + 1) * gap
+    row = ramp.copy()
+    with stage("align.fill", engine="vectorized", cells=n * m):
+        for i in range(1, n + 1):
+            row, trace[i] = _row_step(row, c1[i - 1], c2, ramp, match, mismatch, gap)
+    return _traceback(trace, s1, s2)
+
+
+# ---------- Needleman–Wunsch in linear space (divide and conquer over rows) ----------
+def needleman_wunsch_linear(s1: str, s2: str, match=2, mismatch=-1, gap=-2,
+                            block_cells=1 << 22) -> Alignment:
+    """Same alignment as `needleman_wunsch` without the (n+1)x(m+1) matrices.
+
+    The traceback over rows (a, b] only needs score row a and the columns left of where the path
+    enters row b. Rows are halved recursively: the forward pass is replayed from row a to the
+    midpoint, the lower half is traced first (giving the column where the path crosses the
+    midpoint), then the upper half. Once a block fits in `block_cells` its trace is filled and
+    walked directly. Peak memory is O(m log n) scores plus one block of trace; each cell is filled
+    O(log n) times. Because every trace cell is computed from the true prefix scores, tie-breaking
+    and therefore the alignment are identical to the full-matrix engines.
+    """
+    n, m = len(s1), len(s2)
+    c1, c2 = encode(s1, s2)
+    ramp = np.arange(m + 1) * gap
+    ops = []  # traceback moves, bottom-right to top-left
+
+    def walk(a, b, top, j):
+        # `top` is score row a over columns 0..j; trace from (b, j) up to row a, return the column reached
+        if b - a <= 1 or (b - a) * (j + 1) <= block_cells:
+            row = top
+            block = np.empty((b - a, j + 1), dtype=np.int8)
+            for i in range(a + 1, b + 1):
+                row, block[i - a - 1] = _row_step(row, c1[i - 1], c2[:j], ramp[:j + 1],
+                                                  match, mismatch, gap)
+            i = b
+            while i > a:
+                t = block[i - a - 1, j]
+                ops.append(t)
+                if t == 0:
+                    i -= 1; j -= 1
+                elif t == 1:
+                    i -= 1
+                else:
+                    j -= 1
+            return j
+        mid = (a + b) // 2
+        row = top
+        for i in range(a + 1, mid + 1):
+            row, _ = _row_step(row, c1[i - 1], c2[:j], ramp[:j + 1], match, mismatch, gap)
+        jm = walk(mid, b, row, j)
+        return walk(a, mid, top[:jm + 1], jm)
+
+    j = walk(0, n, ramp.copy(), m)
+    ops.extend([2] * j)  # row 0 is all left moves
+    return Alignment(ops[::-1], s1, s2)
+
+
+# ---------- Seeded, banded Needleman–Wunsch ----------
+NUCLEOTIDES = set("ACGTUN")
+_NEG = -(1 << 40)  # score for cells outside the band
+
+
+def find_anchors(s1: str, s2: str, k: int) -> list[tuple[int, int]]:
+    """Chain of exact k-mer matches (i in s1, j in s2) that are unique in both sequences.
+
+    The chain is the longest run of anchors increasing in both coordinates (patience-sorting LIS).
+    """
+    def unique_kmers(s):
+        seen, dup = {}, set()
+        for i in range(len(s) - k + 1):
+            w = s[i:i + k]
+            if w in seen:
+                dup.add(w)
+            else:
+                seen[w] = i
+        for w in dup:
+            del seen[w]
+        return seen
+
+    u1, u2 = unique_kmers(s1), unique_kmers(s2)
+    hits = sorted((i, u2[w]) for w, i in u1.items() if w in u2)
+    tails, tail_idx, back = [], [], [-1] * len(hits)
+    for h, (_, j) in enumerate(hits):
+        p = bisect_left(tails, j)
+        back[h] = tail_idx[p - 1] if p else -1
+        if p == len(tails):
+            tails.append(j); tail_idx.append(h)
         else:
-            a1.append("-"); a2.append(s2[j - 1]); j -= 1
-    return "".join(reversed(a1)), "".join(reversed(a2))
+            tails[p] = j; tail_idx[p] = h
+    chain, h = [], tail_idx[-1] if tail_idx else -1
+    while h >= 0:
+        chain.append(hits[h]); h = back[h]
+    return chain[::-1]
+
+
+def anchor_band(chain, n: int, m: int, band: int) -> tuple[np.ndarray, np.ndarray]:
+    """Per-row column bounds [lo[i], hi[i]] around the anchor chain, padded by `band`.
+
+    Between consecutive anchors the band follows the straight line joining them and is widened by
+    the diagonal shift between them, so any indel run between two anchors stays inside.
+    """
+    pts = [(0, 0)]
+    for i, j in chain:
+        if i >= pts[-1][0] and j >= pts[-1][1]:
+            pts.append((i, j))
+    pts.append((n, m))
+    lo = np.full(n + 1, m, dtype=np.int64)
+    hi = np.zeros(n + 1, dtype=np.int64)
+    for (i0, j0), (i1, j1) in zip(pts, pts[1:]):
+        w = band + abs((j1 - j0) - (i1 - i0))
+        if i1 == i0:
+            rows, c_lo, c_hi = np.array([i0]), j0, j1
+        else:
+            rows = np.arange(i0, i1 + 1)
+            c_lo = c_hi = j0 + (rows - i0) * ((j1 - j0) / (i1 - i0))
+        lo[rows] = np.minimum(lo[rows], np.floor(c_lo - w).astype(np.int64))
+        hi[rows] = np.maximum(hi[rows], np.ceil(c_hi + w).astype(np.int64))
+    lo = np.minimum.accumulate(np.clip(lo, 0, m)[::-1])[::-1]
+    hi = np.maximum.accumulate(np.clip(hi, 0, m))
+    lo[0], hi[-1] = 0, m
+    lo[1:] = np.minimum(lo[1:], hi[:-1] + 1)  # consecutive rows must touch
+    return lo, hi
+
+
+def needleman_wunsch_banded(s1: str, s2: str, match=2, mismatch=-1, gap=-2,
+                            k: int | None = None, band: int = 16, min_coverage: float = 0.2,
+                            max_band_frac: float = 0.5, max_matrix_mb: float | None = None,
+                            info: dict | None = None) -> Alignment:
+    """Global alignment restricted to a band around a chain of exact k-mer anchors.
+
+    k defaults to 12 for nucleotide and 4 for protein sequences. Falls back to the full vectorized
+    engine if the anchors cover less than `min_coverage` of the shorter sequence, or if the widest
+    band row spans more than `max_band_frac` of s2 (a fixed-width band that wide costs as much per
+    row as the full row). The fallback is the linear-space engine instead when the vectorized
+    trace would exceed `max_matrix_mb`. Scores and tie-breaking are those of `needleman_wunsch`, so
+    whenever the optimal path lies inside the band the alignment is the same. `info`, if given,
+    receives k, anchors, band (widest row), cells (filled), skipped and fallback (False, or the
+    name of the engine used instead).
+    """
+    n, m = len(s1), len(s2)
+    if k is None:
+        k = 12 if set(s1) | set(s2) <= NUCLEOTIDES else 4
+    chain = find_anchors(s1, s2, k) if n >= k and m >= k else []
+    full = (n + 1) * (m + 1)
+    fallback = "vectorized"
+    if max_matrix_mb is not None and full_matrix_mb(n, m, "vectorized") > max_matrix_mb:
+        fallback = "linear"
+    stats = {"k": k, "anchors": len(chain), "band": 0, "cells": full, "skipped": 0, "fallback": fallback}
+    if info is not None:
+        info.update(stats)
+    if not chain or len(chain) * k < min_coverage * min(n, m):
+        return ENGINES[fallback](s1, s2, match, mismatch, gap)
+    lo, hi = anchor_band(chain, n, m, band)
+    width = int((hi - lo + 1).max())
+    stats["band"] = width
+    if width > max_band_frac * (m + 1):
+        if info is not None:
+            info.update(stats)
+        return ENGINES[fallback](s1, s2, match, mismatch, gap)
+
+    # Row i is held in a buffer of `width` cells starting at column lo[i]; lo never decreases and
+    # consecutive rows touch, so row i-1 is read at offset d = lo[i] - lo[i-1] <= width.
+    # prev[0] is column lo[i-1] - 1 and everything past hi[i-1] is _NEG.
+    cells = int((hi - lo + 1).sum())
+    c1, c2 = encode(s1, s2)
+    alphabet = max(int(c1.max(initial=0)), int(c2.max(initial=0))) + 1
+    c2ext = np.full(m + 1 + width, -1, dtype=np.int32)  # c2ext[c] = s2[c - 1], -1 outside s2
+    c2ext[1:m + 1] = c2
+    profile = np.where(c2ext[None, :] == np.arange(alphabet)[:, None], match, mismatch).astype(np.int64)
+    ramp = np.arange(width, dtype=np.int64) * gap
+    span = hi - lo + 1
+    prev = np.full(2 * width + 1, _NEG, dtype=np.int64)
+    prev[1:span[0] + 1] = ramp[:span[0]]
+    traces = np.empty((n + 1, width), dtype=np.int8)
+    traces[0] = 2
+    with stage("align.fill", engine="banded", cells=cells):
+        for i in range(1, n + 1):
+            l, d = int(lo[i]), int(lo[i] - lo[i - 1])
+            diag = prev[d:d + width] + profile[c1[i - 1], l:l + width]
+            if l == 0:
+                diag[0] = _NEG
+            up = prev[d + 1:d + 1 + width] + gap
+            row = np.maximum.accumulate(np.maximum(diag, up) - ramp) + ramp
+            traces[i] = (row != diag) * (1 + (row != up))
+            prev[1:width + 1] = row
+            prev[span[i] + 1:width + 1] = _NEG
+
+    i, j = n, m
+    ops = []
+    with stage("align.traceback") as st:
+        while i > 0 or j > 0:
+            t = int(traces[i, j - lo[i]])
+            ops.append(t)
+            if t == 0:
+                i -= 1; j -= 1
+            elif t == 1:
+                i -= 1
+            else:
+                j -= 1
+        st["columns"] = len(ops)
+
+    stats.update(cells=cells, skipped=full - cells, fallback=False)
+    if info is not None:
+        info.update(stats)
+    return Alignment(ops[::-1], s1, s2)
+
+
+MATRIX_BYTES_PER_CELL = {"reference": 9, "vectorized": 1}  # int64 scores + int8 trace / int8 trace only
+
+
+def full_matrix_mb(n: int, m: int, engine: str = "vectorized") -> float:
+    """Memory (MiB) of a full-matrix engine's (n+1)x(m+1) matrices: the reference engine keeps
+    int64 scores plus the int8 trace, the vectorized one only the trace (its score rows are O(m))."""
+    return (n + 1) * (m + 1) * MATRIX_BYTES_PER_CELL[engine] / 2**20
+
+
+ENGINES = {
+    "reference": needleman_wunsch,
+    "vectorized": needleman_wunsch_vectorized,
+    "linear": needleman_wunsch_linear,
+    "banded": needleman_wunsch_banded,
+}
 
 
 # ---------- Find deletions in symbiont along the reference (free-living) coordinate ----------
 def find_losses(aln_sym: str, aln_free: str) -> list[tuple[int, int]]:
-    free_pos = -1
-    losses, in_del, start = [], False, None
-    for a, b in zip(aln_sym, aln_free):
-        if b != "-":                       # advance along reference coordinate
-            free_pos += 1
-            if a == "-":                   # deletion in symbiont
-                if not in_del:
-                    in_del = True; start = free_pos
-            else:
-                if in_del:                 # close the deletion run
-                    losses.append((start, free_pos - 1))
-                    in_del = False
-    if in_del:
-        losses.append((start, free_pos))
-    return losses
+    """Loss segments (start, end) on the reference axis of a gapped-string alignment (see Alignment.losses)."""
+    return Alignment.from_strings(aln_sym, aln_free).losses()
 
 
 # ---------- Plot & CSV ----------
-def write_outputs(losses, aln_sym, aln_free, free_label, sym_label, gene, outbase):
-    free_len = sum(1 for c in aln_free if c != "-")
-    sym_len  = sum(1 for c in aln_sym  if c != "-")
-    matches  = sum(1 for a, b in zip(aln_sym, aln_free) if a == b and a != "-" and b != "-")
-    compared = sum(1 for a, b in zip(aln_sym, aln_free) if a != "-" and b != "-")
-    identity = matches / compared if compared else 0.0
-    total_loss = sum(e - s + 1 for s, e in losses)
-    loss_frac  = total_loss / free_len if free_len else 0.0
-
-    # CSV of loss segments
-    df = pd.DataFrame([{f"start_{free_label}": s, f"end_{free_label}": e, "length": e - s + 1}
-                       for s, e in losses])
-    df.to_csv(outbase + "_loss_segments.csv", index=False)
-
-    # Box diagram
-    fig, ax = plt.subplots(figsize=(10, 1.8))
-    ax.set_title(f"{gene} — Regions missing in {sym_label} relative to {free_label}")
-    ax.add_patch(plt.Rectangle((0, 0.4), max(1, free_len), 0.2, fill=False, linewidth=2))
-    for s, e in losses:
-        ax.add_patch(plt.Rectangle((s, 0.3), e - s + 1, 0.4, alpha=0.85))
-    ax.set_xlim(0, max(1, free_len))
-    ax.set_ylim(0, 1)
-    ax.set_yticks([])
-    ax.set_xlabel(f"{free_label} coordinate (aa)")
-    ax.text(max(1, free_len)*0.01, 0.9, f"{free_label} length: {free_len} aa", fontsize=9, va="center")
-    ax.text(max(1, free_len)*0.35, 0.9, f"{sym_label} length: {sym_len} aa", fontsize=9, va="center")
-    ax.text(max(1, free_len)*0.65, 0.9, f"Loss: {total_loss} aa ({loss_frac:.1%})", fontsize=9, va="center")
-    fig.tight_layout()
-    fig.savefig(outbase + "_loss_box_diagram.png", dpi=300, bbox_inches="tight")
-    fig.savefig(outbase + "_loss_box_diagram.pdf", dpi=300, bbox_inches="tight")
-    print(f"[saved] {outbase}_loss_box_diagram.png/.pdf and {outbase}_loss_segments.csv")
-    print(f"       identity≈{identity:.4f}, loss={total_loss} aa ({loss_frac:.2%})")
+def alignment_events(aln: Alignment, free_label: str, sym_label: str) -> pd.DataFrame:
+    """Losses, insertions in the symbiont and substitution runs, one row each, with their extent on
+    the reference and symbiont axes (blank on the side that is gapped)."""
+    rows = [("loss", s, e, None, None, e - s + 1) for s, e in aln.losses()]
+    rows += [("insertion", None, None, s, e, e - s + 1) for s, e, _ in aln.insertions()]
+    rows += [("substitution", fs, fe, ss, se, fe - fs + 1) for fs, fe, ss, se in aln.substitutions()]
+    cols = ["kind", f"start_{free_label}", f"end_{free_label}", f"start_{sym_label}", f"end_{sym_label}", "length"]
+    df = pd.DataFrame(rows, columns=cols)
+    return df.astype({c: "Int64" for c in cols[1:]})
+
+
+def write_outputs(aln: Alignment, free_label, sym_label, gene, outbase, render=True, window=50):
+    """Write the loss CSV, event and conservation CSVs and box diagram and return the pair's metrics.
+
+    With render=False the figure job is returned under "figure" for the caller to render
+    (run_batch renders them all in one pool at the end).
+    """
+    with stage("losses.find", columns=len(aln)):
+        losses = aln.losses()
+        m = aln.metrics()
+    free_len, sym_len, identity = m["free_len"], m["sym_len"], m["identity"]
+    total_loss, loss_frac = m["total_loss"], m["loss_frac"]
+
+    # CSV of loss segments, all alignment events, and windowed conservation along the reference
+    with stage("output.csv", segments=len(losses)):
+        df = pd.DataFrame([{f"start_{free_label}": s, f"end_{free_label}": e, "length": e - s + 1}
+                           for s, e in losses])
+        df.to_csv(outbase + "_loss_segments.csv", index=False)
+        alignment_events(aln, free_label, sym_label).to_csv(outbase + "_alignment_events.csv", index=False)
+        cons = aln.conservation(window)
+        pd.DataFrame({f"start_{free_label}": cons["start"], f"end_{free_label}": cons["end"],
+                      "aligned": cons["aligned"], "identical": cons["identical"],
+                      "identity": cons["identity"].round(4)}).to_csv(outbase + "_conservation.csv", index=False)
+
+    # Box diagram (drawn headless via figures.py; skipped when the manifest shows it is up to date)
+    job = {"kind": "loss_box", "outputs": [outbase + "_loss_box_diagram.png", outbase + "_loss_box_diagram.pdf"],
+           "inputs": [], "figsize": (10, 1.8), "dpi": 300, "bbox_inches": "tight",
+           "params": {"gene": gene, "sym_label": sym_label, "free_label": free_label, "free_len": free_len,
+                      "sym_len": sym_len, "total_loss": total_loss, "loss_frac": loss_frac,
+                      "losses": [[int(s), int(e)] for s, e in losses]}}
+    if render:
+        state = render_figures([job], workers=1)[job["outputs"][0]]
+        if state == "rendered":
+            print(f"[saved] {outbase}_loss_box_diagram.png/.pdf and {outbase}_loss_segments.csv")
+        else:
+            print(f"[saved] {outbase}_loss_segments.csv (box diagram {'up to date' if state == 'skipped' else 'failed'})")
+    else:
+        print(f"[saved] {outbase}_loss_segments.csv (figure queued)")
+    print(f"       identity≈{identity:.4f}, loss={total_loss} aa ({loss_frac:.2%}), "
+          f"inserted={m['inserted']} aa in {m['n_insertions']} runs, "
+          f"{m['substitutions']} substitutions in {m['n_substitution_runs']} runs")
+    return {"gene": gene, "sym_label": sym_label, "free_label": free_label, **m, "figure": job}
+
+
+def align_pair(sym: str, ref: str, engine: str = "vectorized", max_matrix_mb: float | None = None) -> Alignment:
+    """Global alignment of two sequences with the chosen engine (linear-space if the matrices would be too big)."""
+    with stage("align", residues=len(sym) + len(ref)) as st:
+        aln = _align_pair(sym, ref, engine, max_matrix_mb, st)
+    return aln
+
+
+def _align_pair(sym, ref, engine, max_matrix_mb, st, verbose=True):
+    """Engine selection shared with scan_gene_losses.py: records the engine and cells in `st` and,
+    with verbose, reports engine switches and banded statistics."""
+    if engine in MATRIX_BYTES_PER_CELL and max_matrix_mb is not None:
+        need = full_matrix_mb(len(sym), len(ref), engine)
+        if need > max_matrix_mb:
+            if verbose:
+                print(f"[engine] full matrix needs {need:.0f} MB > {max_matrix_mb:g} MB; using linear-space alignment")
+            engine = "linear"
+    st["engine"] = engine
+    if engine == "banded":
+        info = {}
+        aln = needleman_wunsch_banded(sym, ref, max_matrix_mb=max_matrix_mb, info=info)
+        st["cells"] = info["cells"]
+        used = "linear-space" if info["fallback"] == "linear" else "full"
+        if info["fallback"] and info["band"]:
+            msg = f"[banded] band width {info['band']} spans most of the reference; used {used} alignment"
+        elif info["fallback"]:
+            msg = f"[banded] only {info['anchors']} {info['k']}-mer anchors; used {used} alignment"
+        else:
+            msg = (f"[banded] {info['anchors']} {info['k']}-mer anchors, band width<={info['band']}, "
+                   f"{info['cells']} cells filled, {info['skipped']} skipped "
+                   f"({info['skipped'] / (info['cells'] + info['skipped']):.1%})")
+        if verbose:
+            print(msg)
+        return aln
+    st["cells"] = len(sym) * len(ref)
+    return ENGINES[engine](sym, ref)
 
 
 def compare_pair(sym_fa: str, free_fa: str, gene: str,
-                 sym_label: str, free_label: str, outbase: str):
-    sym = read_fasta(sym_fa)
-    ref = read_fasta(free_fa)
-    aln_sym, aln_free = needleman_wunsch(sym, ref)        # global alignment
-    losses = find_losses(aln_sym, aln_free)               # deletions in sym vs ref
-    write_outputs(losses, aln_sym, aln_free, free_label, sym_label, gene, outbase)
+                 sym_label: str, free_label: str, outbase: str, engine: str = "vectorized",
+                 max_matrix_mb: float | None = None, render: bool = True, window: int = 50):
+    with stage("fasta.read") as st:
+        sym = read_fasta(sym_fa)
+        ref = read_fasta(free_fa)
+        st["residues"] = len(sym) + len(ref)
+    aln = align_pair(sym, ref, engine, max_matrix_mb)   # global alignment
+    return write_outputs(aln, free_label, sym_label, gene, outbase, render=render, window=window)
+
+
+# ---------- Batch mode ----------
+MANIFEST_COLUMNS = ("sym", "free", "gene", "sym_label", "free_label", "out")
+
+
+def read_manifest(path: str) -> list[dict]:
+    """Rows of (sym, free, gene, sym_label, free_label, out) from a TSV with a header or a JSON list."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        rows = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False).to_dict("records")
+    for k, r in enumerate(rows, 1):
+        missing = [c for c in ("sym", "free", "gene", "out") if not r.get(c)]
+        if missing:
+            raise ValueError(f"{path}: row {k} is missing {', '.join(missing)}")
+        r.setdefault("sym_label", "Symbiont")
+        r.setdefault("free_label", "Free-living")
+    return rows
+
+
+def _run_row(row, engine, max_matrix_mb, window):
+    return compare_pair(row["sym"], row["free"], row["gene"], row["sym_label"] or "Symbiont",
+                        row["free_label"] or "Free-living", row["out"],
+                        engine=engine, max_matrix_mb=max_matrix_mb, render=False, window=window)
+
+
+SUMMARY_COUNTS = ("sym_len", "free_len", "total_loss", "n_segments", "n_insertions", "inserted",
+                  "n_substitution_runs", "substitutions", "sym_gap_opens", "free_gap_opens")
+
+
+def run_batch(rows, summary_path: str, jobs: int | None = None, engine: str = "vectorized",
+              max_matrix_mb: float | None = None, window: int = 50) -> pd.DataFrame:
+    """Run `compare_pair` for every manifest row in a process pool and write one summary table.
+
+    A failing pair is recorded with status "error" and does not stop the others. Box diagrams
+    are rendered afterwards in one pool, skipping those that are already up to date.
+    """
+    results = [None] * len(rows)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_run_row, row, engine, max_matrix_mb, window): k for k, row in enumerate(rows)}
+        for fut in as_completed(futures):
+            k = futures[fut]
+            row = rows[k]
+            try:
+                res = dict(fut.result(), status="ok", error="")
+            except Exception as e:  # keep going past a bad pair
+                print(f"[error] {row['gene']} ({row['out']}): {e}")
+                res = {"gene": row["gene"], "sym_label": row["sym_label"], "free_label": row["free_label"],
+                       "status": "error", "error": f"{type(e).__name__}: {e}"}
+            res["out"] = row["out"]
+            results[k] = res
+    figures = [r["figure"] for r in results if r.get("figure")]
+    states = render_figures(figures, workers=jobs)
+    print(f"[saved] {sum(v == 'rendered' for v in states.values())} box diagrams "
+          f"({sum(v == 'skipped' for v in states.values())} up to date)")
+    df = pd.DataFrame(results, columns=["gene", "sym_label", "free_label", "sym_len", "free_len",
+                                        "identity", "total_loss", "loss_frac", "n_segments",
+                                        "n_insertions", "inserted", "n_substitution_runs", "substitutions",
+                                        "sym_gap_opens", "free_gap_opens", "out", "status", "error"])
+    df = df.astype({c: "Int64" for c in SUMMARY_COUNTS})
+    df.to_csv(summary_path, sep="\t", index=False)
+    print(f"[saved] {summary_path} ({(df['status'] == 'ok').sum()}/{len(df)} pairs ok)")
+    return df
 
 
 # ---------- CLI ----------
 def main():
     ap = argparse.ArgumentParser(description="Highlight losses in symbiont vs reference (free-living).")
-    ap.add_argument("--sym", required=True, help="Symbiont FASTA (same gene)")
-    ap.add_argument("--free", required=True, help="Reference (free-living) FASTA")
-    ap.add_argument("--gene", required=True, help="Gene name (for titles)")
+    ap.add_argument("--sym", help="Symbiont FASTA (same gene)")
+    ap.add_argument("--free", help="Reference (free-living) FASTA")
+    ap.add_argument("--gene", help="Gene name (for titles)")
     ap.add_argument("--sym-label", default="Symbiont", help="Label for symbiont")
     ap.add_argument("--free-label", default="Free-living", help="Label for reference")
-    ap.add_argument("--out", required=True, help="Output basename (no extension)")
+    ap.add_argument("--out", help="Output basename (no extension)")
+    ap.add_argument("--manifest", help="TSV (with header) or JSON list of sym/free/gene/sym_label/free_label/out "
+                                       "rows; runs every pair instead of --sym/--free")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes for --manifest (default: CPU count)")
+    ap.add_argument("--summary", default="gene_loss_summary.tsv",
+                    help="Combined summary table for --manifest (default: gene_loss_summary.tsv)")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="vectorized",
+                    help="Alignment engine (default: vectorized; 'reference' is the original per-cell loop, "
+                         "'linear' avoids the full DP matrices, "
+                         "'banded' fills only a band around k-mer anchors)")
+    ap.add_argument("--max-matrix-mb", type=float, default=1024,
+                    help="Switch to the linear-space engine when the full DP matrices would exceed this (default: 1024)")
+    ap.add_argument("--window", type=int, default=50,
+                    help="Reference window (residues) for <out>_conservation.csv (default: 50)")
+    add_profile_argument(ap)
     args = ap.parse_args()
-    compare_pair(args.sym, args.free, args.gene, args.sym_label, args.free_label, args.out)
+    setup_profiling(args)
+    if args.manifest:
+        df = run_batch(read_manifest(args.manifest), args.summary, jobs=args.jobs,
+                       engine=args.engine, max_matrix_mb=args.max_matrix_mb, window=args.window)
+        if (df["status"] != "ok").any():
+            sys.exit(1)
+        return
+    if not (args.sym and args.free and args.gene and args.out):
+        ap.error("--sym, --free, --gene and --out are required unless --manifest is given")
+    compare_pair(args.sym, args.free, args.gene, args.sym_label, args.free_label, args.out,
+                 engine=args.engine, max_matrix_mb=args.max_matrix_mb, window=args.window)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+compressed_io.py
+Transparent reading of plain, gzip, BGZF (bgzip) and xz-compressed inputs for every FASTA and
+GFF3 reader in this project.
+
+    with open_input("Escherichia_coli_K12.gff3.gz") as f:        # binary, like open(path, "rb")
+        for line in f: ...
+    with open_input("carB_Sal.fasta.xz", "r") as f:             # text, like open(path, "r")
+
+The format is taken from the file's magic bytes, not its name. BGZF files (the blocked gzip
+written by bgzip/htslib) consist of independent deflate blocks of at most 64 KiB, so they are
+read ahead and inflated in a thread pool (zlib releases the GIL) and handed out in order;
+plain gzip and xz streams are inherently serial and go through the standard library.
+
+  python compressed_io.py bgzip genome.fasta                   # -> genome.fasta.gz (BGZF)
+"""
+
+import argparse
+import gzip
+import io
+import lzma
+import os
+import shutil
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_THREADS = min(8, os.cpu_count() or 1)
+BGZF_BLOCK = 0xFF00  # uncompressed bytes per block, as bgzip writes them
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+def detect_format(path: str) -> str:
+    """"bgzf", "gzip", "xz" or "plain", from the first bytes of the file."""
+    with open(path, "rb") as f:
+        head = f.read(18)
+    if head.startswith(_XZ_MAGIC):
+        return "xz"
+    if not head.startswith(_GZIP_MAGIC):
+        return "plain"
+    if len(head) >= 18 and head[3] & 4:  # FEXTRA: look for the BGZF "BC" subfield
+        xlen = struct.unpack("<H", head[10:12])[0]
+        if xlen >= 6 and head[12:14] == b"BC" and head[14:16] == b"\x02\x00":
+            return "bgzf"
+    return "gzip"
+
+
+def is_compressed(path: str) -> bool:
+    return detect_format(path) != "plain"
+
+
+# ---------- BGZF ----------
+def _read_bgzf_blocks(f):
+    """Yield (deflate data, crc32, uncompressed size) for each block of an open BGZF file."""
+    while True:
+        hdr = f.read(12)
+        if not hdr:
+            return
+        if len(hdr) < 12 or hdr[:4] != b"\x1f\x8b\x08\x04":
+            raise gzip.BadGzipFile("not a BGZF block header")
+        xlen = struct.unpack("<H", hdr[10:12])[0]
+        extra = f.read(xlen)
+        bsize, pos = None, 0
+        while pos + 4 <= len(extra):
+            slen = struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b"BC" and slen == 2:
+                bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0]
+            pos += 4 + slen
+        if bsize is None:
+            raise gzip.BadGzipFile("BGZF block without a BC subfield")
+        rest = f.read(bsize - xlen - 11)  # deflate data + CRC32 + ISIZE
+        if len(rest) != bsize - xlen - 11:
+            raise EOFError("truncated BGZF block")
+        crc, isize = struct.unpack("<II", rest[-8:])
+        yield rest[:-8], crc, isize
+
+
+def _inflate(block) -> bytes:
+    data, crc, isize = block
+    out = zlib.decompress(data, -15) if isize else b""
+    if len(out) != isize or zlib.crc32(out) != crc:
+        raise gzip.BadGzipFile("BGZF block CRC or size mismatch")
+    return out
+
+
+def iter_bgzf(path: str, threads: int | None = None):
+    """Decompressed BGZF blocks in file order, inflated `threads` at a time with read-ahead."""
+    threads = threads or DEFAULT_THREADS
+    with open(path, "rb", buffering=1 << 20) as f:
+        if threads == 1:
+            for block in _read_bgzf_blocks(f):
+                yield _inflate(block)
+            return
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            pending = deque()
+            for block in _read_bgzf_blocks(f):
+                pending.append(pool.submit(_inflate, block))
+                if len(pending) >= 4 * threads:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+class BGZFReader(io.RawIOBase):
+    """Read-only raw stream over the decompressed contents of a BGZF file."""
+
+    def __init__(self, path: str, threads: int | None = None):
+        self._blocks = iter_bgzf(path, threads)
+        self._buf = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._buf = memoryview(block)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._blocks.close()  # stops read-ahead and shuts the pool down
+        super().close()
+
+
+# ---------- Public API ----------
+def open_input(path: str, mode: str = "rb", encoding: str = "utf-8", errors: str | None = None,
+               threads: int | None = None):
+    """Open a possibly compressed file for reading; mode "rb" (binary) or "r" (text)."""
+    if mode not in ("r", "rb", "rt"):
+        raise ValueError(f"open_input only reads; got mode {mode!r}")
+    fmt = detect_format(path)
+    if fmt == "plain":
+        return open(path, mode, encoding=None if mode == "rb" else encoding, errors=None if mode == "rb" else errors)
+    if fmt == "bgzf":
+        binary = io.BufferedReader(BGZFReader(path, threads), buffer_size=1 << 20)
+    elif fmt == "gzip":
+        binary = gzip.open(path, "rb")
+    else:
+        binary = lzma.open(path, "rb")
+    return binary if mode == "rb" else io.TextIOWrapper(binary, encoding=encoding, errors=errors)
+
+
+def read_bytes(path: str, threads: int | None = None) -> bytes:
+    """Whole decompressed contents of a file."""
+    if detect_format(path) == "bgzf":
+        return b"".join(iter_bgzf(path, threads))
+    with open_input(path) as f:
+        return f.read()
+
+
+def write_bgzf(src: str, dst: str, threads: int | None = None, level: int = 6):
+    """Compress `src` into BGZF blocks (readable by bgzip/htslib and by open_input)."""
+    def deflate(chunk):
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = c.compress(chunk) + c.flush()
+        header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+        return header + struct.pack("<H", len(data) + 25) + data + struct.pack("<II", zlib.crc32(chunk), len(chunk))
+
+    with open(src, "rb") as f, open(dst, "wb") as out, ThreadPoolExecutor(max_workers=threads or DEFAULT_THREADS) as pool:
+        while True:
+            chunks = [c for c in (f.read(BGZF_BLOCK) for _ in range(64)) if c]
+            if not chunks:
+                break
+            for block in pool.map(deflate, chunks):
+                out.write(block)
+        out.write(BGZF_EOF)
+
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or create compressed inputs.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_bgz = sub.add_parser("bgzip", help="Compress files to BGZF (<file>.gz)")
+    p_bgz.add_argument("files", nargs="+")
+    p_bgz.add_argument("--threads", type=int, default=None, help=f"Compression threads (default: {DEFAULT_THREADS})")
+    p_cat = sub.add_parser("cat", help="Write the decompressed contents to stdout")
+    p_cat.add_argument("files", nargs="+")
+    p_fmt = sub.add_parser("format", help="Print the detected format of each file")
+    p_fmt.add_argument("files", nargs="+")
+    args = ap.parse_args()
+
+    for path in args.files:
+        if args.cmd == "bgzip":
+            write_bgzf(path, path + ".gz", threads=args.threads)
+            print(f"[OK] {path}.gz")
+        elif args.cmd == "cat":
+            with open_input(path) as f:
+                shutil.copyfileobj(f, sys.stdout.buffer)
+        else:
+            print(f"{detect_format(path)}\t{path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from compressed_io import open_input
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
 
 def parse_fasta(path):
     seqs = []
     cur = []
     try:
-        with open(path, 'r', encoding='utf-8') as f:
+        with open_input(path, 'r') as f:
             for line in f:
                 if not line:
                     continue
@@ -24,6 +32,83 @@ def parse_fasta(path):
         return []
     return seqs
 
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+_GC = b"GCgc"
+_N = b"Nn"
+_SOFT = bytes(range(ord("a"), ord("z") + 1))
+
+def _record_stats(rid, counts):
+    # counts: 256-bin byte histogram of one record's sequence lines
+    length = int(counts.sum() - counts[list(_WHITESPACE)].sum())
+    return {
+        "id": rid,
+        "length": length,
+        "gc": int(counts[list(_GC)].sum()),
+        "n": int(counts[list(_N)].sum()),
+        "softmasked": int(counts[list(_SOFT)].sum()),
+    }
+
+def scan_fasta(path, chunk_size=1 << 24):
+    """Stream a FASTA file in binary chunks and return per-record base counts.
+
+    Never holds more than one chunk (plus a partial header) in memory. Returns a list of dicts
+    with keys id, length, gc, n, softmasked (lowercase), or [] if the file is missing. Length
+    counts every non-whitespace sequence byte, matching len() of the joined parse_fasta records.
+    """
+    records = []
+    rid, header, counts = None, None, None
+    at_line_start = True
+    try:
+        with open_input(path) as f:
+            while True:
+                buf = f.read(chunk_size)
+                if not buf:
+                    break
+                pos = 0
+                while pos < len(buf):
+                    if header is not None:
+                        nl = buf.find(b"\n", pos)
+                        if nl < 0:
+                            header.append(buf[pos:])
+                            pos = len(buf)
+                            break
+                        header.append(buf[pos:nl])
+                        text = b"".join(header).decode("utf-8", "replace").strip()
+                        rid = text.split()[0] if text else ""
+                        header, counts = None, np.zeros(256, dtype=np.int64)
+                        pos = nl + 1
+                        at_line_start = True
+                        continue
+                    if at_line_start and buf[pos] == 0x3E:  # '>'
+                        if counts is not None:
+                            records.append(_record_stats(rid, counts))
+                        header, counts, pos = [], None, pos + 1
+                        continue
+                    nxt = buf.find(b"\n>", pos)
+                    end = len(buf) if nxt < 0 else nxt + 1
+                    if counts is None:  # sequence before any header
+                        rid, counts = "", np.zeros(256, dtype=np.int64)
+                    counts += np.bincount(np.frombuffer(buf, dtype=np.uint8, count=end - pos, offset=pos),
+                                          minlength=256)
+                    pos = end
+                    at_line_start = buf[end - 1] == 0x0A
+        if header is not None:  # file ends inside a header line: an empty record
+            text = b"".join(header).decode("utf-8", "replace").strip()
+            rid, counts = (text.split()[0] if text else ""), np.zeros(256, dtype=np.int64)
+        if counts is not None:
+            records.append(_record_stats(rid, counts))
+    except FileNotFoundError:
+        print(f"ERROR: File not found: {path}", file=sys.stderr)
+        return []
+    return records
+
+def _scan_profiled(path):
+    with stage("fasta.scan", path=path) as st:
+        records = scan_fasta(path)
+        st["records"] = len(records)
+        st["bases"] = sum(r["length"] for r in records)
+    return records
+
 def gc_content(seq):
     if not seq:
         return 0.0
@@ -31,6 +116,64 @@ def gc_content(seq):
     gc = s.count('G') + s.count('C')
     return gc / len(s)
 
+def _file_key(path, content_hash=False):
+    st = os.stat(path)
+    key = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if content_hash:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 24), b""):
+                h.update(block)
+        key["sha256"] = h.hexdigest()
+    return key
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache, cache_path):
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump(cache, out)
+    os.replace(tmp, cache_path)
+
+def scan_many(paths, cache_path=None, content_hash=False, jobs=None):
+    """scan_fasta for every path, in a process pool, reusing cached results for unchanged files.
+
+    Cache entries are keyed by absolute path and hold size, mtime_ns (and sha256 with
+    content_hash) of the file they were computed from; any mismatch triggers a rescan.
+    Returns {path: records} with [] for missing files.
+    """
+    cache = load_cache(cache_path) if cache_path else {}
+    results, todo, keys = {}, [], {}
+    for path in dict.fromkeys(paths):
+        try:
+            keys[path] = _file_key(path, content_hash)
+        except FileNotFoundError:
+            print(f"ERROR: File not found: {path}", file=sys.stderr)
+            results[path] = []
+            continue
+        hit = cache.get(os.path.abspath(path))
+        if hit and all(hit.get(k) == v for k, v in keys[path].items()):
+            results[path] = hit["records"]
+        else:
+            todo.append(path)
+    if todo:
+        if len(todo) > 1 and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                scanned = list(pool.map(_scan_profiled, todo))
+        else:
+            scanned = [_scan_profiled(path) for path in todo]
+        for path, records in zip(todo, scanned):
+            results[path] = records
+            cache[os.path.abspath(path)] = dict(keys[path], records=records)
+        if cache_path:
+            save_cache(cache, cache_path)
+    return results
+
 def format_markdown_table(rows):
     # rows: list of dicts with keys: label, path, genome_size, gc_pct, genes
     header = "| Bacterium | FASTA Path | Genome Size (bp) | GC Content (%) | Genes compared |"
@@ -40,54 +183,93 @@ def format_markdown_table(rows):
         lines.append(f"| {r['label']} | `{r['path']}` | {r['genome_size']} | {r['gc_pct']:.2f} | {r.get('genes','')} |")
     return "\n".join(lines)
 
-def main():
-    p = argparse.ArgumentParser(description="Compute genome size and GC% for FASTA files and print Markdown/TSV summaries (with 'Genes compared').")
-    p.add_argument("files", nargs="+", help="Paths to FASTA files")
-    p.add_argument("--labels", nargs="*", default=None, help="Optional labels for each file (same order as files). Default = basename.")
-    p.add_argument("--genes", nargs="*", default=None, help="Optional genes-compared entry for each file (same order as files).")
-    p.add_argument("--tsv", default="genome_stats.tsv", help="Path to write TSV summary (default: genome_stats.tsv)")
-    p.add_argument("--md", default="genome_stats.md", help="Path to write Markdown table (default: genome_stats.md)")
-    args = p.parse_args()
-
-    if args.labels and len(args.labels) != len(args.files):
-        print("ERROR: If provided, --labels must have same length as files.", file=sys.stderr)
-        sys.exit(2)
-    if args.genes and len(args.genes) != len(args.files):
-        print("ERROR: If provided, --genes must have same length as files.", file=sys.stderr)
-        sys.exit(2)
+def write_genome_stats(files, labels=None, genes=None, tsv_path="genome_stats.tsv", md_path="genome_stats.md",
+                       records_path=None, cache_path=".genome_stats_cache.json", content_hash=False, jobs=None):
+    """Scan the FASTAs and write the TSV, Markdown (and optional per-record) summaries.
 
+    Returns (rows, markdown); nothing is written when no file yields any sequence.
+    """
+    with stage("genome_stats.scan", files=len(files)):
+        scanned = scan_many(files, cache_path=cache_path, content_hash=content_hash, jobs=jobs)
     rows = []
-    for i, path in enumerate(args.files):
-        label = args.labels[i] if args.labels else os.path.basename(path)
-        genes = args.genes[i] if args.genes else ""
-        seqs = parse_fasta(path)
-        if not seqs:
-            # Already printed error; continue to next file
+    record_rows = []
+    for i, path in enumerate(files):
+        label = labels[i] if labels else os.path.basename(path)
+        genes_i = genes[i] if genes else ""
+        records = scanned[path]
+        total_len = sum(r["length"] for r in records)
+        if not total_len:
+            # Missing file (already reported) or no sequence; continue to next file
             continue
-        total_len = sum(len(s) for s in seqs)
-        gc = gc_content(''.join(seqs))
+        gc = sum(r["gc"] for r in records) / total_len
+        for r in records:
+            record_rows.append((label, r))
         rows.append({
             "label": label,
             "path": path,
             "genome_size": total_len,
             "gc_pct": gc * 100.0,
-            "genes": genes
+            "genes": genes_i
         })
 
     if not rows:
-        print("No valid FASTA inputs parsed; nothing to write.", file=sys.stderr)
-        sys.exit(1)
+        return rows, ""
+
+    with stage("output.write", rows=len(rows), records=len(record_rows)):
+        md = _write_outputs(rows, record_rows, tsv_path, md_path, records_path)
+    return rows, md
 
+def _write_outputs(rows, record_rows, tsv_path, md_path, records_path):
     # Write TSV
-    with open(args.tsv, "w", encoding="utf-8") as out:
+    with open(tsv_path, "w", encoding="utf-8") as out:
         out.write("label\tpath\tgenome_size_bp\tgc_content_pct\tgenes_compared\n")
         for r in rows:
             out.write(f"{r['label']}\t{r['path']}\t{r['genome_size']}\t{r['gc_pct']:.4f}\t{r.get('genes','')}\n")
 
+    # Per-record (contig/plasmid) TSV
+    if records_path:
+        with open(records_path, "w", encoding="utf-8") as out:
+            out.write("label\trecord_id\tlength_bp\tgc_content_pct\tn_bases\tsoftmasked_bases\n")
+            for label, r in record_rows:
+                gc_pct = 100.0 * r["gc"] / r["length"] if r["length"] else 0.0
+                out.write(f"{label}\t{r['id']}\t{r['length']}\t{gc_pct:.4f}\t{r['n']}\t{r['softmasked']}\n")
+
     # Write Markdown
     md = format_markdown_table(rows)
-    with open(args.md, "w", encoding="utf-8") as out:
+    with open(md_path, "w", encoding="utf-8") as out:
         out.write(md + "\n")
+    return md
+
+def main():
+    p = argparse.ArgumentParser(description="Compute genome size and GC% for FASTA files and print Markdown/TSV summaries (with 'Genes compared').")
+    p.add_argument("files", nargs="+", help="Paths to FASTA files")
+    p.add_argument("--labels", nargs="*", default=None, help="Optional labels for each file (same order as files). Default = basename.")
+    p.add_argument("--genes", nargs="*", default=None, help="Optional genes-compared entry for each file (same order as files).")
+    p.add_argument("--tsv", default="genome_stats.tsv", help="Path to write TSV summary (default: genome_stats.tsv)")
+    p.add_argument("--md", default="genome_stats.md", help="Path to write Markdown table (default: genome_stats.md)")
+    p.add_argument("--jobs", type=int, default=None, help="Worker processes for scanning files (default: CPU count)")
+    p.add_argument("--cache", default=".genome_stats_cache.json", help="Result cache keyed by path/size/mtime (default: .genome_stats_cache.json)")
+    p.add_argument("--no-cache", action="store_true", help="Ignore and do not update the result cache")
+    p.add_argument("--hash", action="store_true", help="Also key the cache on a SHA-256 of each file's contents")
+    p.add_argument("--records", default=None, help="Optional path to write per-record (contig/plasmid) TSV with length, GC%%, N and soft-masked counts")
+    add_profile_argument(p)
+    args = p.parse_args()
+    setup_profiling(args)
+
+    if args.labels and len(args.labels) != len(args.files):
+        print("ERROR: If provided, --labels must have same length as files.", file=sys.stderr)
+        sys.exit(2)
+    if args.genes and len(args.genes) != len(args.files):
+        print("ERROR: If provided, --genes must have same length as files.", file=sys.stderr)
+        sys.exit(2)
+
+    rows, md = write_genome_stats(args.files, labels=args.labels, genes=args.genes, tsv_path=args.tsv,
+                                  md_path=args.md, records_path=args.records,
+                                  cache_path=None if args.no_cache else args.cache,
+                                  content_hash=args.hash, jobs=args.jobs)
+    if not rows:
+        print("No valid FASTA inputs parsed; nothing to write.", file=sys.stderr)
+        sys.exit(1)
 
     # Also print Markdown table to stdout for convenience
     print(md)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+fasta_index.py
+Random access to genome FASTA files through a samtools-style .fai index and a memory map,
+plus extraction of annotated CDS sequences using the GFF3 files compare_gene_lengths.py reads.
+
+The .fai has one line per record: name, length, offset, bases per line, bytes per line.
+It is written next to the FASTA on first use and rebuilt when the FASTA is newer.
+
+Usage:
+  python fasta_index.py index wigglesworthia_g_sequence.fasta
+  python fasta_index.py extract --fasta wigglesworthia_g_sequence.fasta \
+      --gff Wigglesworthia_glossinidia.gff3 --gene carB gltJ --translate --out wig_genes.fasta
+"""
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+from compressed_io import is_compressed, open_input, read_bytes
+from gff_table import STRAND_SYMBOLS, GFFTable
+
+
+# ---------- .fai index ----------
+def build_index(path: str) -> list[dict]:
+    """Scan a FASTA once and return one index entry per record (no sequence is kept)."""
+    entries = []
+    cur = None
+    offset = 0
+    last_short = False  # a shorter line was seen; only the record's last line may be shorter
+    with open_input(path) as f:
+        for line in f:
+            width = len(line)
+            if line.startswith(b">"):
+                name = line[1:].split(None, 1)[0].decode("utf-8") if line[1:].strip() else ""
+                cur = {"name": name, "length": 0, "offset": offset + width, "linebases": 0, "linewidth": 0}
+                entries.append(cur)
+                last_short = False
+            elif cur is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases:
+                    if cur["linebases"] == 0:
+                        cur["linebases"], cur["linewidth"] = bases, width
+                    elif (last_short or bases > cur["linebases"]
+                          or (line.endswith(b"\n") and width - bases != cur["linewidth"] - cur["linebases"])):
+                        # an unterminated line can only be the file's last, so its width is not checked
+                        raise ValueError(f"{path}: record {cur['name']} has uneven line lengths; cannot index")
+                    last_short = bases < cur["linebases"]
+                    cur["length"] += bases
+                elif cur["length"]:
+                    last_short = True  # blank line inside a record: only allowed at its end
+            offset += width
+    return entries
+
+
+def write_fai(entries: list[dict], fai_path: str):
+    with open(fai_path, "w", encoding="utf-8") as out:
+        for e in entries:
+            out.write(f"{e['name']}\t{e['length']}\t{e['offset']}\t{e['linebases']}\t{e['linewidth']}\n")
+
+
+def read_fai(fai_path: str) -> list[dict]:
+    entries = []
+    with open(fai_path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 5:
+                continue
+            entries.append({"name": cols[0], "length": int(cols[1]), "offset": int(cols[2]),
+                            "linebases": int(cols[3]), "linewidth": int(cols[4])})
+    return entries
+
+
+def load_index(path: str, rebuild: bool = False) -> list[dict]:
+    """Read <path>.fai, building (and writing) it first if missing or older than the FASTA."""
+    fai = path + ".fai"
+    if not rebuild and os.path.exists(fai) and os.path.getmtime(fai) >= os.path.getmtime(path):
+        return read_fai(fai)
+    entries = build_index(path)
+    try:
+        write_fai(entries, fai)
+    except OSError as e:  # read-only data directory: keep the in-memory index
+        print(f"[WARN] Could not write {fai}: {e}", file=sys.stderr)
+    return entries
+
+
+class IndexedFasta:
+    """Memory-mapped FASTA with 0-based, half-open subsequence access by record name."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = {e["name"]: e for e in load_index(path)}
+        if is_compressed(path):  # offsets are into the decompressed text, which is kept in memory
+            self._fh, self._mm = None, read_bytes(path)
+        else:
+            self._fh = open(path, "rb")
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._fh is not None:
+            self._mm.close()
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.index)
+
+    def length(self, name: str) -> int:
+        return self.index[name]["length"]
+
+    def _byte_offset(self, e, pos):
+        return e["offset"] + (pos // e["linebases"]) * e["linewidth"] + pos % e["linebases"]
+
+    def fetch(self, name: str, start: int = 0, end: int | None = None) -> bytes:
+        """Bases [start, end) of record `name` as bytes (case preserved, newlines removed)."""
+        e = self.index[name]
+        end = e["length"] if end is None else min(end, e["length"])
+        start = max(0, start)
+        if start >= end:
+            return b""
+        raw = self._mm[self._byte_offset(e, start):self._byte_offset(e, end - 1) + 1]
+        return raw.translate(None, b"\r\n")
+
+    def fetch_array(self, name: str) -> np.ndarray:
+        """Whole record as a uint8 array, cut straight out of the memory map (one copy, no str)."""
+        e = self.index[name]
+        full, rem = divmod(e["length"], e["linebases"]) if e["linebases"] else (0, 0)
+        if full and e["offset"] + full * e["linewidth"] > len(self._mm):  # last line has no newline
+            full, rem = full - 1, rem + e["linebases"]
+        lines = np.frombuffer(self._mm, dtype=np.uint8, count=full * e["linewidth"], offset=e["offset"])
+        parts = [lines.reshape(full, e["linewidth"])[:, :e["linebases"]].ravel()]
+        if rem:
+            parts.append(np.frombuffer(self._mm, dtype=np.uint8, count=rem,
+                                       offset=e["offset"] + full * e["linewidth"]))
+        out = np.concatenate(parts)  # copies, so the map can be closed afterwards
+        del lines, parts
+        return out
+
+
+# ---------- Sequence helpers ----------
+_COMPLEMENT = bytes.maketrans(b"ACGTUMRWSYKVHDBNacgtumrwsykvhdbn", b"TGCAAKYWSRMBDHVNtgcaakywsrmbdhvn")
+
+_BASES = "TCAG"
+_STANDARD_AA = "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+CODON_TABLE = {a + b + c: _STANDARD_AA[16 * i + 4 * j + k]
+               for i, a in enumerate(_BASES) for j, b in enumerate(_BASES) for k, c in enumerate(_BASES)}
+# Translation table 11 (bacterial) uses the standard code plus these alternative start codons
+START_CODONS_11 = {"ATG", "GTG", "TTG", "CTG", "ATT", "ATC", "ATA"}
+
+
+def reverse_complement(seq: bytes) -> bytes:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+def translate(seq: str, cds: bool = True) -> str:
+    """Translate with table 11. With cds=True an alternative start codon reads as M and a
+    trailing stop codon is dropped."""
+    seq = seq.upper().replace("U", "T")
+    aa = [CODON_TABLE.get(seq[i:i + 3], "X") for i in range(0, len(seq) - len(seq) % 3, 3)]
+    if cds and aa:
+        if seq[:3] in START_CODONS_11:
+            aa[0] = "M"
+        if aa[-1] == "*":
+            aa.pop()
+    return "".join(aa)
+
+
+# ---------- GFF-driven CDS extraction ----------
+def read_cds_features(gff_path: str, feature_type: str = "CDS") -> list[dict]:
+    """CDS features grouped by ID (multi-part CDSs keep all their parts), in file order.
+
+    Rows come from the cached columnar GFF (gff_table.py) and only the attributes used here are
+    parsed. "phase" is the GFF phase of the part at the 5' end (0 if "."): the number of bases
+    before the first complete codon, which cds_sequence() trims.
+    """
+    table = GFFTable.cached(gff_path)
+    idx = table.select(feature_type)
+    attrs = {k: table.attribute(k, idx) for k in ("ID", "gene", "locus_tag", "Name", "protein_id", "product")}
+    by_id = {}
+    for n, (seqid, start, end, strand, phase) in enumerate(zip(
+            table.seqid_names(idx), table.start[idx].tolist(), table.end[idx].tolist(),
+            table.strand[idx].tolist(), table.phase[idx].tolist())):
+        strand = STRAND_SYMBOLS.get(strand, ".")
+        key = attrs["ID"][n] or f"{seqid}:{start}-{end}{strand}"
+        feat = by_id.get(key)
+        if feat is None:
+            feat = by_id[key] = {"id": key, "seqid": seqid, "strand": strand, "parts": [], "part_phases": [],
+                                 "gene": attrs["gene"][n] or "", "locus_tag": attrs["locus_tag"][n] or "",
+                                 "name": attrs["Name"][n] or "", "protein_id": attrs["protein_id"][n] or "",
+                                 "product": attrs["product"][n] or ""}
+        feat["parts"].append((min(start, end), max(start, end)))
+        feat["part_phases"].append(max(phase, 0))
+    for feat in by_id.values():
+        parts = feat["parts"]
+        if feat["strand"] == "-":
+            first = max(range(len(parts)), key=lambda k: parts[k][1])
+        else:
+            first = min(range(len(parts)), key=lambda k: parts[k][0])
+        feat["phase"] = feat.pop("part_phases")[first]
+    return list(by_id.values())
+
+
+def cds_sequence(fa: IndexedFasta, feat: dict, trim_phase: bool = True) -> bytes:
+    """Spliced CDS sequence in the feature's reading direction (reverse-complemented on '-'), with
+    the leading feat["phase"] bases removed so it starts on a codon boundary (unless trim_phase=False)."""
+    parts = sorted(feat["parts"])
+    seq = b"".join(fa.fetch(feat["seqid"], s - 1, e) for s, e in parts)
+    seq = reverse_complement(seq) if feat["strand"] == "-" else seq
+    return seq[feat.get("phase", 0):] if trim_phase else seq
+
+
+def select_features(features: list[dict], names=None) -> list[dict]:
+    """Features whose gene, locus_tag, Name or protein_id is in `names` (all if names is empty)."""
+    if not names:
+        return features
+    wanted = set(names)
+    return [f for f in features
+            if wanted.intersection((f["gene"], f["locus_tag"], f["name"], f["protein_id"], f["id"]))]
+
+
+def extract_cds(fasta_path: str, gff_path: str, names=None, translate_aa: bool = False, features=None):
+    """Yield (header, sequence) for the selected CDSs of a genome."""
+    features = select_features(features if features is not None else read_cds_features(gff_path), names)
+    with IndexedFasta(fasta_path) as fa:
+        for feat in features:
+            if feat["seqid"] not in fa:
+                print(f"[WARN] {feat['id']}: sequence {feat['seqid']} not in {fasta_path}", file=sys.stderr)
+                continue
+            seq = cds_sequence(fa, feat).decode("ascii")
+            if translate_aa:
+                seq = translate(seq)
+            label = feat["gene"] or feat["locus_tag"] or feat["name"] or feat["id"]
+            coords = ",".join(f"{s}..{e}" for s, e in sorted(feat["parts"]))
+            header = f"{label} {feat['id']} {feat['seqid']}:{coords}({feat['strand']})"
+            if feat["locus_tag"] and feat["locus_tag"] != label:
+                header += f" locus_tag={feat['locus_tag']}"
+            if feat["phase"]:
+                header += f" phase={feat['phase']}"  # leading bases trimmed by cds_sequence
+            yield header, seq
+
+
+def write_fasta(records, out, width: int = 60):
+    for header, seq in records:
+        out.write(f">{header}\n")
+        for i in range(0, len(seq), width):
+            out.write(seq[i:i + width] + "\n")
+
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Index genome FASTAs and extract annotated CDS sequences.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_idx = sub.add_parser("index", help="Write <fasta>.fai for each FASTA")
+    p_idx.add_argument("fasta", nargs="+", help="Genome FASTA file(s)")
+    p_ext = sub.add_parser("extract", help="Extract CDS sequences named in a GFF3")
+    p_ext.add_argument("--fasta", required=True, help="Genome FASTA (indexed on first use)")
+    p_ext.add_argument("--gff", required=True, help="GFF3 annotation for the same genome")
+    p_ext.add_argument("--gene", nargs="*", default=None,
+                       help="Gene names, locus_tags or protein_ids to extract (default: all CDSs)")
+    p_ext.add_argument("--translate", action="store_true", help="Output protein (translation table 11)")
+    p_ext.add_argument("--out", default="-", help="Output FASTA (default: stdout)")
+    args = ap.parse_args()
+
+    if args.cmd == "index":
+        for path in args.fasta:
+            entries = load_index(path, rebuild=True)
+            print(f"[OK] {path}.fai ({len(entries)} records)")
+        return
+
+    features = read_cds_features(args.gff)
+    for g in args.gene or ():
+        if not select_features(features, [g]):
+            print(f"[WARN] No CDS matched {g}", file=sys.stderr)
+    records = list(extract_cds(args.fasta, args.gff, args.gene, args.translate, features=features))
+    if args.out == "-":
+        write_fasta(records, sys.stdout)
+    else:
+        with open(args.out, "w", encoding="utf-8") as out:
+            write_fasta(records, out)
+        print(f"[OK] Wrote {len(records)} sequences to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+figures.py
+Headless, incremental figure rendering shared by plot_gene_lengths.py and compare_gene_losses.py.
+
+A figure is described by a job dict:
+
+    {"kind": "pair_hist",                  # key into DRAWERS
+     "outputs": ["figures/x.hist.png"],    # every file the figure is saved to (format from extension)
+     "inputs": ["x.A.lengths.npy", ...],   # files the figure is derived from (content-hashed)
+     "params": {...},                      # JSON-serializable plot parameters (also hashed)
+     "data": {...},                        # optional precomputed arrays (derived from inputs + params)
+     "figsize": (8, 6), "dpi": 200, "bbox_inches": None}
+
+render_figures() hashes inputs and params into a key and skips any figure whose key matches the
+.figures_manifest.json in its output directory and whose outputs all exist. The rest are drawn
+with matplotlib's object-oriented API on an Agg canvas (no pyplot state), in a process pool.
+Several processes may render into one directory at once (the pipeline's parallel loss stages),
+so each merges only the entries it changed into the manifest under an fcntl lock.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+from profiling import stage
+
+MANIFEST_NAME = ".figures_manifest.json"
+MANIFEST_VERSION = 1
+
+
+# ---------- Drawing ----------
+def shared_histograms(samples, bins=60):
+    """Counts for each sample on one set of bin edges spanning all of them (np.histogram)."""
+    arrays = [np.asarray(s, dtype=float) for s in samples]
+    edges = np.histogram_bin_edges(np.concatenate(arrays) if arrays else np.zeros(0), bins=bins)
+    return edges, [np.histogram(a, bins=edges)[0] for a in arrays]
+
+
+def draw_pair_hist(fig, job):
+    p, d = job["params"], job["data"]
+    ax = fig.add_subplot()
+    for counts, label in ((d["counts1"], p["label1"]), (d["counts2"], p["label2"])):
+        ax.stairs(counts, d["edges"], fill=True, alpha=0.5, label=label)
+    ax.set_xlabel("Gene Length (bp)")
+    ax.set_ylabel("Count")
+    ax.set_title(f"Gene Length Distributions: {p['label1']} vs {p['label2']}")
+    ax.legend()
+
+
+def draw_size_vs_median(fig, job):
+    rows = job["params"]["rows"]  # [label, genome_size_bp, median_gene_length]
+    ax = fig.add_subplot()
+    ax.scatter([r[1] for r in rows], [r[2] for r in rows], s=70)
+    for label, size, median in rows:
+        ax.text(size, median, label, fontsize=8, ha="left", va="bottom")
+    ax.set_xlabel("Genome Size (bp)")
+    ax.set_ylabel("Median Gene Length (bp)")
+    ax.set_title("Genome Size vs. Median Gene Length")
+
+
+def draw_gc_profile(fig, job):
+    from gc_profile import load_track
+
+    track = load_track(job["inputs"][0])
+    ax1, ax2 = fig.subplots(2, 1, sharex=True)
+    for name in dict.fromkeys(track["seqid"]):
+        t = track[track["seqid"] == name]
+        mid = (t["start"] + t["end"]) / 2
+        ax1.plot(mid, t["gc_pct"], linewidth=0.8, label=name)
+        ax2.plot(mid, t["gc_skew"], linewidth=0.6, alpha=0.6)
+        ax2.plot(mid, t["cum_skew"] / max(1.0, abs(t["cum_skew"]).max()), linewidth=1.2)
+    ax1.set_ylabel("GC (%)")
+    ax1.set_title(f"GC content and GC skew: {job['params']['title']}")
+    ax2.axhline(0, color="grey", linewidth=0.5)
+    ax2.set_ylabel("GC skew / scaled cumulative")
+    ax2.set_xlabel("Position (bp)")
+
+
+def draw_loss_box(fig, job):
+    p = job["params"]
+    free_len = max(1, p["free_len"])
+    ax = fig.add_subplot()
+    ax.set_title(f"{p['gene']} — Regions missing in {p['sym_label']} relative to {p['free_label']}")
+    ax.add_patch(Rectangle((0, 0.4), free_len, 0.2, fill=False, linewidth=2))
+    for s, e in p["losses"]:
+        ax.add_patch(Rectangle((s, 0.3), e - s + 1, 0.4, alpha=0.85))
+    ax.set_xlim(0, free_len)
+    ax.set_ylim(0, 1)
+    ax.set_yticks([])
+    ax.set_xlabel(f"{p['free_label']} coordinate (aa)")
+    ax.text(free_len*0.01, 0.9, f"{p['free_label']} length: {p['free_len']} aa", fontsize=9, va="center")
+    ax.text(free_len*0.35, 0.9, f"{p['sym_label']} length: {p['sym_len']} aa", fontsize=9, va="center")
+    ax.text(free_len*0.65, 0.9, f"Loss: {p['total_loss']} aa ({p['loss_frac']:.1%})", fontsize=9, va="center")
+
+
+DRAWERS = {
+    "pair_hist": draw_pair_hist,
+    "size_vs_median": draw_size_vs_median,
+    "gc_profile": draw_gc_profile,
+    "loss_box": draw_loss_box,
+}
+
+
+def render(job):
+    """Draw one job on a fresh Agg figure and save it to every output."""
+    with stage("figure.draw", kind=job["kind"]):
+        fig = Figure(figsize=job.get("figsize", (8, 6)))
+        FigureCanvasAgg(fig)
+        DRAWERS[job["kind"]](fig, job)
+        fig.tight_layout()
+    with stage("figure.save", kind=job["kind"], files=len(job["outputs"])):
+        for out in job["outputs"]:
+            fig.savefig(out, dpi=job.get("dpi", 200), bbox_inches=job.get("bbox_inches"))
+    return job["outputs"]
+
+
+# ---------- Manifest ----------
+def _sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def job_key(job, digests=None) -> str:
+    """sha256 over the kind, outputs, figure settings, params and the content hash of every input."""
+    digests = {} if digests is None else digests
+    for path in job.get("inputs", ()):
+        if path not in digests:
+            digests[path] = _sha256(path)
+    payload = {"kind": job["kind"], "outputs": [os.path.basename(o) for o in job["outputs"]],
+               "figsize": list(job.get("figsize", (8, 6))), "dpi": job.get("dpi", 200),
+               "bbox_inches": job.get("bbox_inches"), "params": job.get("params", {}),
+               "inputs": [digests[p] for p in job.get("inputs", ())]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest["figures"] if manifest.get("version") == MANIFEST_VERSION else {}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return {}
+
+
+def save_manifest(path, figures):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump({"version": MANIFEST_VERSION, "figures": figures}, out, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def update_manifest(path, changes):
+    """Merge {entry: key, or None to drop it} into the manifest at `path`.
+
+    The read-merge-write runs under an exclusive lock on `<path>.lock`, so concurrent writers to
+    the same directory keep each other's entries.
+    """
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            figures = load_manifest(path)
+            for entry, key in changes.items():
+                if key is None:
+                    figures.pop(entry, None)
+                else:
+                    figures[entry] = key
+            save_manifest(path, figures)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def render_figures(jobs, workers=None, force=False) -> dict:
+    """Render the jobs that are out of date; returns {first output: "rendered" | "skipped" | "error"}.
+
+    Each output directory keeps its own manifest, updated only by this (parent) process and only
+    for the figures it rendered.
+    """
+    status, todo, digests = {}, [], {}
+    manifests, changes = {}, {}
+    for job in jobs:
+        name = job["outputs"][0]
+        mpath = os.path.join(os.path.dirname(os.path.abspath(name)), MANIFEST_NAME)
+        if mpath not in manifests:
+            manifests[mpath] = load_manifest(mpath)
+            changes[mpath] = {}
+        entry = os.path.basename(name)
+        key = job_key(job, digests)
+        status[name] = None  # keeps job order in the result
+        if (not force and manifests[mpath].get(entry) == key
+                and all(os.path.exists(o) for o in job["outputs"])):
+            status[name] = "skipped"
+        else:
+            todo.append((job, mpath, entry, key))
+
+    def done(job, mpath, entry, key, error=None):
+        if error is None:
+            changes[mpath][entry] = key
+            status[job["outputs"][0]] = "rendered"
+        else:
+            changes[mpath][entry] = None
+            status[job["outputs"][0]] = "error"
+            print(f"[WARN] Could not render {job['outputs'][0]}: {error}", file=sys.stderr)
+
+    if workers == 1 or len(todo) <= 1:
+        for job, mpath, entry, key in todo:
+            try:
+                render(job)
+                done(job, mpath, entry, key)
+            except Exception as e:  # one bad figure should not stop the others
+                done(job, mpath, entry, key, e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(pool.submit(render, job), job, mpath, entry, key) for job, mpath, entry, key in todo]
+            for fut, job, mpath, entry, key in futures:
+                try:
+                    fut.result()
+                    done(job, mpath, entry, key)
+                except Exception as e:
+                    done(job, mpath, entry, key, e)
+    for mpath, updates in changes.items():
+        if not updates:
+            continue
+        try:
+            update_manifest(mpath, updates)
+        except OSError as e:
+            print(f"[WARN] Could not write {mpath}: {e}", file=sys.stderr)
+    return status
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+gc_profile.py
+Sliding-window GC content and GC skew along genome FASTA records.
+
+For each record, windows of --window bp are placed every --step bp; when the last full window
+stops short of the record end, one shorter window covers the remaining bases. Each reports:
+  gc_pct    100 * (G + C) / window length
+  gc_skew   (G - C) / (G + C)   (0 where the window has no G/C)
+  cum_skew  cumulative GC skew: running sum of the skew of consecutive, non-overlapping
+            --step bp bins, through the bin starting at this window's start (the running sum
+            of gc_skew when step == window). Its minimum is the usual replication-origin
+            estimate and its maximum the terminus
+
+Counts come from cumulative sums over the memory-mapped record, so each window costs two
+subtractions regardless of its size.
+
+Usage:
+  python gc_profile.py wigglesworthia_g_sequence.fasta --window 5000 --step 1000 \
+      --out wigglesworthia.gc_profile.tsv
+  (use an .npy output path for a binary track; plot with plot_gene_lengths.py --gc-profile)
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from fasta_index import IndexedFasta
+
+TRACK_DTYPE = [("seqid", "U64"), ("start", "i8"), ("end", "i8"),
+               ("gc_pct", "f8"), ("gc_skew", "f8"), ("cum_skew", "f8")]
+
+
+def gc_skew_profile(seq: np.ndarray, window: int, step: int) -> dict:
+    """Windowed GC%, GC skew and cumulative skew for one uint8 sequence array (see module docstring)."""
+    is_g = (seq == ord("G")) | (seq == ord("g"))
+    is_c = (seq == ord("C")) | (seq == ord("c"))
+    cg = np.concatenate(([0], np.cumsum(is_g, dtype=np.int64)))
+    cc = np.concatenate(([0], np.cumsum(is_c, dtype=np.int64)))
+    n = len(seq)
+    window = min(window, n)
+    starts = np.arange(0, n - window + 1, step, dtype=np.int64) if n else np.zeros(0, dtype=np.int64)
+    ends = starts + window
+    if n and ends[-1] < n and starts[-1] + step < n:  # trailing partial window
+        starts = np.append(starts, starts[-1] + step)
+        ends = np.append(ends, n)
+
+    def skew_of(lo, hi):
+        g, c = cg[hi] - cg[lo], cc[hi] - cc[lo]
+        return g + c, np.divide(g - c, g + c, out=np.zeros(len(lo)), where=g + c > 0)
+
+    gc, skew = skew_of(starts, ends)
+    _, bin_skew = skew_of(starts, np.minimum(starts + step, n))  # bin i = [i * step, (i + 1) * step)
+    return {"start": starts, "end": ends, "gc_pct": 100.0 * gc / np.maximum(ends - starts, 1),
+            "gc_skew": skew, "cum_skew": np.cumsum(bin_skew)}
+
+
+def profile_fasta(path: str, window: int = 5000, step: int = 1000) -> np.ndarray:
+    """Profile every record of a FASTA; returns one structured array (TRACK_DTYPE)."""
+    tracks = []
+    with IndexedFasta(path) as fa:
+        for name in fa.names:
+            prof = gc_skew_profile(fa.fetch_array(name), window, step)
+            track = np.zeros(len(prof["start"]), dtype=TRACK_DTYPE)
+            track["seqid"] = name
+            for k, v in prof.items():
+                track[k] = v
+            tracks.append(track)
+    return np.concatenate(tracks) if tracks else np.zeros(0, dtype=TRACK_DTYPE)
+
+
+def write_track(track: np.ndarray, path: str):
+    if path.endswith(".npy"):
+        np.save(path, track)
+        return
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("seqid\tstart\tend\tgc_pct\tgc_skew\tcum_skew\n")
+        for r in track:
+            out.write(f"{r['seqid']}\t{r['start']}\t{r['end']}\t{r['gc_pct']:.4f}\t{r['gc_skew']:.6f}\t{r['cum_skew']:.6f}\n")
+
+
+def load_track(path: str) -> np.ndarray:
+    """Read a track written by write_track (.npy or TSV) back into a TRACK_DTYPE array."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    rows = np.genfromtxt(path, delimiter="\t", names=True, dtype=None, encoding="utf-8")
+    track = np.zeros(rows.size, dtype=TRACK_DTYPE)
+    for k, _ in TRACK_DTYPE:
+        track[k] = rows[k]
+    return track
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sliding-window GC% and GC-skew profile of genome FASTA files.")
+    ap.add_argument("fasta", help="Genome FASTA (indexed and memory-mapped on first use)")
+    ap.add_argument("--window", type=int, default=5000, help="Window size in bp (default: 5000)")
+    ap.add_argument("--step", type=int, default=1000, help="Step between window starts in bp (default: 1000)")
+    ap.add_argument("--out", required=True, help="Output track: .tsv or .npy")
+    args = ap.parse_args()
+    if args.window < 1 or args.step < 1:
+        print("ERROR: --window and --step must be positive.", file=sys.stderr)
+        sys.exit(2)
+
+    track = profile_fasta(args.fasta, args.window, args.step)
+    write_track(track, args.out)
+    print(f"Wrote: {args.out} ({len(track)} windows)")
+    for name in dict.fromkeys(track["seqid"]):
+        t = track[track["seqid"] == name]
+        if len(t):
+            lo, hi = int(np.argmin(t["cum_skew"])), int(np.argmax(t["cum_skew"]))
+            print(f"{name}: GC {t['gc_pct'].min():.1f}-{t['gc_pct'].max():.1f}%, "
+                  f"cumulative skew min at {t['start'][lo]} (origin?), max at {t['start'][hi]} (terminus?)")
+
+
+if __name__ == "__main__":
+    main()
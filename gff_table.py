@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+gff_table.py
+Single-pass, columnar GFF3 parser.
+
+A GFF3 file is read once into NumPy columns (seqid and type as codes into interned string
+tables, start, end, strand, phase) plus the raw attribute fields packed into one byte blob
+with offsets. Attributes are only parsed on request, and only for the keys asked for, so any
+feature type can be queried afterwards without rereading the file.
+
+    table = GFFTable.parse("Escherichia_coli_K12.gff3")
+    cds = table.select("CDS")
+    lengths = table.lengths(cds)
+    tags = table.attribute("locus_tag", cds)
+
+GFFTable.cached(path) keeps a binary copy of the parsed columns (one .npy per column plus
+meta.json) in .gffcache/<gff name>/ next to the GFF, memory-maps it on later calls, and
+re-parses automatically when the GFF's size or mtime changes.
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from compressed_io import open_input
+
+CACHE_VERSION = 1
+_COLUMNS = ("seqid", "type", "start", "end", "strand", "phase", "attr_blob", "attr_offsets")
+
+STRAND_CODES = {"+": 1, "-": -1, ".": 0, "?": 0}
+STRAND_SYMBOLS = {1: "+", -1: "-", 0: "."}
+
+
+@lru_cache(maxsize=None)
+def _part_start(key: str):
+    # a later part whose key could be `key` (needs the full split to decide last-one-wins)
+    return re.compile(r";\s*" + re.escape(key) + r"(?:[=\s;]|$)")
+
+
+def _get_attribute_slow(attr_field: str, key: str):
+    for p in reversed(attr_field.strip().split(";")):
+        if not p:
+            continue
+        if "=" in p:
+            k, v = p.split("=", 1)
+        elif " " in p:
+            k, v = p.split(" ", 1)
+        else:
+            k, v = p, ""
+        if k.strip() == key:
+            return v.strip()
+    return None
+
+
+def get_attribute(attr_field: str, key: str):
+    """Value of one attribute key, with the same parsing rules (and last-one-wins) as
+    compare_gene_lengths.parse_gff_attributes, without building a dict; None if absent.
+
+    The common case (the last "key=" at the start of a ;-separated part) is found with
+    rfind; anything ambiguous falls back to splitting the field.
+    """
+    if not attr_field or attr_field == "." or key not in attr_field:
+        return None
+    needle = key + "="
+    p = attr_field.rfind(needle)
+    while p >= 0:
+        q = p - 1
+        while q >= 0 and attr_field[q].isspace():
+            q -= 1
+        if q < 0 or attr_field[q] == ";":
+            e = attr_field.find(";", p)
+            if e < 0:
+                return attr_field[p + len(needle):].strip()
+            if _part_start(key).search(attr_field, e):
+                break
+            return attr_field[p + len(needle):e].strip()
+        p = attr_field.rfind(needle, 0, p)
+    return _get_attribute_slow(attr_field, key)
+
+
+class GFFTable:
+    """Columnar GFF3 features. Row order is file order; rows with non-integer coordinates are dropped."""
+
+    def __init__(self, seqids, types, seqid, ftype, start, end, strand, phase, attr_blob, attr_offsets, path=None):
+        self.seqids = list(seqids)      # interned seqid strings; `seqid` holds codes into this list
+        self.types = list(types)        # interned feature types; `type` holds codes into this list
+        self.seqid = seqid
+        self.type = ftype
+        self.start = start
+        self.end = end
+        self.strand = strand            # +1, -1 or 0
+        self.phase = phase              # 0-2, or -1 for "."
+        self.attr_blob = attr_blob      # uint8 array: all column-9 fields back to back (utf-8)
+        self.attr_offsets = attr_offsets
+        self.path = path
+
+    @classmethod
+    def parse(cls, path: str) -> "GFFTable":
+        seq_codes, type_codes = {}, {}
+        seqid, ftype, start, end, strand, phase, attrs = [], [], [], [], [], [], []
+        with open_input(path) as f:
+            for line in f:
+                if not line or line.startswith(b"#"):
+                    continue
+                cols = line.rstrip(b"\n").split(b"\t", 8)
+                if len(cols) < 9:
+                    continue
+                try:
+                    s_i = int(cols[3])
+                    e_i = int(cols[4])
+                except ValueError:
+                    continue
+                seqid.append(seq_codes.setdefault(cols[0], len(seq_codes)))
+                ftype.append(type_codes.setdefault(cols[2], len(type_codes)))
+                start.append(s_i)
+                end.append(e_i)
+                strand.append(cols[6])
+                phase.append(cols[7])
+                attrs.append(cols[8])
+        lens = np.fromiter(map(len, attrs), dtype=np.int64, count=len(attrs))
+        offsets = np.zeros(len(attrs) + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        strand_map = {k.encode(): v for k, v in STRAND_CODES.items()}
+        phase_map = {b"0": 0, b"1": 1, b"2": 2}
+        return cls(
+            seqids=[s.decode("utf-8", "ignore") for s in seq_codes],
+            types=[t.decode("utf-8", "ignore") for t in type_codes],
+            seqid=np.array(seqid, dtype=np.int32),
+            ftype=np.array(ftype, dtype=np.int32),
+            start=np.array(start, dtype=np.int64),
+            end=np.array(end, dtype=np.int64),
+            strand=np.array([strand_map.get(x, 0) for x in strand], dtype=np.int8),
+            phase=np.array([phase_map.get(x, -1) for x in phase], dtype=np.int8),
+            attr_blob=np.frombuffer(b"".join(attrs), dtype=np.uint8),
+            attr_offsets=offsets,
+            path=path,
+        )
+
+    # ----- binary cache -----
+    @staticmethod
+    def cache_dir_for(path: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(path)), ".gffcache", os.path.basename(path))
+
+    @staticmethod
+    def _source_key(path: str) -> dict:
+        st = os.stat(path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def save(self, cache_dir: str, source: dict | None = None):
+        """Write the columns as .npy files plus meta.json (replaces cache_dir atomically).
+
+        `source` is the size/mtime of the GFF the table was parsed from (stat'ed now if omitted).
+        Several processes may cache the same GFF at once, so each writes its own temporary
+        directory; one that loses the final rename to an equally valid cache just discards its copy.
+        """
+        tmp = f"{cache_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for col in _COLUMNS:
+            value = self.type if col == "type" else getattr(self, col)
+            np.save(os.path.join(tmp, col + ".npy"), np.ascontiguousarray(value))
+        meta = {"version": CACHE_VERSION, "seqids": self.seqids, "types": self.types, "path": self.path}
+        if source is None and self.path:
+            source = self._source_key(self.path)
+        meta["source"] = source
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as out:
+            json.dump(meta, out)
+        old = f"{cache_dir}.{os.getpid()}.old"
+        try:
+            for attempt in range(10):
+                try:
+                    os.replace(cache_dir, old)  # a directory cannot be renamed over a non-empty one
+                except FileNotFoundError:
+                    pass
+                try:
+                    os.replace(tmp, cache_dir)
+                    return
+                except OSError:
+                    if self._cache_matches(cache_dir, source):  # another writer got there first
+                        return
+                    if attempt == 9:
+                        raise
+                shutil.rmtree(old, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+            shutil.rmtree(old, ignore_errors=True)
+
+    @staticmethod
+    def _cache_matches(cache_dir: str, source: dict | None) -> bool:
+        try:
+            with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get("version") == CACHE_VERSION and meta.get("source") == source
+
+    @classmethod
+    def load(cls, cache_dir: str, mmap: bool = True) -> "GFFTable":
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        cols = {c: np.load(os.path.join(cache_dir, c + ".npy"), mmap_mode="r" if mmap else None)
+                for c in _COLUMNS}
+        return cls(meta["seqids"], meta["types"], cols["seqid"], cols["type"], cols["start"], cols["end"],
+                   cols["strand"], cols["phase"], cols["attr_blob"], cols["attr_offsets"], path=meta.get("path"))
+
+    @classmethod
+    def cached(cls, path: str, cache_dir: str | None = None) -> "GFFTable":
+        """Parsed table for `path`, from the binary cache when it matches the file's size and mtime."""
+        cache_dir = cache_dir or cls.cache_dir_for(path)
+        source = cls._source_key(path)
+        try:
+            if cls._cache_matches(cache_dir, source):
+                return cls.load(cache_dir)
+        except (OSError, ValueError, KeyError):
+            pass
+        table = cls.parse(path)
+        try:
+            table.save(cache_dir, source=source)
+        except OSError as e:  # read-only annotation directory: just use the parsed table
+            print(f"[WARN] Could not write GFF cache {cache_dir}: {e}", file=sys.stderr)
+        return table
+
+    def __len__(self):
+        return len(self.start)
+
+    def select(self, feature_type: str) -> np.ndarray:
+        """Row indices of one feature type (empty if the type never occurs)."""
+        if feature_type not in self.types:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.type == self.types.index(feature_type))
+
+    def lengths(self, idx=None) -> np.ndarray:
+        """abs(end - start) + 1 for the given rows (all rows by default)."""
+        s = self.start if idx is None else self.start[idx]
+        e = self.end if idx is None else self.end[idx]
+        return np.abs(e - s) + 1
+
+    def attr_string(self, i: int) -> str:
+        """Raw column-9 field of row i."""
+        a, b = self.attr_offsets[i], self.attr_offsets[i + 1]
+        return bytes(memoryview(self.attr_blob)[a:b]).decode("utf-8", "ignore")
+
+    def _attr_strings(self, idx=None):
+        rows = range(len(self)) if idx is None else np.asarray(idx).tolist()
+        blob = memoryview(self.attr_blob)
+        offsets = self.attr_offsets
+        starts = offsets[:-1].tolist() if idx is None else offsets[rows].tolist()
+        ends = offsets[1:].tolist() if idx is None else offsets[np.asarray(rows, dtype=np.int64) + 1].tolist()
+        for a, b in zip(starts, ends):
+            yield bytes(blob[a:b]).decode("utf-8", "ignore")
+
+    def attribute(self, key: str, idx=None) -> list:
+        """Value of `key` for each row (None where absent); only that key is parsed."""
+        return [get_attribute(field, key) for field in self._attr_strings(idx)]
+
+    def first_attribute(self, keys, idx=None) -> list:
+        """Per row, the value of the first key in `keys` that is present, non-empty and not '.'."""
+        out = []
+        for field in self._attr_strings(idx):
+            chosen = None
+            for k in keys:
+                v = get_attribute(field, k)
+                if v and v != ".":
+                    chosen = v
+                    break
+            out.append(chosen)
+        return out
+
+    def seqid_names(self, idx=None) -> list[str]:
+        codes = self.seqid if idx is None else self.seqid[idx]
+        return [self.seqids[c] for c in codes]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+Run the whole analysis (genome stats, gene-length comparisons, figures, gene-loss diagrams) from
+one JSON config, in one interpreter, calling the scripts' functions directly.
+
+Usage:
+  python pipeline.py pipeline.example.json --jobs 4
+  python pipeline.py pipeline.example.json --dry-run      # list what would run
+
+Every stage declares the files it reads and writes; a stage that reads another's output runs
+after it. A stage is rerun only when the SHA-256 of its inputs or its settings differ from the
+last successful run (kept in .pipeline_state.json next to the config) or an output is missing;
+stages whose inputs are ready run concurrently in a process pool.
+
+Config (paths are relative to the config file):
+  {
+    "results_dir": "results", "figures_dir": "figures",
+    "feature": "CDS", "lengths_format": "tsv", "bins": 60, "engine": "vectorized",
+    "genomes":    [{"label": "Buchnera", "fasta": "....fasta", "gff": "....gff3", "genes": "rpoH"}, ...],
+    "pairs":      [{"prefix": "buchnera_vs_ecoli", "genome1": "Buchnera", "genome2": "Ecoli_K12"}, ...],
+    "gene_pairs": [{"gene": "gltJ", "sym": "gltJ_Wigglesworthia.fasta", "free": "gltJ_Salmonella.fasta",
+                    "sym_label": "Wigglesworthia", "free_label": "Salmonella", "out": "gltJ"}, ...]
+  }
+"fasta" and "gff" are each optional; a genome needs a FASTA to enter genome_stats.tsv and a GFF3
+to be used in "pairs".
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from compare_gene_lengths import compare_two, file_sha256
+from compare_gene_losses import compare_pair
+from compute_genome_stats import write_genome_stats
+from plot_gene_lengths import plot_all
+
+STATE_NAME = ".pipeline_state.json"
+STATE_VERSION = 1
+
+
+# ---------- Config ----------
+def load_config(path: str) -> dict:
+    """Read the JSON config, resolve its paths against the config's directory and check references."""
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p):
+        return p if os.path.isabs(p) else os.path.join(base, p)
+
+    cfg["results_dir"] = resolve(cfg.get("results_dir", "results"))
+    cfg["figures_dir"] = resolve(cfg.get("figures_dir", "figures"))
+    genomes = {}
+    for g in cfg.get("genomes", []):
+        if "label" not in g:
+            raise ValueError(f"genome entry without a label: {g}")
+        if g["label"] in genomes:
+            raise ValueError(f"duplicate genome label: {g['label']}")
+        genomes[g["label"]] = dict(g, **{k: resolve(g[k]) for k in ("fasta", "gff") if g.get(k)})
+    cfg["genomes"] = genomes
+    for pair in cfg.get("pairs", []):
+        for key in ("prefix", "genome1", "genome2"):
+            if key not in pair:
+                raise ValueError(f"pair entry without '{key}': {pair}")
+        for key in ("genome1", "genome2"):
+            if not genomes.get(pair[key], {}).get("gff"):
+                raise ValueError(f"pair {pair['prefix']}: genome {pair[key]!r} has no GFF3 in 'genomes'")
+    gene_pairs = []
+    for gp in cfg.get("gene_pairs", []):
+        for key in ("gene", "sym", "free", "out"):
+            if key not in gp:
+                raise ValueError(f"gene pair entry without '{key}': {gp}")
+        gene_pairs.append(dict(gp, sym=resolve(gp["sym"]), free=resolve(gp["free"])))
+    cfg["gene_pairs"] = gene_pairs
+    cfg["pairs"] = cfg.get("pairs", [])
+    cfg["state"] = os.path.join(base, STATE_NAME)
+    return cfg
+
+
+# ---------- Stages ----------
+def build_stages(cfg: dict) -> list[dict]:
+    """One stage dict (name, func, kwargs, inputs, outputs) per unit of work, in config order."""
+    res, figs = cfg["results_dir"], cfg["figures_dir"]
+    feature = cfg.get("feature", "CDS")
+    fmt = cfg.get("lengths_format", "tsv")
+    stages = []
+
+    with_fasta = [g for g in cfg["genomes"].values() if g.get("fasta")]
+    stats_tsv = os.path.join(res, "genome_stats.tsv")
+    if with_fasta:
+        stages.append({"name": "genome_stats", "func": write_genome_stats,
+                       "kwargs": {"files": [g["fasta"] for g in with_fasta],
+                                  "labels": [g["label"] for g in with_fasta],
+                                  "genes": [g.get("genes", "") for g in with_fasta],
+                                  "tsv_path": stats_tsv, "md_path": os.path.join(res, "genome_stats.md"),
+                                  "cache_path": None, "jobs": 1},
+                       "inputs": [g["fasta"] for g in with_fasta],
+                       "outputs": [stats_tsv, os.path.join(res, "genome_stats.md")]})
+
+    length_files = []
+    for pair in cfg["pairs"]:
+        g1, g2 = cfg["genomes"][pair["genome1"]], cfg["genomes"][pair["genome2"]]
+        prefix = os.path.join(res, pair["prefix"])
+        lengths = [f"{prefix}.{g['label']}.lengths.{ext}" for g in (g1, g2)
+                   for ext in (("tsv", "npy") if fmt == "both" else (fmt,))]
+        length_files += lengths
+        stages.append({"name": f"lengths:{pair['prefix']}", "func": compare_two,
+                       "kwargs": {"gff1": g1["gff"], "gff2": g2["gff"], "label1": g1["label"],
+                                  "label2": g2["label"], "out_prefix": prefix, "feature": feature,
+                                  "fmt": fmt, "jobs": 1},
+                       "inputs": [g1["gff"], g2["gff"]],
+                       "outputs": lengths + [f"{prefix}.stats.txt"]})
+
+    if cfg["pairs"]:
+        pairs = [[p["prefix"], p["genome1"], p["genome2"]] for p in cfg["pairs"]]
+        figures = [os.path.join(figs, f"{p[0]}.hist.png") for p in pairs]
+        if with_fasta:
+            figures.append(os.path.join(figs, "genome_size_vs_median_gene_length.png"))
+        stages.append({"name": "plots", "func": plot_all,
+                       "kwargs": {"pairs": pairs, "results_dir": res, "stats_path": stats_tsv, "outdir": figs,
+                                  "bins": cfg.get("bins", 60), "feature": feature, "jobs": 1},
+                       "inputs": length_files + ([stats_tsv] if with_fasta else []),
+                       "outputs": figures})
+
+    for gp in cfg["gene_pairs"]:
+        out = os.path.join(res, gp["out"])
+        stages.append({"name": f"losses:{gp['out']}", "func": compare_pair,
+                       "kwargs": {"sym_fa": gp["sym"], "free_fa": gp["free"], "gene": gp["gene"],
+                                  "sym_label": gp.get("sym_label", "Symbiont"),
+                                  "free_label": gp.get("free_label", "Free-living"), "outbase": out,
+                                  "engine": gp.get("engine", cfg.get("engine", "vectorized"))},
+                       "inputs": [gp["sym"], gp["free"]],
+                       "outputs": [out + "_loss_segments.csv", out + "_alignment_events.csv",
+                                   out + "_conservation.csv", out + "_loss_box_diagram.png",
+                                   out + "_loss_box_diagram.pdf"]})
+    return stages
+
+
+def stage_deps(stages: list[dict]) -> dict:
+    """{stage name: names of the stages producing any of its inputs}."""
+    producer = {}
+    for st in stages:
+        for out in st["outputs"]:
+            if out in producer:
+                raise ValueError(f"{out} is produced by both {producer[out]} and {st['name']}")
+            producer[out] = st["name"]
+    return {st["name"]: {producer[p] for p in st["inputs"] if p in producer} - {st["name"]} for st in stages}
+
+
+def stage_key(stage: dict) -> str:
+    """sha256 over the stage's function, settings and the contents of its inputs."""
+    payload = {"func": f"{stage['func'].__module__}.{stage['func'].__qualname__}", "kwargs": stage["kwargs"],
+               "inputs": [file_sha256(p) for p in stage["inputs"]]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_stage(stage: dict):
+    """Run one stage (in a worker process) and check that it wrote everything it declared."""
+    for d in {os.path.dirname(p) for p in stage["outputs"]}:
+        os.makedirs(d, exist_ok=True)
+    stage["func"](**stage["kwargs"])
+    missing = [p for p in stage["outputs"] if not os.path.exists(p)]
+    if missing:
+        raise RuntimeError(f"did not produce {', '.join(missing)}")
+
+
+# ---------- Scheduler ----------
+def load_state(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state["stages"] if state.get("version") == STATE_VERSION else {}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return {}
+
+
+def save_state(path: str, stages: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump({"version": STATE_VERSION, "stages": stages}, out, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def run_pipeline(stages: list[dict], state_path: str, jobs: int | None = None, force: bool = False,
+                 dry_run: bool = False) -> dict:
+    """Run stale stages in dependency order; returns {stage name: status}.
+
+    Statuses: "done", "up to date", "failed", "blocked" (an upstream stage failed) and, with
+    dry_run, "would run".
+    """
+    deps = stage_deps(stages)
+    by_name = {st["name"]: st for st in stages}
+    state = load_state(state_path)
+    status = {}
+    pending = [st["name"] for st in stages]
+    running = {}  # future -> (name, key)
+
+    def finish(name, key, error=None):
+        if error is None:
+            status[name] = "done"
+            state[name] = key
+            print(f"[OK] {name}")
+        else:
+            status[name] = "failed"
+            state.pop(name, None)
+            print(f"[error] {name}: {error}", file=sys.stderr)
+        if not dry_run:
+            save_state(state_path, state)
+
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs != 1 and not dry_run else None
+    try:
+        while pending or running:
+            progressed = False
+            for name in list(pending):
+                if any(d not in status for d in deps[name]):
+                    continue  # an input is still being produced
+                pending.remove(name)
+                progressed = True
+                st = by_name[name]
+                upstream = {status[d] for d in deps[name]}
+                if upstream & {"failed", "blocked"}:
+                    status[name] = "blocked"
+                    print(f"[blocked] {name} (upstream stage failed)", file=sys.stderr)
+                    continue
+                if "would run" in upstream:
+                    status[name] = "would run"
+                    continue
+                try:
+                    key = stage_key(st)
+                except OSError as e:
+                    finish(name, None, f"missing input: {e}")
+                    continue
+                if not force and state.get(name) == key and all(os.path.exists(p) for p in st["outputs"]):
+                    status[name] = "up to date"
+                    print(f"[skip] {name} (up to date)")
+                elif dry_run:
+                    status[name] = "would run"
+                elif pool is None:
+                    print(f"[run] {name}")
+                    try:
+                        run_stage(st)
+                        finish(name, key)
+                    except Exception as e:  # keep going with independent stages
+                        finish(name, key, e)
+                else:
+                    print(f"[run] {name}")
+                    running[pool.submit(run_stage, st)] = (name, key)
+            if running and not progressed:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name, key = running.pop(fut)
+                    try:
+                        fut.result()
+                        finish(name, key)
+                    except Exception as e:
+                        finish(name, key, e)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return status
+
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Run the genome comparison pipeline from one JSON config.")
+    ap.add_argument("config", help="Pipeline config (JSON)")
+    ap.add_argument("--jobs", type=int, default=None, help="Stages run at once (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Rerun every stage even if its inputs are unchanged")
+    ap.add_argument("--dry-run", action="store_true", help="Only report which stages are stale")
+    ap.add_argument("--state", default=None, help=f"State file (default: {STATE_NAME} next to the config)")
+    args = ap.parse_args()
+
+    try:
+        cfg = load_config(args.config)
+        stages = build_stages(cfg)
+        stage_deps(stages)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    status = run_pipeline(stages, args.state or cfg["state"], jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    if args.dry_run:
+        for st in stages:
+            print(f"{status[st['name']]:>10}  {st['name']}")
+        return
+    counts = {s: sum(v == s for v in status.values()) for s in ("done", "up to date", "failed", "blocked")}
+    print(f"[pipeline] {counts['done']} run, {counts['up to date']} up to date, "
+          f"{counts['failed']} failed, {counts['blocked']} blocked")
+    if counts["failed"] or counts["blocked"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
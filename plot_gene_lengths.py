@@ -5,6 +5,7 @@ plot_gene_lengths.py
 Generates:
 1) Overlaid histograms of gene length distributions for each comparison pair
 2) A scatter plot of genome size (bp) vs. median gene length (bp) across all genomes
+3) Optionally, GC% / GC-skew tracks written by gc_profile.py (--gc-profile)
 
 Usage (from your repo root):
     python plot_gene_lengths.py \
@@ -17,8 +18,13 @@ Requirements:
     - pandas
     - matplotlib
 
+Figures are drawn headless in a process pool (figures.py). A figure whose inputs and plot
+parameters are unchanged since the last run (per figures/.figures_manifest.json) is skipped;
+--force redraws everything.
+
 Assumptions:
-    - You have already run compare_gene_lengths.py to produce:
+    - You have already run compare_gene_lengths.py to produce (with --format npy, the
+      matching *.lengths.npy files are used instead and memory-mapped):
         results/buchnera_vs_ecoli.Buchnera.lengths.tsv
         results/buchnera_vs_ecoli.Ecoli_K12.lengths.tsv
         results/wigglesworthia_vs_salmonella.Wigglesworthia.lengths.tsv
@@ -31,39 +37,74 @@ Assumptions:
 
 import os
 import argparse
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from compare_gene_lengths import read_lengths_npy
+from figures import render_figures, shared_histograms
+from gff_table import GFFTable
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
+from sketches import LengthSketch
+
+# The three comparison pairs and their labels exactly as produced by compare_gene_lengths.py
+DEFAULT_PAIRS = [
+    # (prefix, label1, label2)
+    ("buchnera_vs_ecoli", "Buchnera", "Ecoli_K12"),
+    ("wigglesworthia_vs_salmonella", "Wigglesworthia", "Salmonella_no75"),
+    ("cpneumoniae_vs_isosphaera", "C_pneumoniae_TW183", "Isosphaera_pallida"),
+]
+
+def _lengths_source(tsv_path):
+    """The file load_lengths() actually reads for `tsv_path`: the sibling .lengths.npy when it
+    exists and is at least as new as the TSV, else the TSV itself."""
+    npy_path = tsv_path if tsv_path.endswith(".npy") else os.path.splitext(tsv_path)[0] + ".npy"
+    if os.path.exists(npy_path) and (not os.path.exists(tsv_path) or tsv_path == npy_path
+                                     or os.path.getmtime(npy_path) >= os.path.getmtime(tsv_path)):
+        return npy_path
+    return tsv_path
 
 def load_lengths(tsv_path):
-    """Read a .lengths.tsv file and return a pandas Series of lengths (bp)."""
-    df = pd.read_csv(tsv_path, sep="\t")
+    """Read a .lengths.tsv (or .lengths.npy) file and return a pandas Series of lengths (bp).
+
+    A .lengths.npy written by `compare_gene_lengths.py --format npy|both` next to the TSV is
+    preferred when it is at least as new, and is memory-mapped instead of parsed.
+    """
+    path = _lengths_source(tsv_path)
+    if path.endswith(".npy"):
+        records, _ = read_lengths_npy(path)
+        return pd.Series(np.asarray(records["length"]), name="length_bp")
+    df = pd.read_csv(path, sep="\t")
     # Expect columns: index, length_bp
     col = "length_bp"
     if col not in df.columns:
         # Support potential alternative column naming
         candidates = [c for c in df.columns if "length" in c.lower()]
         if not candidates:
-            raise ValueError(f"Could not find 'length_bp' column in {tsv_path}")
+            raise ValueError(f"Could not find 'length_bp' column in {path}")
         col = candidates[0]
     return df[col].dropna()
 
+def lengths_file(results_dir, prefix, label):
+    """Path of the lengths file for one genome of a pair, as load_lengths() will read it (so the
+    figure manifest hashes that file): the .npy if it is at least as new as the .tsv, else the .tsv."""
+    return _lengths_source(os.path.join(results_dir, f"{prefix}.{label}.lengths.tsv"))
+
+def lengths_from_gff(gff_path, feature="CDS"):
+    """Feature lengths straight from a GFF3 via the shared binary annotation cache (see gff_table.py)."""
+    table = GFFTable.cached(gff_path)
+    return pd.Series(table.lengths(table.select(feature)), name="length_bp")
+
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
-def plot_pair_hist(lengths1, lengths2, label1, label2, out_path, bins=60):
-    """Create an overlaid histogram for two genomes' gene lengths."""
-    plt.figure(figsize=(8,6))
-    plt.hist(lengths1, bins=bins, label=label1, alpha=0.5)
-    plt.hist(lengths2, bins=bins, label=label2, alpha=0.5)
-    plt.xlabel("Gene Length (bp)")
-    plt.ylabel("Count")
-    plt.title(f"Gene Length Distributions: {label1} vs {label2}")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=200)
-    plt.close()
-
-def plot_genome_size_vs_median(stats_df, label_to_median, out_path):
+def pair_hist_job(lengths1, lengths2, label1, label2, inputs, out_path, bins=60, feature=None):
+    """Overlaid histogram of two genomes' gene lengths, counted once on shared bin edges."""
+    edges, (counts1, counts2) = shared_histograms([lengths1, lengths2], bins=bins)
+    return {"kind": "pair_hist", "outputs": [out_path], "inputs": list(inputs),
+            "params": {"label1": label1, "label2": label2, "bins": bins, "feature": feature},
+            "data": {"edges": edges, "counts1": counts1, "counts2": counts2}, "figsize": (8, 6), "dpi": 200}
+
+def size_vs_median_job(stats_df, label_to_median, out_path):
     """Scatter of genome size vs median gene length for all available labels."""
     # Merge stats_df['label', 'genome_size_bp'] with medians
     med_df = pd.DataFrame(
@@ -75,65 +116,117 @@ def plot_genome_size_vs_median(stats_df, label_to_median, out_path):
     if merged.empty:
         raise ValueError("No overlap between genome_stats labels and computed medians.")
 
-    plt.figure(figsize=(8,6))
-    plt.scatter(merged["genome_size_bp"], merged["median_gene_length"], s=70)
-    # annotate points
-    for _, row in merged.iterrows():
-        plt.text(row["genome_size_bp"], row["median_gene_length"], row["label"], fontsize=8, ha="left", va="bottom")
-    plt.xlabel("Genome Size (bp)")
-    plt.ylabel("Median Gene Length (bp)")
-    plt.title("Genome Size vs. Median Gene Length")
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=200)
-    plt.close()
+    rows = [[str(r["label"]), float(r["genome_size_bp"]), float(r["median_gene_length"])] for _, r in merged.iterrows()]
+    return {"kind": "size_vs_median", "outputs": [out_path], "inputs": [],
+            "params": {"rows": rows}, "figsize": (8, 6), "dpi": 200}
 
-def main():
-    ap = argparse.ArgumentParser(description="Plot gene length distributions and genome size trends.")
-    ap.add_argument("--results_dir", default="results", help="Directory containing *.lengths.tsv files (default: results)")
-    ap.add_argument("--stats", default="genome_stats.tsv", help="Path to genome_stats.tsv (default: genome_stats.tsv)")
-    ap.add_argument("--outdir", default="figures", help="Directory to write figures (default: figures)")
-    ap.add_argument("--bins", type=int, default=60, help="Number of histogram bins (default: 60)")
-    args = ap.parse_args()
+def gc_profile_job(track_path, title, out_path):
+    """GC% and GC skew / cumulative skew tracks (from gc_profile.py) along the genome."""
+    return {"kind": "gc_profile", "outputs": [out_path], "inputs": [track_path],
+            "params": {"title": title}, "figsize": (10, 6), "dpi": 200}
+
+def plot_all(pairs=DEFAULT_PAIRS, results_dir="results", stats_path="genome_stats.tsv", outdir="figures", bins=60,
+             gffs=None, feature="CDS", sketches=(), gc_profiles=(), jobs=None, force=False):
+    """Pair histograms, the genome-size scatter and GC tracks; returns {figure: "rendered" | "skipped" | "error"}.
 
-    ensure_dir(args.outdir)
+    `pairs` is a list of (prefix, label1, label2) as produced by compare_gene_lengths.py, and
+    `gffs` an optional {label: GFF3} to take those labels' lengths from annotations instead.
+    """
+    ensure_dir(outdir)
 
-    # Define your three comparison pairs and their labels exactly as produced by compare_gene_lengths.py
-    pairs = [
-        # (prefix, label1, label2)
-        ("buchnera_vs_ecoli", "Buchnera", "Ecoli_K12"),
-        ("wigglesworthia_vs_salmonella", "Wigglesworthia", "Salmonella_no75"),
-        ("cpneumoniae_vs_isosphaera", "C_pneumoniae_TW183", "Isosphaera_pallida"),
-    ]
+    gff_for_label = dict(gffs or {})
 
-    # Plot histograms per pair and collect medians
+    # Histograms per pair (rendered below) and medians
+    figure_jobs = []
     label_to_median = {}
     for prefix, lab1, lab2 in pairs:
-        f1 = os.path.join(args.results_dir, f"{prefix}.{lab1}.lengths.tsv")
-        f2 = os.path.join(args.results_dir, f"{prefix}.{lab2}.lengths.tsv")
+        f1 = gff_for_label.get(lab1) or lengths_file(results_dir, prefix, lab1)
+        f2 = gff_for_label.get(lab2) or lengths_file(results_dir, prefix, lab2)
         if not os.path.exists(f1) or not os.path.exists(f2):
             print(f"[WARN] Missing lengths file(s) for pair {prefix}. Skipping histogram.", flush=True)
         else:
-            len1 = load_lengths(f1)
-            len2 = load_lengths(f2)
-            out_png = os.path.join(args.outdir, f"{prefix}.hist.png")
-            plot_pair_hist(len1, len2, lab1, lab2, out_png, bins=args.bins)
-            print(f"[OK] Wrote {out_png}")
+            with stage("lengths.load", pair=prefix) as st:
+                len1 = lengths_from_gff(f1, feature) if lab1 in gff_for_label else load_lengths(f1)
+                len2 = lengths_from_gff(f2, feature) if lab2 in gff_for_label else load_lengths(f2)
+                st["features"] = len(len1) + len(len2)
+            out_png = os.path.join(outdir, f"{prefix}.hist.png")
+            pair_feature = feature if gff_for_label.keys() & {lab1, lab2} else None
+            with stage("hist.bin", pair=prefix, values=len(len1) + len(len2)):
+                figure_jobs.append(pair_hist_job(len1, len2, lab1, lab2, [f1, f2], out_png, bins=bins,
+                                                 feature=pair_feature))
 
             # Save medians
             label_to_median[lab1] = float(len1.median())
             label_to_median[lab2] = float(len2.median())
 
-    # Load genome stats and make scatter
-    if os.path.exists(args.stats):
-        stats_df = pd.read_csv(args.stats, sep="\t")
-        # Expect columns: label, path, genome_size_bp, gc_content_pct
-        if not {"label", "genome_size_bp"}.issubset(stats_df.columns):
-            raise ValueError("genome_stats.tsv must contain columns: label, genome_size_bp")
-        scatter_path = os.path.join(args.outdir, "genome_size_vs_median_gene_length.png")
-        plot_genome_size_vs_median(stats_df, label_to_median, scatter_path)
-        print(f"[OK] Wrote {scatter_path}")
+    # Medians from mergeable length sketches (sketches.py); add genomes or whole clades to the scatter
+    for sk_path in sketches:
+        sk = LengthSketch.load(sk_path)
+        label_to_median[sk.label or os.path.basename(sk_path)] = sk.quantile(0.5)
+
+    # Load genome stats and make scatter; a scatter that cannot be built must not cost the histograms
+    if os.path.exists(stats_path):
+        stats_df = pd.read_csv(stats_path, sep="\t")
+        scatter_path = os.path.join(outdir, "genome_size_vs_median_gene_length.png")
+        try:
+            # Expect columns: label, path, genome_size_bp, gc_content_pct
+            if not {"label", "genome_size_bp"}.issubset(stats_df.columns):
+                raise ValueError("genome_stats.tsv must contain columns: label, genome_size_bp.")
+            figure_jobs.append(size_vs_median_job(stats_df, label_to_median, scatter_path))
+        except ValueError as e:
+            print(f"[WARN] {e} Skipping genome-size scatter.", flush=True)
     else:
-        print(f"[WARN] Stats file not found: {args.stats}. Skipping genome-size scatter.", flush=True)
+        print(f"[WARN] Stats file not found: {stats_path}. Skipping genome-size scatter.", flush=True)
+
+    # GC / GC-skew tracks
+    for track_path in gc_profiles:
+        name = os.path.basename(track_path).rsplit(".", 1)[0]
+        figure_jobs.append(gc_profile_job(track_path, name, os.path.join(outdir, f"{name}.png")))
+
+    # Render out-of-date figures in parallel; unchanged ones are skipped via the manifest
+    with stage("figures.render", figures=len(figure_jobs)):
+        states = render_figures(figure_jobs, workers=jobs, force=force)
+    for path, state in states.items():
+        if state == "rendered":
+            print(f"[OK] Wrote {path}")
+        elif state == "skipped":
+            print(f"[OK] Up to date: {path}")
+    return states
+
+def parse_label_paths(items):
+    """{label: path} from LABEL=PATH strings; ValueError names the first malformed item."""
+    out = {}
+    for item in items:
+        label, sep, path = item.partition("=")
+        if not sep or not label or not path:
+            raise ValueError(f"expected LABEL=PATH, got {item!r}")
+        out[label] = path
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Plot gene length distributions and genome size trends.")
+    ap.add_argument("--results_dir", default="results", help="Directory containing *.lengths.tsv / *.lengths.npy files (default: results)")
+    ap.add_argument("--stats", default="genome_stats.tsv", help="Path to genome_stats.tsv (default: genome_stats.tsv)")
+    ap.add_argument("--outdir", default="figures", help="Directory to write figures (default: figures)")
+    ap.add_argument("--bins", type=int, default=60, help="Number of histogram bins (default: 60)")
+    ap.add_argument("--gffs", nargs="*", default=[], metavar="LABEL=GFF",
+                    help="Take lengths for these labels from their GFF3 (cached binary annotations) instead of *.lengths.tsv")
+    ap.add_argument("--feature", default="CDS", help="Feature type used with --gffs (default: CDS)")
+    ap.add_argument("--sketches", nargs="*", default=[], help="*.sketch.json files whose (label, median) enter the scatter")
+    ap.add_argument("--gc-profile", nargs="*", default=[], help="GC tracks from gc_profile.py (.tsv or .npy) to plot")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes for rendering (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Redraw every figure even if the manifest says it is up to date")
+    add_profile_argument(ap)
+    args = ap.parse_args()
+    try:
+        gffs = parse_label_paths(args.gffs)
+    except ValueError as e:
+        ap.error(f"--gffs: {e}")
+    setup_profiling(args)
+
+    plot_all(DEFAULT_PAIRS, results_dir=args.results_dir, stats_path=args.stats, outdir=args.outdir, bins=args.bins,
+             gffs=gffs, feature=args.feature, sketches=args.sketches,
+             gc_profiles=args.gc_profile, jobs=args.jobs, force=args.force)
 
 if __name__ == "__main__":
     main()
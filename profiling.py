@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+Opt-in per-stage instrumentation shared by the analysis scripts.
+
+Stages are wrapped in `with stage("name", key=value) as st:`; the body may add item counts
+(st["bases"] = ..., st["cells"] = ...). When profiling is off a stage costs one function call.
+When it is on (a script's --profile flag, or BIOPROJECT_PROFILE=<path> in the environment) every
+stage appends one JSON line to that file with wall time, CPU time, peak traced memory
+(tracemalloc) and its counts:
+
+  {"run": "...", "script": "compare_gene_losses.py", "pid": 123, "stage": "align.fill",
+   "parent": "compare_pair", "wall_s": 0.41, "cpu_s": 0.40, "peak_traced_mb": 61.2, "cells": 1165520}
+
+The variable is inherited by worker processes, so pool workers report into the same file, and
+BIOPROJECT_PROFILE_RUN ties the lines of one run together. Tracing memory slows allocation-heavy
+Python code; compare wall times only between runs that were both profiled.
+
+  python profiling.py profile.jsonl        # per-stage totals across all recorded runs
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+ENV_VAR = "BIOPROJECT_PROFILE"
+RUN_VAR = "BIOPROJECT_PROFILE_RUN"
+DEFAULT_PATH = "profile.jsonl"
+
+_sink = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(path: str = DEFAULT_PATH):
+    """Start recording stages to `path` ("-" for stderr), here and in child processes."""
+    global _sink
+    _sink = path
+    os.environ[ENV_VAR] = path
+    os.environ.setdefault(RUN_VAR, uuid.uuid4().hex[:12])
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def add_argument(parser):
+    """The shared --profile [PATH] option."""
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_PATH, default=None, metavar="PATH",
+                        help=f"Append per-stage timing/memory JSON lines to PATH (default: {DEFAULT_PATH}; "
+                             f"or set {ENV_VAR})")
+
+
+def setup(args=None):
+    """Enable profiling from a parsed --profile option; the environment variable also works."""
+    path = getattr(args, "profile", None) or os.environ.get(ENV_VAR)
+    if path and not enabled():
+        enable(path)
+
+
+def _emit(record):
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _sink == "-":
+            sys.stderr.write(line)
+        else:
+            with open(_sink, "a", encoding="utf-8") as out:
+                out.write(line)
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """Time one stage; yields a dict for item counts and other fields to report."""
+    if _sink is None:
+        yield fields
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        peak_before = tracemalloc.get_traced_memory()[1]
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak_before)
+        tracemalloc.reset_peak()
+    frame = {"name": name, "peak": 0}
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield fields
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stack.pop()
+        peak = max(frame["peak"], tracemalloc.get_traced_memory()[1]) if tracing else None
+        if stack and peak is not None:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        _emit({"run": os.environ.get(RUN_VAR), "script": os.path.basename(sys.argv[0]), "pid": os.getpid(),
+               "stage": name, "parent": stack[-1]["name"] if stack else None,
+               "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+               "peak_traced_mb": round(peak / 2**20, 3) if peak is not None else None, **fields})
+
+
+# Worker processes inherit the environment variable and start recording on import
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
+
+
+# ---------- Aggregation ----------
+_STANDARD = {"run", "script", "pid", "stage", "parent", "wall_s", "cpu_s", "peak_traced_mb"}
+
+
+def summarize(path: str, run: str | None = None) -> dict:
+    """{stage: count, wall/cpu totals, max peak and summed numeric item counts} over a JSON-lines file."""
+    out = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if run and r.get("run") != run:
+                continue
+            s = out.setdefault(r["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_traced_mb": 0.0, "items": {}})
+            s["count"] += 1
+            s["wall_s"] += r.get("wall_s") or 0.0
+            s["cpu_s"] += r.get("cpu_s") or 0.0
+            s["peak_traced_mb"] = max(s["peak_traced_mb"], r.get("peak_traced_mb") or 0.0)
+            for k, v in r.items():
+                if k not in _STANDARD and isinstance(v, (int, float)) and not isinstance(v, bool):
+                    s["items"][k] = s["items"].get(k, 0) + v
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Aggregate per-stage profile JSON lines.")
+    ap.add_argument("path", nargs="?", default=DEFAULT_PATH, help=f"Profile file (default: {DEFAULT_PATH})")
+    ap.add_argument("--run", default=None, help="Only lines from this run id")
+    args = ap.parse_args()
+
+    rows = sorted(summarize(args.path, args.run).items(), key=lambda kv: -kv[1]["wall_s"])
+    print(f"{'stage':<28} {'count':>6} {'wall_s':>10} {'cpu_s':>10} {'peak_MB':>9}  items (per second of wall)")
+    for name, s in rows:
+        items = ", ".join(f"{k}={v:,.0f} ({v / s['wall_s']:,.0f}/s)" if s["wall_s"] else f"{k}={v:,.0f}"
+                          for k, v in s["items"].items())
+        print(f"{name:<28} {s['count']:>6} {s['wall_s']:>10.4f} {s['cpu_s']:>10.4f} {s['peak_traced_mb']:>9.1f}  {items}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+rank_tests.py
+NumPy ranking engine behind compare_gene_lengths.mann_whitney_u / wilcoxon_signed_rank, plus
+exact and resampling p-values, effect sizes and bootstrap confidence intervals.
+
+  rankdata                 average ranks (ties share the mean rank) via one argsort
+  mann_whitney_exact_p     exact two-sided p from the permutation distribution of the rank sum
+  wilcoxon_exact_p         exact two-sided p from the sign-flip distribution of W+
+  permutation_p            Monte-Carlo p-value, resamples drawn in chunks across processes
+  bootstrap_median_diff    percentile CI for the median difference (or median paired difference)
+  effect_sizes             common-language / rank-biserial effect sizes and Hodges-Lehmann shift
+
+Exact distributions are counted over doubled ranks, so tied (half-integer) ranks are handled
+exactly; they are only attempted up to EXACT_MAX_N observations.
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+EXACT_MAX_N = 100
+HL_MAX_PAIRS = 20_000_000
+
+
+# ---------- Ranking ----------
+def rankdata(values):
+    """Average ranks (1-based) of `values` and the size of every tie group."""
+    a = np.asarray(values, dtype=float)
+    order = np.argsort(a, kind="mergesort")
+    srt = a[order]
+    starts = np.flatnonzero(np.concatenate(([True], srt[1:] != srt[:-1])))
+    counts = np.diff(np.append(starts, len(a)))
+    avg = starts + (counts + 1) / 2.0
+    ranks = np.empty(len(a))
+    ranks[order] = np.repeat(avg, counts)
+    return ranks, counts
+
+
+def tie_term(counts):
+    """sum(t^3 - t) over tie groups, as used in the normal-approximation variances."""
+    c = np.asarray(counts, dtype=np.int64)
+    return int((c ** 3 - c).sum())
+
+
+def signed_ranks(x, y):
+    """Ranks of |x - y| over non-zero differences, their signs (+1/-1) and tie-group sizes."""
+    d = np.asarray(x, dtype=float) - np.asarray(y, dtype=float)
+    d = d[d != 0]
+    ranks, counts = rankdata(np.abs(d))
+    return ranks, np.sign(d), counts
+
+
+# ---------- Exact p-values ----------
+def _two_sided(dist, observed2, mean2):
+    """P(|S - mean| >= |observed - mean|) for a distribution over doubled sums."""
+    support = np.arange(len(dist))
+    extreme = np.abs(support - mean2) >= abs(observed2 - mean2) - 1e-9
+    return float(min(1.0, dist[extreme].sum()))
+
+
+def mann_whitney_exact_p(x, y):
+    """Exact two-sided p for Mann-Whitney U (None if there are more than EXACT_MAX_N values)."""
+    n1, n2 = len(x), len(y)
+    N = n1 + n2
+    if N > EXACT_MAX_N or n1 == 0 or n2 == 0:
+        return None
+    ranks, _ = rankdata(np.concatenate([np.asarray(x, float), np.asarray(y, float)]))
+    r2 = np.rint(2 * ranks).astype(np.int64)
+    total = int(r2.sum())
+    # dp[k, s]: number of size-k subsets whose doubled rank sum is s (kept as probabilities)
+    dp = np.zeros((n1 + 1, total + 1))
+    dp[0, 0] = 1.0
+    for i, r in enumerate(r2, 1):
+        for k in range(min(i, n1), 0, -1):
+            dp[k, r:] += dp[k - 1, :-r] if r else dp[k - 1]
+    dist = dp[n1] / math.comb(N, n1)
+    return _two_sided(dist, int(r2[:n1].sum()), n1 * (N + 1))
+
+
+def wilcoxon_exact_p(x, y):
+    """Exact two-sided p for the Wilcoxon signed-rank test (None above EXACT_MAX_N non-zero pairs)."""
+    ranks, signs, _ = signed_ranks(x, y)
+    n = len(ranks)
+    if n == 0:
+        return 1.0
+    if n > EXACT_MAX_N:
+        return None
+    r2 = np.rint(2 * ranks).astype(np.int64)
+    total = int(r2.sum())
+    dist = np.zeros(total + 1)
+    dist[0] = 1.0
+    for r in r2:
+        dist[r:] = dist[r:] + dist[:total + 1 - r]
+    dist /= 2.0 ** n
+    return _two_sided(dist, int(r2[signs > 0].sum()), total / 2.0)
+
+
+# ---------- Resampling ----------
+def _chunk_sizes(n, chunk):
+    return [min(chunk, n - i) for i in range(0, n, chunk)]
+
+
+def _run_chunks(worker, args, n_resamples, chunk, seed, jobs):
+    """Run worker(*args, size, seed_sequence) over chunks; results in chunk order."""
+    sizes = _chunk_sizes(n_resamples, chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if jobs == 1 or len(sizes) == 1:
+        return [worker(*args, size, ss) for size, ss in zip(sizes, seeds)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(worker, *args, size, ss) for size, ss in zip(sizes, seeds)]
+        return [f.result() for f in futures]
+
+
+def _perm_chunk_unpaired(ranks, n1, observed_dev, size, ss):
+    rng = np.random.default_rng(ss)
+    mean = n1 * (len(ranks) + 1) / 2.0
+    pick = np.argsort(rng.random((size, len(ranks))), axis=1)[:, :n1]
+    sums = ranks[pick].sum(axis=1)
+    return int((np.abs(sums - mean) >= observed_dev - 1e-9).sum())
+
+
+def _perm_chunk_paired(ranks, observed_dev, size, ss):
+    rng = np.random.default_rng(ss)
+    mean = ranks.sum() / 2.0
+    flips = rng.integers(0, 2, size=(size, len(ranks)), dtype=np.int8)
+    wpos = flips @ ranks
+    return int((np.abs(wpos - mean) >= observed_dev - 1e-9).sum())
+
+
+def permutation_p(x, y, paired=False, n_resamples=10000, seed=None, jobs=None, chunk=1000):
+    """Monte-Carlo two-sided p-value, (extreme + 1) / (n_resamples + 1).
+
+    Unpaired: group labels are permuted and the rank sum of x recomputed. Paired: signs of the
+    ranked differences are flipped at random. Chunks of `chunk` resamples run in a process pool.
+    """
+    if paired:
+        ranks, signs, _ = signed_ranks(x, y)
+        if len(ranks) == 0:
+            return 1.0
+        observed_dev = abs(ranks[signs > 0].sum() - ranks.sum() / 2.0)
+        counts = _run_chunks(_perm_chunk_paired, (ranks, observed_dev), n_resamples, chunk, seed, jobs)
+    else:
+        n1 = len(x)
+        ranks, _ = rankdata(np.concatenate([np.asarray(x, float), np.asarray(y, float)]))
+        observed_dev = abs(ranks[:n1].sum() - n1 * (len(ranks) + 1) / 2.0)
+        counts = _run_chunks(_perm_chunk_unpaired, (ranks, n1, observed_dev), n_resamples, chunk, seed, jobs)
+    return (sum(counts) + 1) / (n_resamples + 1)
+
+
+def _boot_chunk(x, y, paired, size, ss):
+    rng = np.random.default_rng(ss)
+    if paired:
+        d = x - y
+        return np.median(d[rng.integers(0, len(d), size=(size, len(d)))], axis=1)
+    mx = np.median(x[rng.integers(0, len(x), size=(size, len(x)))], axis=1)
+    my = np.median(y[rng.integers(0, len(y), size=(size, len(y)))], axis=1)
+    return mx - my
+
+
+def bootstrap_median_diff(x, y, paired=False, n_resamples=2000, alpha=0.05, seed=None, jobs=None, chunk=500):
+    """Median difference (x - y, or median of paired differences) with a percentile bootstrap CI."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) == 0 or len(y) == 0:
+        return float("nan"), float("nan"), float("nan")
+    estimate = float(np.median(x - y) if paired else np.median(x) - np.median(y))
+    boots = np.concatenate(_run_chunks(_boot_chunk, (x, y, paired), n_resamples, chunk, seed, jobs))
+    lo, hi = np.quantile(boots, [alpha / 2, 1 - alpha / 2])
+    return estimate, float(lo), float(hi)
+
+
+# ---------- Effect sizes ----------
+def hodges_lehmann(x, y, seed=None):
+    """Median of all pairwise differences x_i - y_j (a random HL_MAX_PAIRS of them for huge inputs)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) == 0 or len(y) == 0:
+        return float("nan")
+    if len(x) * len(y) <= HL_MAX_PAIRS:
+        return float(np.median(np.subtract.outer(x, y)))
+    rng = np.random.default_rng(seed)
+    return float(np.median(x[rng.integers(0, len(x), HL_MAX_PAIRS)] - y[rng.integers(0, len(y), HL_MAX_PAIRS)]))
+
+
+def effect_sizes(x, y, paired=False):
+    """Unpaired: common-language effect P(X > Y) + 0.5 P(X = Y), rank-biserial r and the
+    Hodges-Lehmann shift. Paired: matched-pairs rank-biserial r and the median difference."""
+    if paired:
+        ranks, signs, _ = signed_ranks(x, y)
+        total = ranks.sum()
+        r = float((ranks[signs > 0].sum() - ranks[signs < 0].sum()) / total) if total else 0.0
+        d = np.asarray(x, dtype=float) - np.asarray(y, dtype=float)
+        return {"rank_biserial": r, "median_diff": float(np.median(d)) if len(d) else float("nan")}
+    n1, n2 = len(x), len(y)
+    if n1 == 0 or n2 == 0:
+        return {"common_language": float("nan"), "rank_biserial": float("nan"), "hodges_lehmann": float("nan")}
+    ranks, _ = rankdata(np.concatenate([np.asarray(x, float), np.asarray(y, float)]))
+    U1 = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    cl = float(U1 / (n1 * n2))
+    return {"common_language": cl, "rank_biserial": 2 * cl - 1, "hodges_lehmann": hodges_lehmann(x, y)}
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+scan_gene_losses.py
+Genome-scale version of compare_gene_losses.py: every CDS of a symbiont against its counterpart
+in a free-living relative, one row per gene pair in a single TSV.
+
+Usage:
+  python scan_gene_losses.py \
+      --sym-fasta wigglesworthia_g_sequence.fasta --sym-gff Wigglesworthia_glossinidia.gff3 \
+      --free-fasta salmonella.fasta --free-gff Salmonella_enterica_no75.gff3 \
+      --out wig_vs_sal.losses.tsv --jobs 4
+
+CDSs are cut from the genomes through fasta_index.py and translated (table 11). Genes are paired
+by their gene= name where the name is unique in both genomes; the remaining proteins are paired
+by reciprocal best amino-acid k-mer Jaccard similarity (at least --min-jaccard, lengths within
+--min-length-ratio), falling back to a protein's next-best hit when its best one is taken. Each pair is aligned and scored as in
+compare_gene_losses.py in a process pool, and rows are appended to --out as they finish.
+
+The output doubles as the checkpoint: an interrupted run started again with the same inputs and
+settings (recorded in <out>.checkpoint.json) skips every pair already in the table and retries
+failed ones. When all pairs are done the table is rewritten in symbiont gene order.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from compare_gene_losses import ENGINES, _align_pair
+from compute_genome_stats import _file_key
+from fasta_index import IndexedFasta, cds_sequence, read_cds_features, translate
+from profiling import add_argument as add_profile_argument, setup as setup_profiling, stage
+
+CHECKPOINT_VERSION = 2  # 2: reciprocal-best, length-bounded k-mer pairing
+DEFAULT_MIN_JACCARD = 0.15       # 3-mer Jaccard of unrelated proteins reaches ~0.1 (short ones more)
+DEFAULT_MIN_LENGTH_RATIO = 0.7   # shorter / longer protein of a fallback pair
+COLUMNS = ("sym_id", "sym_gene", "sym_locus_tag", "free_id", "free_gene", "free_locus_tag", "paired_by",
+           "kmer_jaccard", "sym_len", "free_len", "identity", "total_loss", "loss_frac", "n_segments",
+           "n_insertions", "inserted", "n_substitution_runs", "substitutions", "losses", "status", "error")
+
+
+# ---------- Proteomes ----------
+def load_proteome(fasta_path: str, gff_path: str) -> list[dict]:
+    """Translated CDSs of one genome in GFF order: id, gene, locus_tag and protein sequence."""
+    with stage("cds.extract", gff=gff_path) as st:
+        proteins = []
+        with IndexedFasta(fasta_path) as fa:
+            for feat in read_cds_features(gff_path):
+                if feat["seqid"] not in fa:
+                    continue
+                protein = translate(cds_sequence(fa, feat).decode("ascii"))
+                if protein:
+                    proteins.append({"id": feat["id"], "gene": feat["gene"], "locus_tag": feat["locus_tag"],
+                                     "protein": protein})
+        st["proteins"] = len(proteins)
+        st["residues"] = sum(len(p["protein"]) for p in proteins)
+    return proteins
+
+
+# ---------- Pairing ----------
+_AA_CODES = np.full(256, 31, dtype=np.int64)
+_AA_CODES[np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)] = np.arange(20)
+
+
+def kmer_set(protein: str, k: int = 3) -> np.ndarray:
+    """Sorted distinct k-mers of a protein as integers (5 bits per residue)."""
+    codes = _AA_CODES[np.frombuffer(protein.encode("ascii", "replace"), dtype=np.uint8)]
+    if len(codes) < k:
+        return np.empty(0, dtype=np.int64)
+    kmers = np.zeros(len(codes) - k + 1, dtype=np.int64)
+    for i in range(k):
+        kmers = (kmers << 5) | codes[i:len(codes) - k + 1 + i]
+    return np.unique(kmers)
+
+
+def kmer_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    inter = len(np.intersect1d(a, b, assume_unique=True))
+    union = len(a) + len(b) - inter
+    return inter / union if union else 0.0
+
+
+def pair_by_name(sym: list[dict], free: list[dict]) -> list[tuple[int, int]]:
+    """(sym index, free index) for gene names (case-insensitive) that occur once in each genome."""
+    def unique_names(proteins):
+        seen = {}
+        for i, p in enumerate(proteins):
+            name = p["gene"].lower()
+            if name:
+                seen[name] = -1 if name in seen else i
+        return {name: i for name, i in seen.items() if i >= 0}
+
+    sym_names, free_names = unique_names(sym), unique_names(free)
+    return sorted((i, free_names[name]) for name, i in sym_names.items() if name in free_names)
+
+
+def pair_by_kmers(sym_sets: dict, free_sets: dict, sym_lengths: dict, free_lengths: dict,
+                  min_jaccard: float = DEFAULT_MIN_JACCARD,
+                  min_length_ratio: float = DEFAULT_MIN_LENGTH_RATIO) -> list[tuple[int, int, float]]:
+    """One-to-one pairing of {index: k-mer set} by reciprocal best k-mer Jaccard similarity.
+
+    Every symbiont protein keeps a ranked list of the free-living proteins that reach min_jaccard
+    and whose length is within min_length_ratio of its own (shorter / longer). The lists are merged
+    and taken in descending Jaccard order, skipping proteins already paired, so a pair is accepted
+    only when each protein is the other's best remaining hit, and a symbiont protein whose best hit
+    went to another falls back to its next one.
+
+    Shared k-mer counts against every free-living protein come from one sorted (k-mer, protein)
+    index: each symbiont k-mer selects a range of it and np.bincount tallies the proteins.
+    """
+    free_ids = np.array(sorted(free_sets), dtype=np.int64)
+    if not len(free_ids) or not sym_sets:
+        return []
+    sizes = np.array([len(free_sets[j]) for j in free_ids], dtype=np.int64)
+    free_len = np.array([free_lengths[j] for j in free_ids], dtype=float)
+    all_kmers = np.concatenate([free_sets[j] for j in free_ids])
+    owner = np.repeat(np.arange(len(free_ids)), sizes)
+    order = np.argsort(all_kmers, kind="stable")
+    all_kmers, owner = all_kmers[order], owner[order]
+
+    candidates = []
+    for i, kmers in sym_sets.items():
+        lo = np.searchsorted(all_kmers, kmers, side="left")
+        hi = np.searchsorted(all_kmers, kmers, side="right")
+        n = hi - lo
+        if not n.sum():
+            continue
+        hits = np.repeat(lo - np.concatenate(([0], np.cumsum(n)[:-1])), n) + np.arange(n.sum())
+        inter = np.bincount(owner[hits], minlength=len(free_ids))
+        jac = inter / (len(kmers) + sizes - inter)
+        ratio = np.minimum(free_len, sym_lengths[i]) / np.maximum(np.maximum(free_len, sym_lengths[i]), 1)
+        ranked = np.flatnonzero((jac >= min_jaccard) & (ratio >= min_length_ratio))
+        candidates += [(float(jac[b]), i, int(free_ids[b])) for b in ranked]
+
+    pairs, used_sym, used_free = [], set(), set()
+    for jac, i, j in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        if i not in used_sym and j not in used_free:
+            used_sym.add(i)
+            used_free.add(j)
+            pairs.append((i, j, jac))
+    return sorted(pairs)
+
+
+def pair_proteomes(sym: list[dict], free: list[dict], k: int = 3, min_jaccard: float = DEFAULT_MIN_JACCARD,
+                   min_length_ratio: float = DEFAULT_MIN_LENGTH_RATIO) -> list[dict]:
+    """Ortholog pairs in symbiont order: {"sym", "free", "paired_by", "kmer_jaccard"}."""
+    with stage("pairs.name") as st:
+        named = pair_by_name(sym, free)
+        st["pairs"] = len(named)
+    with stage("pairs.kmer") as st:
+        sets_sym = {i: kmer_set(p["protein"], k) for i, p in enumerate(sym)}
+        sets_free = {j: kmer_set(p["protein"], k) for j, p in enumerate(free)}
+        done_sym, done_free = {i for i, _ in named}, {j for _, j in named}
+        fallback = pair_by_kmers({i: s for i, s in sets_sym.items() if i not in done_sym},
+                                 {j: s for j, s in sets_free.items() if j not in done_free},
+                                 {i: len(p["protein"]) for i, p in enumerate(sym)},
+                                 {j: len(p["protein"]) for j, p in enumerate(free)}, min_jaccard, min_length_ratio)
+        st["pairs"] = len(fallback)
+    pairs = [{"sym": i, "free": j, "paired_by": "name", "kmer_jaccard": kmer_jaccard(sets_sym[i], sets_free[j])}
+             for i, j in named]
+    pairs += [{"sym": i, "free": j, "paired_by": "kmer", "kmer_jaccard": jac} for i, j, jac in fallback]
+    return sorted(pairs, key=lambda p: p["sym"])
+
+
+# ---------- Alignment workers ----------
+def _pair_key(sym_id: str, free_id: str) -> str:
+    return f"{sym_id}\t{free_id}"
+
+
+def score_pair(task: dict) -> dict:
+    """Align one protein pair and return its table row (status "error" if it fails)."""
+    row = {c: "" for c in COLUMNS}
+    row.update({k: task[k] for k in ("sym_id", "sym_gene", "sym_locus_tag", "free_id", "free_gene",
+                                     "free_locus_tag", "paired_by")})
+    row["kmer_jaccard"] = f"{task['kmer_jaccard']:.4f}"
+    try:
+        aln = _align_pair(task["sym_protein"], task["free_protein"], task["engine"], task["max_matrix_mb"], {},
+                          verbose=False)
+        m, aln_losses = aln.metrics(), aln.losses()
+    except Exception as e:  # one bad pair must not stop the scan
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+        return row
+    row.update({k: m[k] for k in ("sym_len", "free_len", "total_loss", "n_segments", "n_insertions", "inserted",
+                                  "n_substitution_runs", "substitutions")})
+    row.update(identity=f"{m['identity']:.4f}", loss_frac=f"{m['loss_frac']:.4f}", status="ok",
+               losses=";".join(f"{s}-{e}" for s, e in aln_losses))
+    return row
+
+
+# ---------- Checkpointed scan ----------
+def checkpoint_path(out_path: str) -> str:
+    return out_path + ".checkpoint.json"
+
+
+def read_rows(out_path: str) -> list[dict]:
+    """Complete rows of an existing output table; a torn last line (no newline) is ignored."""
+    rows = []
+    try:
+        with open(out_path, "r", encoding="utf-8") as f:
+            header = f.readline().rstrip("\n").split("\t")
+            if tuple(header) != COLUMNS:
+                return []
+            for line in f:
+                if line.endswith("\n"):
+                    rows.append(dict(zip(COLUMNS, line.rstrip("\n").split("\t"))))
+    except FileNotFoundError:
+        pass
+    return rows
+
+
+def _format_row(row: dict) -> str:
+    return "\t".join(str(row[c]).replace("\t", " ").replace("\n", " ") for c in COLUMNS) + "\n"
+
+
+def write_rows(out_path: str, rows: list[dict]):
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        out.write("\t".join(COLUMNS) + "\n")
+        for row in rows:
+            out.write(_format_row(row))
+    os.replace(tmp, out_path)
+
+
+def save_checkpoint(out_path: str, fingerprint: dict, complete: bool):
+    tmp = checkpoint_path(out_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump(dict(fingerprint, complete=complete), out, indent=2)
+    os.replace(tmp, checkpoint_path(out_path))
+
+
+def scan(sym_fasta: str, sym_gff: str, free_fasta: str, free_gff: str, out_path: str, jobs: int | None = None,
+         engine: str = "vectorized", max_matrix_mb: float = 1024, k: int = 3,
+         min_jaccard: float = DEFAULT_MIN_JACCARD, min_length_ratio: float = DEFAULT_MIN_LENGTH_RATIO,
+         restart: bool = False) -> list[dict]:
+    """Pair and score every CDS of the two genomes, appending rows to out_path as they finish.
+
+    Resumes from an existing out_path when <out>.checkpoint.json matches the inputs (size, mtime)
+    and settings; raises ValueError when it does not, unless restart=True. Returns all rows.
+    """
+    fingerprint = {"version": CHECKPOINT_VERSION,
+                   "inputs": {os.path.abspath(p): _file_key(p) for p in (sym_fasta, sym_gff, free_fasta, free_gff)},
+                   "params": {"engine": engine, "max_matrix_mb": max_matrix_mb, "k": k, "min_jaccard": min_jaccard,
+                              "min_length_ratio": min_length_ratio}}
+    done = {}
+    if os.path.exists(out_path) and not restart:
+        try:
+            with open(checkpoint_path(out_path), "r", encoding="utf-8") as f:
+                ck = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            ck = None
+        if ck is None or {k_: ck.get(k_) for k_ in fingerprint} != fingerprint:
+            raise ValueError(f"{out_path} was written from other inputs or settings; use --restart to start over")
+        rows = read_rows(out_path)
+        if ck.get("complete"):
+            print(f"[OK] Up to date: {out_path} ({len(rows)} pairs)")
+            return rows
+        done = {_pair_key(r["sym_id"], r["free_id"]): r for r in rows if r["status"] == "ok"}
+        print(f"[resume] {len(done)} pairs already scored in {out_path}")
+    write_rows(out_path, list(done.values()))
+    save_checkpoint(out_path, fingerprint, complete=False)
+
+    sym, free = load_proteome(sym_fasta, sym_gff), load_proteome(free_fasta, free_gff)
+    pairs = pair_proteomes(sym, free, k=k, min_jaccard=min_jaccard, min_length_ratio=min_length_ratio)
+    order = {_pair_key(sym[p["sym"]]["id"], free[p["free"]]["id"]): n for n, p in enumerate(pairs)}
+    tasks = []
+    for p in pairs:
+        s, f = sym[p["sym"]], free[p["free"]]
+        if _pair_key(s["id"], f["id"]) in done:
+            continue
+        tasks.append({"sym_id": s["id"], "sym_gene": s["gene"], "sym_locus_tag": s["locus_tag"],
+                      "free_id": f["id"], "free_gene": f["gene"], "free_locus_tag": f["locus_tag"],
+                      "paired_by": p["paired_by"], "kmer_jaccard": p["kmer_jaccard"],
+                      "sym_protein": s["protein"], "free_protein": f["protein"],
+                      "engine": engine, "max_matrix_mb": max_matrix_mb})
+    print(f"[pairs] {sum(p['paired_by'] == 'name' for p in pairs)} by gene name, "
+          f"{sum(p['paired_by'] == 'kmer' for p in pairs)} by {k}-mer similarity, "
+          f"{len(sym) - len(pairs)} symbiont CDSs unpaired; {len(tasks)} to align")
+
+    rows = dict(done)
+    with stage("scan.align", pairs=len(tasks)), open(out_path, "a", encoding="utf-8") as out:
+        def record(row):
+            rows[_pair_key(row["sym_id"], row["free_id"])] = row
+            out.write(_format_row(row))
+            out.flush()
+
+        if jobs == 1 or len(tasks) <= 1:
+            for task in tasks:
+                record(score_pair(task))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(score_pair, task) for task in tasks]
+                try:
+                    for fut in as_completed(futures):
+                        record(fut.result())
+                except KeyboardInterrupt:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+    rows = sorted(rows.values(), key=lambda r: order.get(_pair_key(r["sym_id"], r["free_id"]), len(order)))
+    write_rows(out_path, rows)
+    save_checkpoint(out_path, fingerprint, complete=all(r["status"] == "ok" for r in rows))
+    return rows
+
+
+# ---------- CLI ----------
+def main():
+    ap = argparse.ArgumentParser(description="Scan every shared gene of a symbiont and a free-living relative for losses.")
+    ap.add_argument("--sym-fasta", required=True, help="Symbiont genome FASTA")
+    ap.add_argument("--sym-gff", required=True, help="Symbiont GFF3 (CDS features)")
+    ap.add_argument("--free-fasta", required=True, help="Free-living genome FASTA")
+    ap.add_argument("--free-gff", required=True, help="Free-living GFF3 (CDS features)")
+    ap.add_argument("--out", default="gene_loss_scan.tsv", help="Output table, also the resume checkpoint (default: gene_loss_scan.tsv)")
+    ap.add_argument("--jobs", type=int, default=None, help="Worker processes for alignments (default: CPU count)")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="vectorized", help="Alignment engine (default: vectorized)")
+    ap.add_argument("--max-matrix-mb", type=float, default=1024,
+                    help="Switch to the linear-space engine when the full DP matrices would exceed this (default: 1024)")
+    ap.add_argument("--kmer", type=int, default=3, help="Amino-acid k-mer size for pairing genes without a shared name (default: 3)")
+    ap.add_argument("--min-jaccard", type=float, default=DEFAULT_MIN_JACCARD,
+                    help=f"Minimum k-mer Jaccard similarity for a fallback pair (default: {DEFAULT_MIN_JACCARD})")
+    ap.add_argument("--min-length-ratio", type=float, default=DEFAULT_MIN_LENGTH_RATIO,
+                    help=f"Minimum shorter/longer protein length ratio for a fallback pair (default: {DEFAULT_MIN_LENGTH_RATIO})")
+    ap.add_argument("--restart", action="store_true", help="Ignore an existing --out table and start from scratch")
+    add_profile_argument(ap)
+    args = ap.parse_args()
+    setup_profiling(args)
+    if not 1 <= args.kmer <= 12:
+        ap.error("--kmer must be between 1 and 12")
+
+    try:
+        rows = scan(args.sym_fasta, args.sym_gff, args.free_fasta, args.free_gff, args.out, jobs=args.jobs,
+                    engine=args.engine, max_matrix_mb=args.max_matrix_mb, k=args.kmer,
+                    min_jaccard=args.min_jaccard, min_length_ratio=args.min_length_ratio, restart=args.restart)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+    except KeyboardInterrupt:
+        print(f"\n[WARN] Interrupted; finished pairs are kept in {args.out}. Rerun the same command to resume.",
+              file=sys.stderr)
+        sys.exit(130)
+
+    ok = [r for r in rows if r["status"] == "ok"]
+    fracs = np.array([float(r["loss_frac"]) for r in ok])
+    print(f"[saved] {args.out} ({len(ok)}/{len(rows)} pairs ok)")
+    if len(ok):
+        print(f"       median identity≈{np.median([float(r['identity']) for r in ok]):.4f}, "
+              f"median loss fraction {np.median(fracs):.2%}, {int((fracs > 0).sum())} genes with losses")
+    if len(ok) < len(rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
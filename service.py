@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+service.py
+Local HTTP service that keeps parsed annotations and indexed genomes in memory and answers
+length, GC and gene-loss queries without re-reading files or re-importing the stack.
+
+Genomes and gene pairs come from the same JSON config as pipeline.py. At startup every GFF3 is
+loaded into a GFFTable (from the binary .gffcache when fresh) and every FASTA is opened as an
+IndexedFasta; requests are then served by a pool of worker threads, and results are kept in an
+LRU cache keyed by endpoint and parameters (concurrent identical requests share one computation).
+
+Usage:
+  python service.py --config pipeline.example.json --port 8765 --workers 8
+  curl 'http://127.0.0.1:8765/compare?genome1=Buchnera&genome2=Ecoli_K12'
+
+Endpoints (GET, JSON responses; NaN/inf become null; errors are {"error": ...} with status 400 for
+bad parameters, 404 for unknown endpoints, genomes, genes or pairs, 500 otherwise):
+  /genomes                                    loaded genomes and gene pairs
+  /lengths?genome=X[&feature=CDS][&values=1]  n/mean/median/IQR of feature lengths (optionally all values)
+  /compare?genome1=X&genome2=Y[&feature=CDS]  summaries, Mann-Whitney U and Wilcoxon over shared IDs
+  /gc?genome=X[&window=5000&step=1000]        genome size and GC%, per record; with window, GC-skew extremes
+  /losses?pair=gltJ[&engine=vectorized]       gene pair from the config (by "out" or "gene")
+  /losses?gene=carB&sym_genome=X&free_genome=Y  CDS of `gene` cut from two resident genomes, translated
+  /stats                                      startup time, cold (miss) / warm (hit) latency, cache use
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from compare_gene_lengths import extract_lengths_from_gff, mann_whitney_u, summarize, wilcoxon_signed_rank
+from compare_gene_losses import ENGINES, align_pair, read_fasta
+from compute_genome_stats import _record_stats
+from fasta_index import IndexedFasta, cds_sequence, read_cds_features, select_features, translate
+from gc_profile import gc_skew_profile
+from gff_table import GFFTable
+from pipeline import load_config
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache of request results."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, count: bool = True):
+        """(found, value); count=False leaves the hit/miss statistics untouched."""
+        with self._lock:
+            found = key in self._data
+            if count:
+                if found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if found:
+                self._data.move_to_end(key)
+                return True, self._data[key]
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class LatencyStats:
+    """Per-endpoint request counts and latencies, split into cold (computed) and warm (cached)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint: str, kind: str, seconds: float):
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {}).setdefault(kind, {"n": 0, "total": 0.0, "max": 0.0, "first": None})
+            s["n"] += 1
+            s["total"] += seconds
+            s["max"] = max(s["max"], seconds)
+            if s["first"] is None:
+                s["first"] = seconds
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {ep: {kind: {"requests": s["n"], "mean_ms": 1000 * s["total"] / s["n"],
+                                "max_ms": 1000 * s["max"], "first_ms": 1000 * s["first"]}
+                         for kind, s in kinds.items()}
+                    for ep, kinds in self._stats.items()}
+
+
+class AnalysisService:
+    """Resident genomes plus the request handlers; `handle` is safe to call from many threads."""
+
+    def __init__(self, cfg: dict, cache_size: int = 256):
+        t0 = time.perf_counter()
+        self.genomes = cfg["genomes"]
+        self.gene_pairs = cfg["gene_pairs"]
+        self.tables, self.fastas, self.load_seconds = {}, {}, {}
+        for label, g in self.genomes.items():
+            t = time.perf_counter()
+            if g.get("gff"):
+                self.tables[label] = GFFTable.cached(g["gff"])
+            if g.get("fasta"):
+                self.fastas[label] = IndexedFasta(g["fasta"])
+            self.load_seconds[label] = time.perf_counter() - t
+        self._cds = {}
+        self._cds_lock = threading.Lock()
+        self.cache = LRUCache(cache_size)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.latency = LatencyStats()
+        self.started = time.time()
+        self.startup_seconds = time.perf_counter() - t0
+        self.handlers = {"genomes": self.genomes_info, "lengths": self.lengths, "compare": self.compare,
+                         "gc": self.gc, "losses": self.losses}
+
+    def close(self):
+        for fa in self.fastas.values():
+            fa.close()
+
+    # ----- dispatch -----
+    def handle(self, endpoint: str, params: dict) -> tuple[int, dict]:
+        t = time.perf_counter()
+        if endpoint == "stats":
+            return 200, self.stats()
+        if endpoint not in self.handlers:
+            return 404, {"error": f"unknown endpoint /{endpoint}; try /genomes or /stats"}
+        key = (endpoint, tuple(sorted(params.items())))
+        try:
+            found, body = self._cached(key, lambda: self.handlers[endpoint](**params))
+        except KeyError as e:  # unknown genome, gene or pair
+            return 404, {"error": e.args[0] if e.args else "not found"}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        except Exception as e:  # report, keep serving
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        self.latency.record(endpoint, "warm" if found else "cold", time.perf_counter() - t)
+        return 200, body
+
+    def _cached(self, key, compute, count=True):
+        """(was cached, value); concurrent requests for the same key wait for one computation.
+
+        Only request-level lookups (count=True) are reported in the cache hit/miss statistics.
+        """
+        found, value = self.cache.get(key, count)
+        if found:
+            return True, value
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+        if not owner:
+            event.wait()
+            found, value = self.cache.get(key, count=False)
+            return (True, value) if found else (False, compute())  # the first attempt failed
+        try:
+            value = compute()
+            self.cache.put(key, value)
+            return False, value
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            event.set()
+
+    def _genome(self, label, need):
+        store = self.tables if need == "gff" else self.fastas
+        if label not in self.genomes:
+            raise KeyError(f"unknown genome {label!r}")
+        if label not in store:
+            raise ValueError(f"genome {label!r} has no {need.upper()} in the config")
+        return store[label]
+
+    # ----- handlers -----
+    def genomes_info(self) -> dict:
+        return {"genomes": [{"label": label, "gff": g.get("gff"), "fasta": g.get("fasta"),
+                             "features": len(self.tables[label]) if label in self.tables else 0,
+                             "records": len(self.fastas[label].names) if label in self.fastas else 0}
+                            for label, g in self.genomes.items()],
+                "gene_pairs": [gp["out"] for gp in self.gene_pairs]}
+
+    def _lengths(self, genome, feature):
+        table = self._genome(genome, "gff")
+        return self._cached(("_lengths", genome, feature), lambda: extract_lengths_from_gff(
+            self.genomes[genome]["gff"], feature_type=feature, table=table), count=False)[1]
+
+    def lengths(self, genome, feature="CDS", values="0") -> dict:
+        lengths, _ = self._lengths(genome, feature)
+        out = {"genome": genome, "feature": feature, **summarize(lengths)}
+        if values == "1":
+            out["lengths"] = lengths
+        return out
+
+    def compare(self, genome1, genome2, feature="CDS") -> dict:
+        lengths1, idmap1 = self._lengths(genome1, feature)
+        lengths2, idmap2 = self._lengths(genome2, feature)
+        U, z_u, p_u = mann_whitney_u(lengths1, lengths2)
+        shared = sorted(set(idmap1) & set(idmap2))
+        out = {"feature": feature, "genome1": {"label": genome1, **summarize(lengths1)},
+               "genome2": {"label": genome2, **summarize(lengths2)},
+               "mann_whitney": {"U": U, "z": z_u, "p": p_u}, "shared_ids": len(shared)}
+        if shared:
+            W, z_w, p_w = wilcoxon_signed_rank([idmap1[k] for k in shared], [idmap2[k] for k in shared])
+            out["wilcoxon"] = {"W": W, "z": z_w, "p": p_w}
+        return out
+
+    def gc(self, genome, window="0", step="0") -> dict:
+        fa = self._genome(genome, "fasta")
+        window, step = int(window), int(step) or max(1, int(window) // 5)
+        records = []
+        for name in fa.names:
+            seq = fa.fetch_array(name)
+            r = _record_stats(name, np.bincount(seq, minlength=256))
+            r["gc_pct"] = 100.0 * r["gc"] / r["length"] if r["length"] else 0.0
+            if window > 0:
+                prof = gc_skew_profile(seq, window, step)
+                if len(prof["start"]):
+                    lo, hi = int(np.argmin(prof["cum_skew"])), int(np.argmax(prof["cum_skew"]))
+                    r["origin_estimate"] = int(prof["start"][lo] + window // 2)
+                    r["terminus_estimate"] = int(prof["start"][hi] + window // 2)
+                    r["windows"] = len(prof["start"])
+            records.append(r)
+        total = sum(r["length"] for r in records)
+        return {"genome": genome, "genome_size_bp": total,
+                "gc_content_pct": 100.0 * sum(r["gc"] for r in records) / total if total else 0.0,
+                "records": records}
+
+    def _cds_features(self, genome):
+        with self._cds_lock:
+            if genome not in self._cds:
+                self._cds[genome] = read_cds_features(self.genomes[genome]["gff"])
+            return self._cds[genome]
+
+    def _protein(self, genome, gene):
+        fa = self._genome(genome, "fasta")
+        self._genome(genome, "gff")
+        feats = [f for f in select_features(self._cds_features(genome), [gene]) if f["seqid"] in fa]
+        if not feats:
+            raise KeyError(f"no CDS named {gene!r} in {genome}")
+        return translate(cds_sequence(fa, feats[0]).decode("ascii"))
+
+    def losses(self, pair=None, gene=None, sym_genome=None, free_genome=None, engine="vectorized",
+               alignment="0") -> dict:
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {sorted(ENGINES)}")
+        if sym_genome or free_genome:
+            if not (gene and sym_genome and free_genome):
+                raise ValueError("gene, sym_genome and free_genome are all required")
+            sym, ref = self._protein(sym_genome, gene), self._protein(free_genome, gene)
+            labels = (sym_genome, free_genome)
+        else:
+            name = pair or gene
+            matches = [gp for gp in self.gene_pairs if name in (gp["out"], gp["gene"])]
+            if not matches:
+                raise KeyError(f"no gene pair matches {name!r}")
+            if len(matches) > 1:
+                raise ValueError(f"{len(matches)} gene pairs match {name!r}; pass pair=<out name>")
+            gp = matches[0]
+            sym, ref = read_fasta(gp["sym"]), read_fasta(gp["free"])
+            gene, labels = gp["gene"], (gp.get("sym_label", "Symbiont"), gp.get("free_label", "Free-living"))
+        aln = align_pair(sym, ref, engine)
+        out = {"gene": gene, "sym_label": labels[0], "free_label": labels[1], "engine": engine,
+               **aln.metrics(), "segments": [[s, e] for s, e in aln.losses()],
+               "insertions": [[s, e, after] for s, e, after in aln.insertions()],
+               "substitution_runs": [list(r) for r in aln.substitutions()]}
+        if alignment == "1":
+            out["alignment"] = list(aln.gapped())
+            out["cigar"] = aln.cigar()
+        return out
+
+    def stats(self) -> dict:
+        return {"uptime_s": time.time() - self.started, "startup_s": self.startup_seconds,
+                "load_s": self.load_seconds, "cache": self.cache.info(), "latency": self.latency.summary()}
+
+
+# ---------- HTTP ----------
+def _json_safe(obj):
+    # JSON has no NaN/Infinity: non-finite floats become null; numpy scalars/arrays become Python values
+    if isinstance(obj, dict):
+        return {k: _json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return _json_safe(obj.tolist())
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if np.isfinite(obj) else None
+    return obj
+
+
+def encode_json(body) -> bytes:
+    """Strict JSON for a response body (NaN and infinities are sent as null)."""
+    return json.dumps(_json_safe(body), allow_nan=False).encode("utf-8")
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed pool of worker threads."""
+
+    def __init__(self, address, handler, service: AnalysisService, workers: int | None = None):
+        super().__init__(address, handler)
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    quiet = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        status, body = self.server.service.handle(url.path.strip("/") or "genomes", params)
+        data = encode_json(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve length, GC and gene-loss queries from resident genomes.")
+    ap.add_argument("--config", required=True, help="Pipeline-style JSON config with genomes and gene_pairs")
+    ap.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    ap.add_argument("--workers", type=int, default=8, help="Worker threads (default: 8)")
+    ap.add_argument("--cache-size", type=int, default=256, help="Cached results kept (default: 256)")
+    ap.add_argument("--quiet", action="store_true", help="Do not log every request")
+    args = ap.parse_args()
+
+    try:
+        cfg = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+    service = AnalysisService(cfg, cache_size=args.cache_size)
+    Handler.quiet = args.quiet
+    server = PooledHTTPServer((args.host, args.port), Handler, service, workers=args.workers)
+    print(f"[OK] {len(service.tables)} annotations, {len(service.fastas)} genomes loaded in "
+          f"{service.startup_seconds:.2f} s; serving on http://{args.host}:{server.server_port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+sketches.py
+Mergeable streaming summaries of gene lengths.
+
+A LengthSketch keeps count, mean, variance (Welford/Chan updates), min, max and a log-bucketed
+quantile sketch (DDSketch-style): every value x > 0 falls in bucket ceil(log_gamma x) with
+gamma = (1 + a) / (1 - a), so any quantile is returned within relative error `a` of a true
+sample value. Buckets add when sketches merge, so genomes can be combined into clades without
+revisiting the features, and memory grows with log(max/min) rather than with the number of CDSs.
+
+Usage:
+  python sketches.py build --gff Escherichia_coli_K12.gff3 --label Ecoli_K12 --out Ecoli_K12.sketch.json
+  python sketches.py merge Ecoli_K12.sketch.json Salmonella_no75.sketch.json --label free_living --out free.sketch.json
+  python sketches.py summary *.sketch.json
+"""
+
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from gff_table import GFFTable
+
+DEFAULT_ACCURACY = 0.01
+
+
+class LengthSketch:
+    def __init__(self, relative_accuracy: float = DEFAULT_ACCURACY, label: str = ""):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.alpha = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.label = label
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0                      # values <= 0 (kept apart from the log buckets)
+        self.keys = np.zeros(0, dtype=np.int64)  # sorted bucket indices
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    # ----- building -----
+    def _combine(self, n, mean, m2):
+        # Chan et al. parallel variance update
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def _add_buckets(self, keys, counts):
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        self.keys, inv = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inv, weights=counts, minlength=len(self.keys)).astype(np.int64)
+
+    def update(self, values):
+        """Add a batch of values (any iterable of numbers)."""
+        v = np.asarray(values, dtype=float)
+        if v.size == 0:
+            return self
+        self._combine(v.size, float(v.mean()), float(((v - v.mean()) ** 2).sum()))
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        pos = v[v > 0]
+        self.zero_count += int(v.size - pos.size)
+        keys, counts = np.unique(np.ceil(np.log(pos) / self._log_gamma).astype(np.int64), return_counts=True)
+        self._add_buckets(keys, counts)
+        return self
+
+    def merge(self, other: "LengthSketch"):
+        """Fold another sketch (same accuracy) into this one."""
+        if not math.isclose(self.alpha, other.alpha):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        self._add_buckets(other.keys, other.counts)
+        return self
+
+    # ----- queries -----
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0..1), within relative error alpha of the exact sample quantile."""
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return min(0.0, self.max)
+        cum = np.cumsum(self.counts) + self.zero_count
+        k = self.keys[int(np.searchsorted(cum, rank, side="right"))]
+        est = 2 * self.gamma ** k / (self.gamma + 1)
+        return float(min(max(est, self.min), self.max))
+
+    def summary(self) -> dict:
+        """Same keys as compare_gene_lengths.summarize (n, mean, median, iqr) plus sd, min, max."""
+        nan = float("nan")
+        return {"n": self.count,
+                "mean": self.mean if self.count else nan,
+                "median": self.quantile(0.5),
+                "iqr": (self.quantile(0.25), self.quantile(0.75)),
+                "sd": math.sqrt(self.variance) if self.count > 1 else nan,
+                "min": self.min if self.count else nan,
+                "max": self.max if self.count else nan}
+
+    # ----- persistence -----
+    def to_dict(self) -> dict:
+        return {"label": self.label, "relative_accuracy": self.alpha, "count": self.count,
+                "mean": self.mean, "m2": self.m2, "min": self.min if self.count else None,
+                "max": self.max if self.count else None, "zero_count": self.zero_count,
+                "keys": self.keys.tolist(), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LengthSketch":
+        sk = cls(d["relative_accuracy"], d.get("label", ""))
+        sk.count, sk.mean, sk.m2 = d["count"], d["mean"], d["m2"]
+        sk.min = d["min"] if d["min"] is not None else math.inf
+        sk.max = d["max"] if d["max"] is not None else -math.inf
+        sk.zero_count = d["zero_count"]
+        sk.keys = np.asarray(d["keys"], dtype=np.int64)
+        sk.counts = np.asarray(d["counts"], dtype=np.int64)
+        return sk
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(self.to_dict(), out)
+
+    @classmethod
+    def load(cls, path: str) -> "LengthSketch":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def sketch_table(table: GFFTable, feature_type: str = "CDS", relative_accuracy: float = DEFAULT_ACCURACY,
+                 label: str = "", batch: int = 65536) -> LengthSketch:
+    """Sketch the lengths of one feature type straight from a GFFTable's start/end columns,
+    `batch` features at a time, without building a Python list of lengths."""
+    sk = LengthSketch(relative_accuracy, label)
+    idx = table.select(feature_type)
+    for i in range(0, len(idx), batch):
+        sk.update(table.lengths(idx[i:i + batch]))
+    return sk
+
+
+def sketch_gff(path: str, feature_type: str = "CDS", relative_accuracy: float = DEFAULT_ACCURACY,
+               label: str = "", cache: bool = True) -> LengthSketch:
+    """sketch_table over the GFF3 at `path` (read through the binary .gffcache with cache=True)."""
+    table = GFFTable.cached(path) if cache else GFFTable.parse(path)
+    return sketch_table(table, feature_type, relative_accuracy, label)
+
+
+def format_summary(label: str, s: dict) -> str:
+    return (f"{label}: n={s['n']}, mean={s['mean']:.2f}, sd={s['sd']:.2f}, median≈{s['median']:.2f}, "
+            f"IQR≈({s['iqr'][0]:.2f},{s['iqr'][1]:.2f})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build, merge and summarize mergeable gene-length sketches.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Sketch one GFF3 from its columnar length table")
+    b.add_argument("--gff", required=True, help="GFF3 file")
+    b.add_argument("--label", default=None, help="Label stored in the sketch (default: GFF basename)")
+    b.add_argument("--feature", default="CDS", help="Feature type (default: CDS)")
+    b.add_argument("--accuracy", type=float, default=DEFAULT_ACCURACY, help="Relative quantile error (default: 0.01)")
+    b.add_argument("--out", required=True, help="Output .sketch.json")
+    b.add_argument("--no-cache", action="store_true", help="Parse the GFF without reading or writing its .gffcache")
+    m = sub.add_parser("merge", help="Merge sketches (e.g. genomes into a clade)")
+    m.add_argument("sketches", nargs="+", help="Input .sketch.json files")
+    m.add_argument("--label", default="merged", help="Label for the merged sketch")
+    m.add_argument("--out", required=True, help="Output .sketch.json")
+    s = sub.add_parser("summary", help="Print summaries of sketches")
+    s.add_argument("sketches", nargs="+", help="Input .sketch.json files")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        sk = sketch_gff(args.gff, args.feature, args.accuracy, args.label or os.path.basename(args.gff),
+                        cache=not args.no_cache)
+        sk.save(args.out)
+        print(format_summary(sk.label, sk.summary()))
+    elif args.cmd == "merge":
+        sketches = [LengthSketch.load(p) for p in args.sketches]
+        merged = LengthSketch(sketches[0].alpha, args.label)
+        for sk in sketches:
+            merged.merge(sk)
+        merged.save(args.out)
+        print(format_summary(merged.label, merged.summary()))
+    else:
+        for p in args.sketches:
+            sk = LengthSketch.load(p)
+            print(format_summary(sk.label or p, sk.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+
+import compare_gene_losses as cgl
+from compare_gene_losses import ENGINES, align_pair, full_matrix_mb
+
+
+def _mutate(rng, seq, rate, alphabet):
+    out = []
+    for c in seq:
+        x = rng.random()
+        if x < rate * 0.6:
+            out.append(rng.choice(alphabet))
+        elif x < rate * 0.8:
+            continue
+        elif x < rate:
+            out.append(c + rng.choice(alphabet))
+        else:
+            out.append(c)
+    return "".join(out)
+
+
+def _pairs():
+    rng = random.Random(7)
+    out = [("", "ACGT"), ("ACGT", ""), ("A", "A"), ("ACGTACGT", "TTTT")]
+    for alphabet, n, rate in (("ACGT", 300, 0.1), ("ACDEFGHIKLMNPQRSTVWY", 120, 0.3), ("ACGT", 60, 0.5)):
+        ref = "".join(rng.choice(alphabet) for _ in range(n))
+        out.append((_mutate(rng, ref, rate, alphabet), ref))
+    return out
+
+
+@pytest.mark.parametrize("s1,s2", _pairs())
+@pytest.mark.parametrize("engine", ["vectorized", "linear"])
+def test_engines_match_reference(s1, s2, engine):
+    ref = ENGINES["reference"](s1, s2)
+    aln = ENGINES[engine](s1, s2)
+    assert np.array_equal(aln.ops, ref.ops)
+
+
+def test_linear_engine_small_blocks():
+    s1, s2 = _pairs()[4]
+    assert np.array_equal(cgl.needleman_wunsch_linear(s1, s2, block_cells=64).ops,
+                          ENGINES["reference"](s1, s2).ops)
+
+
+def test_full_matrix_mb_is_engine_specific():
+    assert full_matrix_mb(1023, 1023, "reference") == pytest.approx(9.0)
+    assert full_matrix_mb(1023, 1023, "vectorized") == pytest.approx(1.0)
+
+
+def test_max_matrix_mb_switches_to_linear(monkeypatch):
+    s1, s2 = _pairs()[4]
+    calls = []
+    monkeypatch.setitem(ENGINES, "linear", lambda a, b: calls.append("linear") or cgl.needleman_wunsch_linear(a, b))
+    limit = full_matrix_mb(len(s1), len(s2), "vectorized") * 1.01
+    align_pair(s1, s2, "vectorized", max_matrix_mb=limit)
+    assert calls == []
+    align_pair(s1, s2, "reference", max_matrix_mb=limit)
+    assert calls == ["linear"]
+
+
+def test_banded_matches_reference_when_anchored():
+    rng = random.Random(3)
+    ref = "".join(rng.choice("ACGT") for _ in range(600))
+    sym = _mutate(rng, ref, 0.05, "ACGT")
+    info = {}
+    aln = cgl.needleman_wunsch_banded(sym, ref, info=info)
+    assert info["fallback"] is False and info["skipped"] > 0
+    assert np.array_equal(aln.ops, ENGINES["vectorized"](sym, ref).ops)
+
+
+@pytest.mark.parametrize("limit,expected", [(None, "vectorized"), (1e-6, "linear")])
+def test_banded_fallback_respects_max_matrix_mb(limit, expected):
+    s1, s2 = _pairs()[6]  # too divergent for 12-mer anchors
+    info = {}
+    aln = cgl.needleman_wunsch_banded(s1, s2, max_matrix_mb=limit, info=info)
+    assert info["fallback"] == expected
+    assert np.array_equal(aln.ops, ENGINES["reference"](s1, s2).ops)
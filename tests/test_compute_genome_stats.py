@@ -0,0 +1,31 @@
+import pytest
+
+from compute_genome_stats import gc_content, parse_fasta, scan_fasta
+
+FASTAS = [
+    b">a\nACGTGG\n>b",
+    b">a\nACGTGG\n>b\n",
+    b">a\nACGTGG\n>b desc\nggNNac\nAT",
+    b">a\r\nACGT\r\nGG\r\n>b\r\nCC\r\n",
+    b"ACGT\n>a\nGGGG\n",
+    b">a\n\n>b\nACGT\n",
+    b"",
+]
+
+
+@pytest.mark.parametrize("data", FASTAS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_scan_matches_parse_fasta(tmp_path, data, chunk_size):
+    path = tmp_path / "g.fasta"
+    path.write_bytes(data)
+    seqs = parse_fasta(str(path))
+    records = scan_fasta(str(path), chunk_size=chunk_size)
+    assert sum(r["length"] for r in records) == sum(len(s) for s in seqs)
+    assert sum(r["gc"] for r in records) == round(sum(gc_content(s) * len(s) for s in seqs))
+    assert [r["length"] for r in records if r["length"]] == [len(s) for s in seqs if s]
+
+
+def test_trailing_header_is_an_empty_record(tmp_path):
+    path = tmp_path / "g.fasta"
+    path.write_bytes(b">a\nACGTGG\n>b")
+    assert [(r["id"], r["length"], r["gc"]) for r in scan_fasta(str(path))] == [("a", 6, 4), ("b", 0, 0)]
@@ -0,0 +1,45 @@
+import pytest
+
+from compute_genome_stats import parse_fasta
+from fasta_index import IndexedFasta, build_index, cds_sequence, read_cds_features
+
+FASTAS = {
+    "wrapped": b">a desc\nACGTA\nCGTAC\nGT\n>b\nTTTTT\nGG\n",
+    "no_final_newline": b">a\nACGT\nACGT",
+    "short_last_line_no_newline": b">a\nACGT\nAC",
+    "crlf": b">a\r\nACGT\r\nAC\r\n>b\r\nGGGG\r\n",
+    "single_line": b">a\nACGTACGT",
+}
+
+
+@pytest.mark.parametrize("name", sorted(FASTAS))
+def test_fetch_matches_parse_fasta(tmp_path, name):
+    path = tmp_path / f"{name}.fasta"
+    path.write_bytes(FASTAS[name])
+    expected = parse_fasta(str(path))
+    with IndexedFasta(str(path)) as fa:
+        assert len(fa.names) == len(expected)
+        for rec, seq in zip(fa.names, expected):
+            assert fa.fetch(rec).decode() == seq
+            assert fa.fetch_array(rec).tobytes().decode() == seq
+            assert fa.fetch(rec, 1, 6).decode() == seq[1:6]
+
+
+def test_uneven_lines_rejected(tmp_path):
+    path = tmp_path / "bad.fasta"
+    path.write_bytes(b">a\nACG\nACGT\n")
+    with pytest.raises(ValueError):
+        build_index(str(path))
+
+
+def test_cds_phase_and_strand(tmp_path):
+    fasta, gff = tmp_path / "g.fasta", tmp_path / "g.gff3"
+    fasta.write_bytes(b">chr\nAATGAAATTTGA\n")
+    gff.write_text("chr\tx\tCDS\t2\t10\t.\t+\t1\tID=a;gene=ga\n"
+                   "chr\tx\tCDS\t3\t11\t.\t-\t2\tID=b;gene=gb\n")
+    feats = {f["id"]: f for f in read_cds_features(str(gff))}
+    assert (feats["a"]["phase"], feats["b"]["phase"]) == (1, 2)
+    with IndexedFasta(str(fasta)) as fa:
+        assert cds_sequence(fa, feats["a"]) == b"TGAAATTT"
+        assert cds_sequence(fa, feats["b"]) == b"AATTTCA"
+        assert cds_sequence(fa, feats["b"], trim_phase=False) == b"CAAATTTCA"
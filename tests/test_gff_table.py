@@ -0,0 +1,62 @@
+import os
+from multiprocessing import get_context
+
+import numpy as np
+
+from gff_table import GFFTable, get_attribute
+from compare_gene_lengths import parse_gff_attributes
+
+GFF = ("##gff-version 3\n"
+       "chr1\tsrc\tgene\t1\t90\t.\t+\t.\tID=g1;gene=abc\n"
+       "chr1\tsrc\tCDS\t1\t90\t.\t+\t0\tID=c1;Parent=g1;gene=abc;locus_tag=T1\n"
+       "chr2\tsrc\tCDS\t200\t101\t.\t-\t2\tID=c2;gene = x y ;gene=last;note\n"
+       "chr2\tsrc\tCDS\tbad\t10\t.\t-\t.\tID=c3\n")
+
+
+def _write(tmp_path):
+    path = tmp_path / "a.gff3"
+    path.write_text(GFF)
+    return str(path)
+
+
+def test_columns_and_attributes(tmp_path):
+    table = GFFTable.parse(_write(tmp_path))
+    cds = table.select("CDS")
+    assert len(table) == 3 and cds.tolist() == [1, 2]
+    assert table.lengths(cds).tolist() == [90, 100]
+    assert table.phase[cds].tolist() == [0, 2]
+    assert table.strand[cds].tolist() == [1, -1]
+    for i in range(len(table)):
+        field = table.attr_string(i)
+        for key in ("ID", "gene", "locus_tag", "note", "missing"):
+            assert get_attribute(field, key) == parse_gff_attributes(field).get(key)
+
+
+def test_cache_round_trip(tmp_path):
+    path = _write(tmp_path)
+    parsed = GFFTable.parse(path)
+    GFFTable.cached(path)
+    cached = GFFTable.cached(path)
+    assert isinstance(cached.start, np.memmap)
+    assert cached.types == parsed.types and cached.start.tolist() == parsed.start.tolist()
+    assert cached.attribute("gene") == parsed.attribute("gene")
+
+
+def _save_many(path, n):
+    table = GFFTable.parse(path)
+    for _ in range(n):
+        table.save(GFFTable.cache_dir_for(path))
+
+
+def test_concurrent_cache_writers(tmp_path):
+    path = _write(tmp_path)
+    ctx = get_context("fork")
+    procs = [ctx.Process(target=_save_many, args=(path, 30)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    cache_dir = GFFTable.cache_dir_for(path)
+    assert GFFTable._cache_matches(cache_dir, GFFTable._source_key(path))
+    assert os.listdir(os.path.dirname(cache_dir)) == [os.path.basename(cache_dir)]
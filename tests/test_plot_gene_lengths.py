@@ -0,0 +1,21 @@
+import sys
+
+import pytest
+
+import plot_gene_lengths
+from plot_gene_lengths import parse_label_paths
+
+
+def test_parse_label_paths():
+    assert parse_label_paths(["a=x.gff3", "b=dir/y=z.gff3"]) == {"a": "x.gff3", "b": "dir/y=z.gff3"}
+    for bad in ("x.gff3", "=x.gff3", "a="):
+        with pytest.raises(ValueError, match="LABEL=PATH"):
+            parse_label_paths(["a=ok.gff3", bad])
+
+
+def test_malformed_gffs_is_a_usage_error(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["plot_gene_lengths.py", "--gffs", "Buchnera.gff3"])
+    with pytest.raises(SystemExit) as exc:
+        plot_gene_lengths.main()
+    assert exc.value.code == 2
+    assert "--gffs: expected LABEL=PATH, got 'Buchnera.gff3'" in capsys.readouterr().err
@@ -0,0 +1,81 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from compare_gene_lengths import (adjust_pvalues, length_profile, mann_whitney_presorted, mann_whitney_u,
+                                  wilcoxon_signed_rank)
+from rank_tests import mann_whitney_exact_p, permutation_p, rankdata, wilcoxon_exact_p
+
+
+def _brute_mann_whitney_p(x, y):
+    ranks, _ = rankdata(x + y)
+    n1, mean = len(x), len(x) * (len(x) + len(y) + 1) / 2.0
+    observed = abs(ranks[:n1].sum() - mean)
+    sums = [ranks[list(c)].sum() for c in itertools.combinations(range(len(ranks)), n1)]
+    return sum(abs(s - mean) >= observed - 1e-9 for s in sums) / len(sums)
+
+
+def _brute_wilcoxon_p(x, y):
+    d = np.subtract(x, y, dtype=float)
+    d = d[d != 0]
+    ranks, _ = rankdata(np.abs(d))
+    mean, observed = ranks.sum() / 2.0, abs(ranks[d > 0].sum() - ranks.sum() / 2.0)
+    wpos = [ranks[np.array(s, dtype=bool)].sum() for s in itertools.product((0, 1), repeat=len(ranks))]
+    return sum(abs(w - mean) >= observed - 1e-9 for w in wpos) / len(wpos)
+
+
+def test_rankdata_ties():
+    ranks, counts = rankdata([30, 10, 20, 10, 30, 30])
+    assert ranks.tolist() == [5.0, 1.5, 3.0, 1.5, 5.0, 5.0]
+    assert sorted(counts.tolist()) == [1, 2, 3]
+
+
+def test_exact_p_values_match_enumeration():
+    assert mann_whitney_exact_p([1, 2, 3], [4, 5, 6]) == pytest.approx(0.1)          # 2 of C(6,3)
+    assert wilcoxon_exact_p([2, 3, 4, 5, 6], [1, 1, 1, 1, 1]) == pytest.approx(1 / 16)  # 2 of 2^5
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        x = rng.integers(0, 6, 6).tolist()      # small integer range: many ties
+        y = rng.integers(1, 8, 5).tolist()
+        assert mann_whitney_exact_p(x, y) == pytest.approx(_brute_mann_whitney_p(x, y))
+        px, py = rng.integers(0, 6, 9).tolist(), rng.integers(0, 6, 9).tolist()
+        assert wilcoxon_exact_p(px, py) == pytest.approx(_brute_wilcoxon_p(px, py))
+    assert mann_whitney_exact_p(list(range(60)), list(range(60))) is None
+
+
+def test_normal_approximation_reference_values():
+    # Continuity-corrected normal approximations, worked by hand:
+    # U = 0, mu = 12.5, sigma = sqrt(25 * 11 / 12)  ->  z = -12 / sigma
+    U, z, p = mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+    assert U == 0 and z == pytest.approx(-12 / math.sqrt(275 / 12))
+    assert p == pytest.approx(math.erfc(12 / math.sqrt(275 / 12) / math.sqrt(2)))
+    # d = 1..10, W = 0, mu = 27.5, sigma = sqrt(10 * 11 * 21 / 24)
+    W, z, p = wilcoxon_signed_rank(list(range(2, 12)), [1] * 10)
+    assert W == 0 and z == pytest.approx(-27 / math.sqrt(96.25))
+    assert p == pytest.approx(0.005922, abs=1e-6)
+    assert wilcoxon_signed_rank([1, 2], [1, 2]) == (0.0, pytest.approx(float("nan"), nan_ok=True), 1.0)
+
+
+def test_presorted_and_resampled_p_agree():
+    rng = np.random.default_rng(2)
+    x = rng.integers(50, 300, 40).tolist()
+    y = rng.integers(80, 320, 35).tolist()
+    assert mann_whitney_presorted(length_profile(x), length_profile(y)) == pytest.approx(mann_whitney_u(x, y))
+    _, _, p = mann_whitney_u(x, y)
+    exact = mann_whitney_exact_p(x, y)
+    assert abs(p - exact) < 0.01
+    perm = permutation_p(x, y, n_resamples=4000, seed=3, jobs=1)
+    assert perm == permutation_p(x, y, n_resamples=4000, seed=3, jobs=2)
+    assert abs(perm - exact) < 0.03
+
+
+def test_adjust_pvalues():
+    p = [0.01, 0.04, 0.03, 0.02, float("nan")]
+    assert adjust_pvalues(p, "bh")[:4].tolist() == pytest.approx([0.04] * 4)
+    assert adjust_pvalues(p, "holm")[:4].tolist() == pytest.approx([0.04, 0.06, 0.06, 0.06])
+    assert adjust_pvalues(p, "bonferroni")[:4].tolist() == pytest.approx([0.04, 0.16, 0.12, 0.08])
+    assert np.isnan(adjust_pvalues(p, "bh")[4])
+    with pytest.raises(ValueError):
+        adjust_pvalues(p, "fdr")
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import compare_gene_losses as cgl
+from scan_gene_losses import kmer_set, pair_by_kmers, score_pair
+
+PROT_A = "MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQAPILSRVGDGTQDNLSGAEKAVQVKVKALPDAQFEVV"
+PROT_B = "MSDNGPQNQRNAPRITFGGPSDSTGSNQNGERSGARSKQRRPQGLPNNTASWFTALTQHGKEDLKFPRG"
+
+
+def _sets(proteins):
+    return ({i: kmer_set(p) for i, p in proteins.items()}, {i: len(p) for i, p in proteins.items()})
+
+
+def test_kmer_pairing_falls_back_to_next_hit():
+    # free 0 is the best hit of both symbiont proteins; sym 1 must fall back to free 1
+    sym, sym_len = _sets({0: PROT_A, 1: PROT_A[:50] + PROT_B[50:]})
+    free, free_len = _sets({0: PROT_A, 1: PROT_A[:35] + PROT_B[35:45] + PROT_A[45:]})
+    pairs = pair_by_kmers(sym, free, sym_len, free_len, min_jaccard=0.15, min_length_ratio=0.7)
+    assert [(i, j) for i, j, _ in pairs] == [(0, 0), (1, 1)]
+
+
+def test_kmer_pairing_rejects_weak_and_length_mismatched_hits():
+    sym, sym_len = _sets({0: PROT_A, 1: PROT_A[:20]})
+    free, free_len = _sets({0: PROT_B, 1: PROT_A})
+    pairs = pair_by_kmers(sym, free, sym_len, free_len, min_jaccard=0.15, min_length_ratio=0.7)
+    assert [(i, j) for i, j, _ in pairs] == [(0, 1)]
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "banded", "linear"])
+def test_score_pair_respects_max_matrix_mb(engine, monkeypatch):
+    used = []
+    linear = cgl.needleman_wunsch_linear
+    monkeypatch.setitem(cgl.ENGINES, "linear", lambda *a: used.append(1) or linear(*a))
+    task = {"sym_id": "s", "sym_gene": "g", "sym_locus_tag": "", "free_id": "f", "free_gene": "g",
+            "free_locus_tag": "", "paired_by": "name", "kmer_jaccard": 0.2, "sym_protein": PROT_A,
+            "free_protein": PROT_B, "engine": engine, "max_matrix_mb": 1e-6}
+    row = score_pair(task)
+    assert row["status"] == "ok" and used
+    expected = cgl.needleman_wunsch(PROT_A, PROT_B)
+    assert row["total_loss"] == expected.metrics()["total_loss"]
+    assert row["losses"] == ";".join(f"{s}-{e}" for s, e in expected.losses())
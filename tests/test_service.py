@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from service import AnalysisService, encode_json
+
+GFF = ("##gff-version 3\n"
+       "chr1\tsrc\tCDS\t1\t90\t.\t+\t0\tID=c1\n"
+       "chr1\tsrc\tCDS\t101\t250\t.\t+\t0\tID=c2\n")
+
+
+@pytest.fixture
+def service(tmp_path):
+    path = tmp_path / "a.gff3"
+    path.write_text(GFF)
+    svc = AnalysisService({"genomes": {"A": {"gff": str(path)}}, "gene_pairs": []})
+    yield svc
+    svc.close()
+
+
+def test_missing_resources_are_404(service):
+    assert service.handle("nope", {})[0] == 404
+    status, body = service.handle("lengths", {"genome": "B"})
+    assert status == 404 and body["error"] == "unknown genome 'B'"
+    assert service.handle("losses", {"pair": "gltJ"})[0] == 404
+    assert service.handle("gc", {"genome": "A"})[0] == 400      # no FASTA configured
+    assert service.handle("lengths", {"genome": "A", "bogus": "1"})[0] == 400
+    assert service.handle("losses", {"gene": "x", "sym_genome": "A"})[0] == 400
+
+
+def test_non_finite_values_encode_as_null(service):
+    status, body = service.handle("lengths", {"genome": "A", "feature": "gene"})
+    assert status == 200 and body["n"] == 0
+    decoded = json.loads(encode_json(body))
+    assert decoded["mean"] is None and decoded["iqr"] == [None, None]
+    assert json.loads(encode_json({"x": np.float32("inf"), "y": np.int64(3), "z": np.arange(2)})) == \
+        {"x": None, "y": 3, "z": [0, 1]}
+
+
+def test_cache_stats_count_requests_only(service):
+    for _ in range(2):
+        assert service.handle("lengths", {"genome": "A"})[0] == 200
+    assert service.handle("compare", {"genome1": "A", "genome2": "A"})[0] == 200
+    info = service.stats()["cache"]
+    assert (info["hits"], info["misses"]) == (1, 2)
@@ -0,0 +1,60 @@
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from compare_gene_lengths import extract_lengths_from_gff, summarize
+from sketches import LengthSketch, sketch_gff, sketch_table
+from gff_table import GFFTable
+
+
+def _lengths(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.rint(rng.lognormal(6.5, 0.6, n)).astype(int) + 1
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_within_relative_error(alpha):
+    v = _lengths()
+    sk = LengthSketch(alpha).update(v)
+    for q in np.linspace(0, 1, 41):
+        exact = np.quantile(v, q, method="lower")
+        assert abs(sk.quantile(q) - exact) <= alpha * exact + 1e-9
+    s = sk.summary()
+    assert s["n"] == len(v) and s["min"] == v.min() and s["max"] == v.max()
+    assert math.isclose(s["mean"], v.mean()) and math.isclose(s["sd"], v.std(ddof=1))
+
+
+def test_merge_equals_single_update():
+    v = _lengths()
+    whole = LengthSketch().update(v)
+    parts = LengthSketch().update(v[:1234]).merge(LengthSketch().update(v[1234:]))
+    assert parts.keys.tolist() == whole.keys.tolist() and parts.counts.tolist() == whole.counts.tolist()
+    assert parts.count == whole.count and math.isclose(parts.variance, whole.variance)
+    assert LengthSketch.from_dict(parts.to_dict()).summary() == parts.summary()
+    with pytest.raises(ValueError):
+        whole.merge(LengthSketch(0.05))
+
+
+def test_sketch_gff_matches_extracted_lengths(tmp_path):
+    rows = ["##gff-version 3"]
+    for i, L in enumerate(_lengths(300)):
+        rows.append(f"chr1\tsrc\tCDS\t{10 * i + 1}\t{10 * i + L}\t.\t+\t0\tID=c{i}")
+        rows.append(f"chr1\tsrc\tgene\t{10 * i + 1}\t{10 * i + L + 3}\t.\t+\t.\tID=g{i}")
+    path = tmp_path / "a.gff3"
+    path.write_text("\n".join(rows) + "\n")
+    lengths, _ = extract_lengths_from_gff(str(path), cache=False)
+    expected = LengthSketch().update(lengths)
+    for sk in (sketch_gff(str(path), cache=False),
+               sketch_table(GFFTable.parse(str(path)), batch=7)):
+        assert sk.keys.tolist() == expected.keys.tolist() and sk.counts.tolist() == expected.counts.tolist()
+        assert sk.count == len(lengths) and math.isclose(sk.mean, expected.mean)
+
+
+def test_summarize_quartiles():
+    v = [float(x) for x in _lengths(101)]
+    s = summarize(v)
+    assert s["n"] == 101 and s["median"] == statistics.median(v)
+    assert s["iqr"] == (np.quantile(v, 0.25), np.quantile(v, 0.75))
+    assert summarize([])["n"] == 0